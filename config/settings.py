@@ -4,6 +4,7 @@ Django settings for config project.
 Generated by 'django-admin startproject' using Django 5.2.9.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,11 +38,13 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'core.User'
 
 MIDDLEWARE = [
+    'core.middleware.QueryInstrumentationMiddleware', # outermost, so it sees session and auth queries too
     'django.middleware.security.SecurityMiddleware',
+    'core.routers.ReplicaStickinessMiddleware', # outside SessionMiddleware so session saves count as writes
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.auth.SnapshotAuthenticationMiddleware', # AuthenticationMiddleware that caches the user, see core.auth
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,6 +80,48 @@ DATABASES = {
     }
 }
 
+# DATABASE_PROFILE=production tunes SQLite for concurrent traffic:
+# - WAL lets readers carry on while a booking writes
+# - busy_timeout makes writers queue for the lock instead of failing with "database is locked"
+# - IMMEDIATE transactions take the write lock at BEGIN, so two writers can't deadlock upgrading
+#   from a read lock (busy_timeout cannot resolve that case)
+# - synchronous=NORMAL is durable under WAL except for the last commits on power loss
+# - persistent connections keep the page cache and mmap warm between requests
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA busy_timeout=5000;'
+        'PRAGMA cache_size=-65536;' # 64 MiB
+        'PRAGMA mmap_size=268435456;' # 256 MiB
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 5,
+}
+SQLITE_PRODUCTION_CONN_MAX_AGE = 600
+
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'default')
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update(
+        OPTIONS=SQLITE_PRODUCTION_OPTIONS,
+        CONN_MAX_AGE=SQLITE_PRODUCTION_CONN_MAX_AGE,
+        CONN_HEALTH_CHECKS=True,
+    )
+
+# REPLICA_DATABASE=/path/to/copy.sqlite3 adds a read replica for the public pages (see core.routers).
+# A local copy refreshed with `manage.py sync_replica` stands in for real replication.
+if os.environ.get('REPLICA_DATABASE'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['REPLICA_DATABASE'],
+        'OPTIONS': {'init_command': 'PRAGMA query_only=1;'},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+# How long a client reads from the primary after writing; keep it above the replica's lag
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,3 +168,88 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard_dispatch'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Seat holds placed from the seat map lapse after this many minutes
+SEAT_HOLD_MINUTES = 10
+# Most seats one user may hold for an event at a time, and how long re-holding can keep a seat
+# held in total, counted from when it was first held
+SEAT_HOLD_MAX_SEATS = 10
+SEAT_HOLD_MAX_MINUTES = 30
+
+# SEAT_STREAM=1 pushes seat changes to event pages over Server-Sent Events (see core.live). It needs an
+# ASGI server (config.asgi); requests served over WSGI, like runserver's, keep polling for changes
+SEAT_STREAM = os.environ.get('SEAT_STREAM') == '1'
+
+# How often a live seat feed re-checks the database for bookings made by other processes
+SEAT_STREAM_POLL_SECONDS = 2
+
+# BOOKING_GROUP_COMMIT=1 queues bookings per event and commits them in micro-batches (see core.batching):
+# a batch closes after BOOKING_BATCH_WINDOW_MS or BOOKING_BATCH_SIZE requests, whichever comes first
+BOOKING_GROUP_COMMIT = os.environ.get('BOOKING_GROUP_COMMIT') == '1'
+BOOKING_BATCH_WINDOW_MS = 5
+BOOKING_BATCH_SIZE = 100
+# Seconds a request waits for its batch before giving up
+BOOKING_BATCH_TIMEOUT = 30
+
+# Rendered seat-grid fragments, keyed by event and seat_version. A booking or cancellation
+# deletes the fragment it superseded (core.seating.retire_grid), so an event keeps one entry
+# per page. MAX_ENTRIES counts entries, not bytes: a 100k-seat grid renders to ~20MB, so keep
+# MAX_ENTRIES x the largest grid within the memory a process can spare. LocMemCache evicts
+# least recently used.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'seat_grid': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'seat-grid',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth-snapshots',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# SESSION_MODE picks where sessions are kept:
+# - db (default): a django_session row, read on every request that touches the session
+# - cache: the "sessions" cache; LocMemCache is per process, so with several workers point it at a
+#   shared cache or users are logged out whenever they reach another worker
+# - signed_cookies: the session data itself, signed, in the cookie; nothing is stored server-side,
+#   so a session can't be revoked before it expires
+SESSION_MODE = os.environ.get('SESSION_MODE', 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Seconds request.user may come from the "auth" cache instead of the user table (see core.auth); 0 turns it off
+USER_SNAPSHOT_SECONDS = 60
+
+# Per-request SQL timing (Server-Timing header + a "core.sql" log line); off unless SQL_INSTRUMENTATION=1
+SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION') == '1'
+# Statements repeated this many times in one request are logged as N+1 suspects
+SQL_N_PLUS_ONE_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.sql': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from .booking import cancel_booking
 from .models import User, Event, Booking
 
 class CustomUserAdmin(UserAdmin):
@@ -17,6 +18,14 @@ class EventAdmin(admin.ModelAdmin):
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('id', 'event', 'user', 'total_cost', 'booking_status', 'created_at')
     list_filter = ('booking_status',)
+    # Editing the status here would leave the seats and sales counters behind; use the action
+    readonly_fields = ('booking_status',)
+    actions = ['cancel_bookings']
+
+    @admin.action(description='Cancel selected bookings and release their seats')
+    def cancel_bookings(self, request, queryset):
+        cancelled = sum(cancel_booking(booking) for booking in queryset.filter(booking_status='CONFIRMED'))
+        self.message_user(request, f'{cancelled} bookings cancelled.')
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Event, EventAdmin)
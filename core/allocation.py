@@ -0,0 +1,206 @@
+"""
+Best-available seat allocation.
+
+``best_seats(event, n)`` picks N adjacent free seats in one row, preferring
+front rows and the middle of the row: a block scores its row number plus
+how far (in seats) its centre is from the row's centre, lowest wins, and
+ties go to the front-most, then left-most block.
+
+Answers come from a FreeRuns index of each row's maximal runs of free
+seats, so a request looks at a few runs in the front rows instead of
+scanning the grid. The index is kept per event in this process and is
+tagged with the ``seat_version`` it reflects. ``apply_seat_change``
+reports every committed booking and cancellation through
+``seats_changed``, which patches the index in place. An index that
+falls behind (a write from another process) is rebuilt from the bitmap
+the next time it is read.
+"""
+import math
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from operator import itemgetter
+
+from .seating import SeatMap
+
+# How many events keep an index in memory, least recently used dropped first
+MAX_INDEXES = 256
+
+_indexes = OrderedDict() # event id -> (seat_version, FreeRuns)
+_lock = threading.Lock()
+
+
+class FreeRuns:
+    """
+    Per-row sorted lists of free runs ``(start, end)``, ``end`` exclusive,
+    plus the longest run in each row so rows that cannot fit a request are
+    skipped without looking at their runs.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.runs = [[] for _ in range(rows)]
+        self.longest = [0] * rows
+
+    @classmethod
+    def from_seat_map(cls, seat_map):
+        index = cls(seat_map.rows, seat_map.cols)
+        for r in range(seat_map.rows):
+            flags = seat_map.row_flags(r)
+            runs, c = index.runs[r], flags.find(0)
+            while c != -1:
+                end = flags.find(1, c)
+                if end == -1:
+                    end = seat_map.cols
+                runs.append((c, end))
+                c = flags.find(0, end)
+            index.longest[r] = max((e - s for s, e in runs), default=0)
+        return index
+
+    def take(self, indices):
+        self._apply(indices, self._take)
+
+    def release(self, indices):
+        self._apply(indices, self._release)
+
+    def _apply(self, indices, change):
+        touched = set()
+        for i in indices:
+            r, c = divmod(i, self.cols)
+            change(self.runs[r], c)
+            touched.add(r)
+        for r in touched:
+            self.longest[r] = max((e - s for s, e in self.runs[r]), default=0)
+
+    @staticmethod
+    def _take(runs, c):
+        k = bisect_right(runs, c, key=itemgetter(0)) - 1
+        if k < 0 or runs[k][1] <= c:
+            return # already taken
+        s, e = runs[k]
+        runs[k:k + 1] = [run for run in ((s, c), (c + 1, e)) if run[0] < run[1]]
+
+    @staticmethod
+    def _release(runs, c):
+        k = bisect_right(runs, c, key=itemgetter(0))
+        if k and runs[k - 1][1] > c:
+            return # already free
+        start, end, lo, hi = c, c + 1, k, k
+        if k and runs[k - 1][1] == c:
+            start, lo = runs[k - 1][0], k - 1
+        if k < len(runs) and runs[k][0] == c + 1:
+            end, hi = runs[k][1], k + 1
+        runs[lo:hi] = [(start, end)]
+
+    def best(self, n, exclude=frozenset()):
+        """
+        Row-major index of the first seat of the best block of ``n`` free seats, or
+        None. ``exclude`` holds seat indices to treat as taken (other
+        people's holds, which the bitmap does not record).
+        """
+        if not 0 < n <= self.cols:
+            return None
+        blocked = {}
+        for i in exclude:
+            r, c = divmod(i, self.cols)
+            blocked.setdefault(r, []).append(c)
+        ideal = (self.cols - n) / 2
+        best = None # (score, row, col)
+        for r in range(self.rows):
+            if best is not None and r >= best[0]:
+                break # every later block scores at least its row number
+            if self.longest[r] < n:
+                continue
+            for s, e in _split(self.runs[r], blocked.get(r)):
+                if e - s < n:
+                    continue
+                c = _nearest_start(ideal, s, e - n)
+                candidate = (r + abs(c - ideal), r, c)
+                if best is None or candidate < best:
+                    best = candidate
+        return None if best is None else best[1] * self.cols + best[2]
+
+
+def _split(runs, blocked):
+    if not blocked:
+        return runs
+    blocked = sorted(blocked)
+    pieces = []
+    for s, e in runs:
+        for c in blocked[bisect_right(blocked, s - 1):]:
+            if c >= e:
+                break
+            pieces.append((s, c))
+            s = c + 1
+        pieces.append((s, e))
+    return pieces
+
+
+def _nearest_start(ideal, lo, hi):
+    """The start in [lo, hi] closest to ``ideal``, the lower one on a tie."""
+    # ideal is a whole or half number, so rounding down is the tie-break too
+    return min(max(math.floor(ideal), lo), hi)
+
+
+def best_block_by_scan(seat_map, n, exclude=frozenset()):
+    """
+    The same answer as ``FreeRuns.best`` by trying every position in the
+    grid; the reference the index is tested and benchmarked against.
+    """
+    if not 0 < n <= seat_map.cols:
+        return None
+    ideal = (seat_map.cols - n) / 2
+    best = None
+    for r in range(seat_map.rows):
+        flags = bytearray(seat_map.row_flags(r))
+        for i in exclude:
+            if i // seat_map.cols == r:
+                flags[i % seat_map.cols] = 1
+        for c in range(seat_map.cols - n + 1):
+            if not any(flags[c:c + n]):
+                candidate = (r + abs(c - ideal), r, c)
+                if best is None or candidate < best:
+                    best = candidate
+    return None if best is None else best[1] * seat_map.cols + best[2]
+
+
+def _index_for(event):
+    entry = _indexes.get(event.pk)
+    if entry is not None and entry[0] == event.seat_version:
+        _indexes.move_to_end(event.pk)
+        return entry[1]
+    index = FreeRuns.from_seat_map(SeatMap.for_event(event))
+    _indexes[event.pk] = (event.seat_version, index)
+    if len(_indexes) > MAX_INDEXES:
+        _indexes.popitem(last=False)
+    return index
+
+
+def best_seats(event, n, exclude=()):
+    """Seat IDs of the best ``n`` adjacent free seats for ``event``, or None."""
+    seat_map = SeatMap(event.venue_rows, event.venue_cols)
+    exclude = {i for i in map(seat_map.index_of, exclude) if i is not None}
+    with _lock:
+        start = _index_for(event).best(n, exclude)
+    if start is None:
+        return None
+    return [seat_map.seat_id(i) for i in range(start, start + n)]
+
+
+def seats_changed(event_id, version, indices, booked):
+    """
+    Patch the cached index after a committed seat change that moved the
+    event from ``version`` to ``version + 1``; any other cached version is
+    out of date and is dropped.
+    """
+    with _lock:
+        entry = _indexes.pop(event_id, None)
+        if entry is None or entry[0] != version:
+            return
+        index = entry[1]
+        if booked:
+            index.take(indices)
+        else:
+            index.release(indices)
+        _indexes[event_id] = (version + 1, index)
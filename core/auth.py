@@ -0,0 +1,101 @@
+"""
+``request.user`` without a user query on every request.
+
+Django's AuthenticationMiddleware loads the logged-in user from the
+database on each request and checks its session hash. This module's
+SnapshotAuthenticationMiddleware does the same check once, then keeps a
+small snapshot of the user in the ``auth`` cache: the fields the views and
+templates look at (username, role, is_approved and the account flags)
+plus the session hash it was checked against. Later requests carrying that
+same hash get a User built from the snapshot; any other field is loaded
+from the database on first access, as if it had been deferred.
+
+A snapshot is dropped when its user is saved or deleted (approve_user,
+reject_user, the admin, a password change) and by the bulk paths in
+core.moderation, which bypass signals. The cache is per process unless it
+is pointed at a shared backend, so USER_SNAPSHOT_SECONDS bounds how long
+another process can go on seeing an old role or approval; 0 turns
+snapshots off.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth import get_user as load_user
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import User
+
+CACHE_ALIAS = 'auth'
+SNAPSHOT_FIELDS = ('id', 'username', 'role', 'is_approved', 'is_active', 'is_staff', 'is_superuser')
+# from_db() takes values in the model's field order
+_FIELD_ORDER = [f.attname for f in User._meta.concrete_fields if f.attname in SNAPSHOT_FIELDS]
+
+
+def _key(user_id):
+    return f'user:{user_id}'
+
+
+def remember(user):
+    """Cache a snapshot of ``user``, an authenticated user just checked against the database."""
+    if settings.USER_SNAPSHOT_SECONDS:
+        snapshot = [getattr(user, name) for name in _FIELD_ORDER]
+        caches[CACHE_ALIAS].set(_key(user.pk), (user.get_session_auth_hash(), snapshot), settings.USER_SNAPSHOT_SECONDS)
+
+
+def forget(user_ids):
+    caches[CACHE_ALIAS].delete_many([_key(pk) for pk in user_ids])
+
+
+def snapshot_user(request):
+    """The session's user built from its snapshot, or None to load it from the database."""
+    if not settings.USER_SNAPSHOT_SECONDS:
+        return None
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    if user_id is None or session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    cached = caches[CACHE_ALIAS].get(_key(user_id))
+    # A different hash means a password change or a reused id; let Django sort it out
+    if cached is None or not constant_time_compare(cached[0], session.get(HASH_SESSION_KEY) or ''):
+        return None
+    return User.from_db(DEFAULT_DB_ALIAS, _FIELD_ORDER, cached[1])
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        user = snapshot_user(request)
+        if user is None:
+            user = load_user(request)
+            if user.is_authenticated:
+                remember(user)
+        request._cached_user = user
+    return request._cached_user
+
+
+class SnapshotAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+
+
+def _changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # After commit, so a request in between can't cache the old row again
+        transaction.on_commit(partial(forget, [instance.pk]))
+
+
+def _logged_in(sender, request, user, **kwargs):
+    remember(user)
+
+
+def connect():
+    post_save.connect(_changed, sender=User, dispatch_uid='auth_snapshot_save')
+    post_delete.connect(_changed, sender=User, dispatch_uid='auth_snapshot_delete')
+    user_logged_in.connect(_logged_in, dispatch_uid='auth_snapshot_login')
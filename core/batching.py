@@ -0,0 +1,120 @@
+"""
+Group commit for bookings.
+
+With BOOKING_GROUP_COMMIT on, book_ticket hands its request to a per-event
+worker thread instead of booking inline. The worker waits up to
+BOOKING_BATCH_WINDOW_MS for more requests to arrive (or until it has
+BOOKING_BATCH_SIZE of them), books the lot with ``create_bookings`` in one
+transaction, and hands every caller its own Booking or SeatUnavailable.
+
+In a flash sale the event row is the bottleneck: every booking has to
+rewrite the same bitmap and counters and SQLite has a single writer. One
+transaction per batch pays for the lock, the bitmap rewrite and the commit
+once per batch instead of once per seat buyer. The queue is per process;
+bookings from other processes still race through the unique seat index,
+and a batch that loses such a race settles its requests one by one.
+
+A request still queued after BOOKING_BATCH_TIMEOUT is cancelled and the
+worker skips it, so the buyer is told the truth: nothing was booked. One
+that has already joined a batch is waited for, since its transaction
+decides the outcome.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .booking import create_bookings
+from .models import Event
+
+# A worker with nothing to do for this long exits, and closes its connection
+IDLE_SECONDS = 5
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+class EventWorker(threading.Thread):
+    def __init__(self, event_id):
+        super().__init__(name=f'booking-batch-{event_id}', daemon=True)
+        self.event_id = event_id
+        self.requests = queue.SimpleQueue()
+        self.window = settings.BOOKING_BATCH_WINDOW_MS / 1000
+        self.size = settings.BOOKING_BATCH_SIZE
+
+    def run(self):
+        try:
+            while True:
+                batch = self.collect()
+                if batch is None:
+                    return
+                self.process(batch)
+        finally:
+            connection.close()
+
+    def collect(self):
+        try:
+            batch = [self.requests.get(timeout=IDLE_SECONDS)]
+        except queue.Empty:
+            with _workers_lock:
+                # Anything submitted before we took the lock still gets served
+                if self.requests.empty():
+                    del _workers[self.event_id]
+                    return None
+            batch = [self.requests.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def process(self, batch):
+        # Requests whose caller gave up waiting were cancelled; the rest can't be any more
+        batch = [request for request in batch if request[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # Like the start of a request: drop a connection that broke or outlived CONN_MAX_AGE
+        close_old_connections()
+        try:
+            event = Event.objects.get(pk=self.event_id)
+            results = create_bookings(event, [(user, seats) for user, seats, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def submit(event, user, seat_list):
+    """Queue a booking request; returns a Future for its Booking."""
+    future = Future()
+    with _workers_lock:
+        worker = _workers.get(event.pk)
+        if worker is None:
+            worker = _workers[event.pk] = EventWorker(event.pk)
+            worker.start()
+        worker.requests.put((user, seat_list, future))
+    return future
+
+
+def book(event, user, seat_list):
+    """Drop-in for ``create_booking`` that goes through the event's batch queue."""
+    future = submit(event, user, seat_list)
+    try:
+        return future.result(timeout=settings.BOOKING_BATCH_TIMEOUT)
+    except FutureTimeoutError: # only an alias of the builtin TimeoutError from Python 3.11
+        if future.cancel():
+            raise TimeoutError('Booking is busy right now; nothing was booked, please try again.')
+        return future.result() # already in a batch that is committing
@@ -0,0 +1,78 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks run against a throwaway copy of the schema (the same test
+database Django's test runner would create), never the configured one.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def scratch_database(aliases=('default',), verbosity=0):
+    old_config = setup_databases(verbosity, interactive=False, aliases=set(aliases))
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
+
+
+@contextmanager
+def scratch_file_database(options):
+    """
+    A scratch SQLite database in a temporary file, opened with ``options``.
+
+    Connections opened by other threads use it too, which concurrency
+    benchmarks need; the test database is normally a private in-memory one.
+    """
+    shared = connections.settings['default'] # what connections opened by other threads are built from
+    original = {key: shared.get(key) for key in ('NAME', 'OPTIONS', 'TEST')}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            connections['default'].close()
+            for settings_dict in (shared, connections['default'].settings_dict):
+                settings_dict['OPTIONS'] = dict(options)
+                settings_dict['TEST'] = {**(original['TEST'] or {}), 'NAME': os.path.join(tmp, 'bench.sqlite3')}
+            with scratch_database():
+                shared['NAME'] = connections['default'].settings_dict['NAME']
+                yield
+    finally:
+        shared.update(original)
+        connections['default'].close()
+        connections['default'].settings_dict.update(original)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ms = [s * 1000 for s in samples]
+    return {
+        'n': len(ms),
+        'mean': statistics.fmean(ms) if ms else 0.0,
+        'p50': percentile(ms, 50),
+        'p95': percentile(ms, 95),
+        'p99': percentile(ms, 99),
+    }
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
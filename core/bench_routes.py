@@ -0,0 +1,271 @@
+"""
+End-to-end latency benchmark for every named route in core/urls.py.
+
+Each route has a Route entry describing who requests it and how. A route
+that changes data gets a ``setup`` callable, which runs untimed before
+every request and creates whatever that request consumes, such as a fresh
+pending user to approve or a free seat to book. Only the request itself
+is timed, through Django's test client, with the SQL it issued counted
+alongside.
+
+``manage.py bench_views`` runs this against a generated dataset in a
+scratch database and compares the results with a saved baseline.
+"""
+import datetime
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .bench import summarize
+from .booking import create_booking, hold_seats
+from .models import Booking, Event, User
+from .seating import SeatMap
+
+
+PASSWORD = 'bench-password'
+
+
+@dataclass
+class Route:
+    role: Optional[str] # None for anonymous, else 'admin', 'host' or 'public'
+    method: str = 'get'
+    setup: Optional[Callable] = None # (ctx) -> dict with optional 'kwargs' and 'data'
+    kwargs: Callable = lambda ctx: {}
+    expect: tuple = (200,)
+
+
+# Routes that cannot be timed as one request/response
+SKIPPED = {
+    'seat_stream': 'server-sent event stream never completes',
+}
+
+
+class BenchContext:
+    """The accounts and events the routes run against, picked from the loaded data."""
+
+    def __init__(self):
+        self.counter = itertools.count()
+        self.admin = User.objects.filter(role='ADMIN').order_by('pk').first()
+        approved = Event.objects.filter(status='APPROVED')
+        # The best-selling event has the fullest seat map and its host the most to show
+        self.event = approved.order_by('-seats_sold', 'pk').first()
+        self.host = self.event.host
+        top_buyer = (
+            Booking.objects.values('user').annotate(n=Count('pk')).order_by('-n', 'user').first()
+        )
+        self.public = User.objects.get(pk=top_buyer['user']) if top_buyer else User.objects.filter(role='PUBLIC').first()
+        for user in (self.admin, self.host, self.public):
+            user.is_approved = True
+            user.set_password(PASSWORD)
+            user.save()
+
+        # A large empty hall for the booking and hold routes to fill seat by seat
+        self.hall = Event.objects.create(
+            host=self.host, title='Benchmark Hall', date=timezone.now().date(), time=datetime.time(20),
+            price=10, venue_rows=100, venue_cols=100, status='APPROVED',
+        )
+        self.next_seat = itertools.count()
+        # Best-available picks its own seats, so it gets a hall of its own
+        self.best_hall = Event.objects.create(
+            host=self.host, title='Benchmark Hall (best available)', date=timezone.now().date(),
+            time=datetime.time(20), price=10, venue_rows=100, venue_cols=100, status='APPROVED',
+        )
+
+    def unique(self, prefix):
+        return f'{prefix}{next(self.counter)}'
+
+    def free_seat(self):
+        seat_map = SeatMap(self.hall.venue_rows, self.hall.venue_cols)
+        return seat_map.seat_id(next(self.next_seat) % seat_map.capacity)
+
+    def pending_user(self):
+        return User.objects.create_user(self.unique('bench_pending'), role='HOST') # no password: skips hashing
+
+    def pending_event(self):
+        return Event.objects.create(
+            host=self.host, title=self.unique('Bench Event '), date=timezone.now().date(),
+            time=datetime.time(19), price=5,
+        )
+
+
+def _event(ctx):
+    return {'event_id': ctx.event.pk}
+
+
+def _login(ctx):
+    return {'data': {'username': ctx.public.username, 'password': PASSWORD}}
+
+
+def _register(ctx):
+    name = ctx.unique('bench_new')
+    return {'data': {'username': name, 'email': f'{name}@example.com', 'password': 'pw', 'role': 'PUBLIC'}}
+
+
+def _pending_user(ctx):
+    return {'kwargs': {'user_id': ctx.pending_user().pk}}
+
+
+def _pending_event(ctx):
+    return {'kwargs': {'event_id': ctx.pending_event().pk}}
+
+
+def _bulk_users(ctx):
+    return {'data': {'action': 'approve', 'ids': [ctx.pending_user().pk for _ in range(20)]}}
+
+
+def _bulk_events(ctx):
+    return {'data': {'action': 'approve', 'ids': [ctx.pending_event().pk for _ in range(20)]}}
+
+
+def _book(ctx):
+    return {'kwargs': {'event_id': ctx.hall.pk}, 'data': {'selected_seats': ctx.free_seat()}}
+
+
+def _book_best(ctx):
+    return {'kwargs': {'event_id': ctx.best_hall.pk}, 'data': {'quantity': 4}}
+
+
+def _hold(ctx):
+    return {'kwargs': {'event_id': ctx.hall.pk}, 'data': {'seats': ctx.free_seat()}}
+
+
+def _release(ctx):
+    seat = ctx.free_seat()
+    hold_seats(ctx.hall, ctx.public, [seat])
+    return {'kwargs': {'event_id': ctx.hall.pk}, 'data': {'seats': seat}}
+
+
+def _own_booking(ctx):
+    return {'kwargs': {'booking_id': create_booking(ctx.hall, ctx.public, [ctx.free_seat()]).pk}}
+
+
+def _sold_event(ctx):
+    event = ctx.pending_event()
+    event.status = 'APPROVED'
+    event.save()
+    seat_map = SeatMap(event.venue_rows, event.venue_cols)
+    for i in range(0, 40, 2):
+        create_booking(event, ctx.public, [seat_map.seat_id(i), seat_map.seat_id(i + 1)])
+    return {'kwargs': {'event_id': event.pk}}
+
+
+def _create_event(ctx):
+    return {'data': {
+        'title': ctx.unique('Bench Created '), 'description': 'Benchmark', 'date': timezone.now().date().isoformat(),
+        'time': '19:00', 'price': '12.00', 'venue_rows': 10, 'venue_cols': 10,
+    }}
+
+
+ROUTES = {
+    'landing': Route(None),
+    'browse_events': Route(None),
+    'register': Route(None, 'post', setup=_register, expect=(302,)),
+    'login': Route(None, 'post', setup=_login, expect=(302,)),
+    'logout': Route('public', expect=(302,)),
+    'dashboard_dispatch': Route('public', expect=(302,)),
+    'admin_dashboard': Route('admin'),
+    'host_list': Route('admin'),
+    'user_list': Route('admin'),
+    'pending_users': Route('admin'),
+    'bulk_pending_users': Route('admin', 'post', setup=_bulk_users, expect=(302,)),
+    'approve_user': Route('admin', setup=_pending_user, expect=(302,)),
+    'reject_user': Route('admin', setup=_pending_user, expect=(302,)),
+    'admin_event_list': Route('admin'),
+    'admin_pending_events': Route('admin'),
+    'bulk_pending_events': Route('admin', 'post', setup=_bulk_events, expect=(302,)),
+    'approve_event': Route('admin', setup=_pending_event, expect=(302,)),
+    'reject_event': Route('admin', setup=_pending_event, expect=(302,)),
+    'delete_event': Route('admin', setup=_pending_event, expect=(302,)),
+    'admin_event_bookings': Route('admin', kwargs=_event),
+    'admin_bookings_export': Route('admin', kwargs=lambda ctx: {'fmt': 'ndjson'}),
+    'admin_cancel_booking': Route('admin', 'post', setup=_own_booking, expect=(302,)),
+    'admin_cancel_event_bookings': Route('admin', 'post', setup=_sold_event, expect=(302,)),
+    'host_dashboard': Route('host'),
+    'host_event_detail': Route('host', kwargs=_event),
+    'host_event_export': Route('host', kwargs=lambda ctx: {'event_id': ctx.event.pk, 'fmt': 'csv'}),
+    'event_detail': Route(None, kwargs=_event),
+    'seat_availability': Route(None, kwargs=_event),
+    'book_ticket': Route('public', 'post', setup=_book, expect=(302,)),
+    'book_best_available': Route('public', 'post', setup=_book_best, expect=(302,)),
+    'hold_seats': Route('public', 'post', setup=_hold),
+    'release_seats': Route('public', 'post', setup=_release),
+    'my_tickets': Route('public'),
+    'cancel_booking': Route('public', 'post', setup=_own_booking, expect=(302,)),
+    'create_event': Route('host', 'post', setup=_create_event, expect=(302,)),
+}
+
+
+def named_routes():
+    """Names of every route core/urls.py defines."""
+    from . import urls
+    return [pattern.name for pattern in urls.urlpatterns if pattern.name]
+
+
+def run(repeat=20, warmup=2, only=None, ctx=None):
+    """
+    Time every route and return ``{name: summary}``; each summary is the
+    ``bench.summarize`` latency figures plus ``queries`` (median per request).
+    """
+    ctx = ctx or BenchContext()
+    names = [n for n in named_routes() if n not in SKIPPED and (not only or n in only)]
+    missing = [n for n in names if n not in ROUTES]
+    if missing:
+        raise KeyError(f'No benchmark route defined for: {", ".join(missing)}')
+
+    results = {}
+    for name in names:
+        route = ROUTES[name]
+        client = Client()
+        user = getattr(ctx, route.role) if route.role else None
+        samples, queries = [], []
+        for i in range(warmup + repeat):
+            if user is not None:
+                client.force_login(user) # logout ends the session every time
+            spec = route.setup(ctx) if route.setup else {}
+            url = reverse(name, kwargs=spec.get('kwargs') or route.kwargs(ctx))
+            send = getattr(client, route.method)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = send(url, spec.get('data') or {})
+                if response.streaming:
+                    # The body is produced (and queried for) as it is read
+                    for _ in response.streaming_content:
+                        pass
+                    response.close()
+                elapsed = time.perf_counter() - start
+            if response.status_code not in route.expect:
+                raise AssertionError(f'{name}: expected {route.expect}, got {response.status_code} from {url}')
+            if i >= warmup:
+                samples.append(elapsed)
+                queries.append(len(captured))
+        summary = summarize(samples)
+        summary['queries'] = sorted(queries)[len(queries) // 2]
+        results[name] = summary
+    return results
+
+
+def regressions(results, baseline, threshold=0.5, min_delta_ms=2.0, metric='p50'):
+    """
+    Compare ``results`` with a saved ``baseline`` and describe every route
+    that got slower by more than ``threshold`` (a fraction) and at least
+    ``min_delta_ms``, or that now issues more queries.
+    """
+    found = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        old, new = before[metric], current[metric]
+        if new > old * (1 + threshold) and new - old >= min_delta_ms:
+            found.append(f'{name}: {metric} {old:.2f}ms -> {new:.2f}ms (+{(new / old - 1) * 100 if old else 100:.0f}%)')
+        if current['queries'] > before['queries']:
+            found.append(f"{name}: queries {before['queries']} -> {current['queries']}")
+    return found
@@ -0,0 +1,333 @@
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import allocation, live, rollup, stats
+from .models import Booking, Event, EventSeat
+from .seating import SeatMap, retire_grid
+
+
+# Most seats one "best available" request may ask for
+BEST_AVAILABLE_MAX = 10
+
+
+class SeatUnavailable(ValueError):
+    pass
+
+
+def parse_seat_ids(raw):
+    """Split a submitted "A1,A2" string into a de-duplicated, ordered seat list."""
+    seats = []
+    for s in (raw or '').split(','):
+        s = s.strip()
+        if s and s not in seats:
+            seats.append(s)
+    return seats
+
+
+def canonical_seat_ids(event, seat_list):
+    """Validate ``seat_list`` against the venue and return it in canonical spelling."""
+    if not seat_list:
+        raise SeatUnavailable('No seats selected.')
+    seat_map = SeatMap(event.venue_rows, event.venue_cols)
+    canonical = []
+    for seat_id in seat_list:
+        index = seat_map.index_of(seat_id)
+        if index is None:
+            raise SeatUnavailable(f'Seat {seat_id} does not exist.')
+        canonical.append(seat_map.seat_id(index))
+    return list(dict.fromkeys(canonical))
+
+
+def apply_seat_change(event_id, seat_ids, booked, amount):
+    """
+    Set or clear the occupancy bits for ``seat_ids`` and move the event's
+    sales counters by ``amount``; call inside the booking transaction.
+    """
+    event = Event.objects.select_for_update().only(
+        'venue_rows', 'venue_cols', 'seat_bitmap', 'seat_version',
+    ).get(pk=event_id)
+    seat_map = SeatMap.for_event(event)
+    indices = [i for i in map(seat_map.index_of, seat_ids) if i is not None]
+    if booked:
+        seat_map.set(indices)
+    else:
+        seat_map.clear(indices)
+        amount = -amount
+    transaction.on_commit(partial(live.notify, event_id))
+    transaction.on_commit(partial(allocation.seats_changed, event_id, event.seat_version, indices, booked))
+    transaction.on_commit(partial(retire_grid, event_id, event.seat_version, event.venue_rows, event.venue_cols))
+    Event.objects.filter(pk=event_id).update(
+        seat_bitmap=seat_map.to_bytes(),
+        seat_version=F('seat_version') + 1,
+        seats_sold=seat_map.count(),
+        confirmed_revenue=F('confirmed_revenue') + amount,
+    )
+
+
+def create_booking(event, user, seat_list):
+    """
+    Claim ``seat_list`` for ``user`` and record the booking.
+
+    Conflict detection is a single insert into ``EventSeat``; the partial
+    unique index on (event, seat_id) rejects any seat that is already taken,
+    so the cost does not grow with the number of existing bookings.
+    """
+    seat_list = canonical_seat_ids(event, seat_list)
+
+    now = timezone.now()
+    try:
+        # batched_adjustments defers the site-wide total_bookings bump to the end of the
+        # transaction, so the shared SiteStats row is locked only until the commit
+        with transaction.atomic(), stats.batched_adjustments():
+            booking = Booking.objects.create(
+                event=event,
+                user=user,
+                total_cost=event.price * len(seat_list),
+                booking_status='CONFIRMED',
+                seats_booked=','.join(seat_list),
+            )
+            # Seats the user already holds are converted in place; anything else is claimed directly
+            own_holds = EventSeat.objects.filter(
+                event=event, seat_id__in=seat_list, held_by=user, booking__isnull=True, expires_at__gt=now,
+            )
+            held = dict(own_holds.values_list('seat_id', 'pk'))
+            if held:
+                EventSeat.objects.filter(pk__in=held.values()).update(
+                    booking=booking, held_by=None, held_since=None, expires_at=None,
+                )
+            unheld = [seat_id for seat_id in seat_list if seat_id not in held]
+            if unheld:
+                _drop_lapsed_holds(event, unheld, now)
+                EventSeat.objects.bulk_create([
+                    EventSeat(event=event, booking=booking, seat_id=seat_id)
+                    for seat_id in unheld
+                ])
+            apply_seat_change(event.pk, seat_list, booked=True, amount=booking.total_cost)
+            rollup.record([booking])
+    except IntegrityError:
+        raise SeatUnavailable(f'Seat {_first_taken(event, seat_list)} is already booked.')
+
+    return booking
+
+
+def create_bookings(event, requests):
+    """
+    Book many ``(user, seat_list)`` requests for one event in a single
+    transaction, first come first served. Returns one result per request,
+    in order: the Booking, or the SeatUnavailable explaining why not.
+
+    Conflicts are settled in memory against the seats already claimed and
+    the seats granted earlier in the batch, so the whole batch costs a
+    handful of statements however many requests it holds.
+    """
+    results = [None] * len(requests)
+    wanted = []
+    for i, (user, seat_list) in enumerate(requests):
+        try:
+            wanted.append((i, user, canonical_seat_ids(event, seat_list)))
+        except SeatUnavailable as e:
+            results[i] = e
+    if not wanted:
+        return results
+
+    now = timezone.now()
+    requested = {seat_id for _, _, seats in wanted for seat_id in seats}
+    try:
+        with transaction.atomic(), stats.batched_adjustments():
+            claims = {
+                seat.seat_id: seat for seat in EventSeat.objects.filter(
+                    event=event, seat_id__in=requested, is_active=True,
+                ).only('seat_id', 'booking_id', 'held_by_id', 'expires_at')
+            }
+            granted, accepted = set(), []
+            for i, user, seats in wanted:
+                conflict = next((s for s in seats if s in granted or _blocks(claims.get(s), user, now)), None)
+                if conflict:
+                    results[i] = SeatUnavailable(f'Seat {conflict} is already booked.')
+                    continue
+                granted.update(seats)
+                accepted.append((i, user, seats))
+            if not accepted:
+                return results
+
+            lapsed = [seat.pk for seat in claims.values() if seat.booking_id is None and seat.expires_at <= now]
+            if lapsed:
+                EventSeat.objects.filter(pk__in=lapsed).delete()
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    event=event, user=user, total_cost=event.price * len(seats),
+                    booking_status='CONFIRMED', seats_booked=','.join(seats),
+                )
+                for _, user, seats in accepted
+            ])
+            stats.adjust(total_bookings=len(bookings)) # bulk_create sends no post_save
+
+            new_seats = []
+            for booking, (_, user, seats) in zip(bookings, accepted):
+                own_holds = [claims[s].pk for s in seats if s in claims and claims[s].held_by_id == user.pk
+                             and claims[s].expires_at > now]
+                if own_holds:
+                    EventSeat.objects.filter(pk__in=own_holds).update(
+                        booking=booking, held_by=None, held_since=None, expires_at=None,
+                    )
+                new_seats += [
+                    EventSeat(event=event, booking=booking, seat_id=s)
+                    for s in seats if not (s in claims and claims[s].pk in own_holds)
+                ]
+            EventSeat.objects.bulk_create(new_seats)
+            apply_seat_change(event.pk, granted, booked=True, amount=sum(b.total_cost for b in bookings))
+            rollup.record(bookings)
+    except IntegrityError:
+        # A seat was claimed outside this batch in the meantime; settle each request on its own
+        for i, user, seats in wanted:
+            try:
+                results[i] = create_booking(event, user, seats)
+            except SeatUnavailable as e:
+                results[i] = e
+        return results
+
+    for booking, (i, _, _) in zip(bookings, accepted):
+        results[i] = booking
+    return results
+
+
+def book_best_available(event, user, quantity, book=create_booking, attempts=3):
+    """
+    Book the best ``quantity`` adjacent seats still free (see core.allocation).
+    Losing a race for the chosen block just means picking again.
+    """
+    if not 0 < quantity <= BEST_AVAILABLE_MAX:
+        raise SeatUnavailable(f'Choose between 1 and {BEST_AVAILABLE_MAX} seats.')
+    for _ in range(attempts):
+        held = EventSeat.objects.filter(
+            event=event, booking__isnull=True, expires_at__gt=timezone.now(),
+        ).exclude(held_by=user).values_list('seat_id', flat=True)
+        seat_list = allocation.best_seats(event, quantity, exclude=held)
+        if seat_list is None:
+            raise SeatUnavailable(f'No block of {quantity} seats together is left.')
+        try:
+            return book(event, user, seat_list)
+        except SeatUnavailable:
+            event.refresh_from_db(fields=['seat_bitmap', 'seat_version'])
+    raise SeatUnavailable('Seats are selling fast; please try again.')
+
+
+def _blocks(claim, user, now):
+    """Whether an existing EventSeat row stops ``user`` from booking that seat."""
+    if claim is None:
+        return False
+    if claim.booking_id is not None:
+        return True
+    # A hold blocks everyone but its owner until it lapses
+    return claim.held_by_id != user.pk and claim.expires_at > now
+
+
+def _first_taken(event, seat_list):
+    taken = EventSeat.objects.filter(
+        event=event, seat_id__in=seat_list, is_active=True
+    ).values_list('seat_id', flat=True).first()
+    return taken or seat_list[0]
+
+
+def _drop_lapsed_holds(event, seat_list, now):
+    """Remove expired holds on ``seat_list`` so they cannot block a new claim."""
+    EventSeat.objects.filter(
+        event=event, seat_id__in=seat_list, booking__isnull=True, expires_at__lte=now,
+    ).delete()
+
+
+def hold_seats(event, user, seat_list, minutes=None):
+    """
+    Hold ``seat_list`` for ``user`` until the returned expiry time.
+
+    Re-holding seats the user already holds extends them, but never past
+    SEAT_HOLD_MAX_MINUTES after they were first held, and one user holds at
+    most SEAT_HOLD_MAX_SEATS seats per event. Seats held or booked by anyone
+    else raise SeatUnavailable straight away.
+    """
+    seat_list = canonical_seat_ids(event, seat_list)
+    now = timezone.now()
+    expires_at = now + timedelta(minutes=minutes or settings.SEAT_HOLD_MINUTES)
+    longest = timedelta(minutes=settings.SEAT_HOLD_MAX_MINUTES)
+    try:
+        with transaction.atomic():
+            _drop_lapsed_holds(event, seat_list, now)
+            holds = EventSeat.objects.filter(event=event, held_by=user, booking__isnull=True, expires_at__gt=now)
+            if holds.exclude(seat_id__in=seat_list).count() + len(seat_list) > settings.SEAT_HOLD_MAX_SEATS:
+                raise SeatUnavailable(f'You can hold at most {settings.SEAT_HOLD_MAX_SEATS} seats for this event.')
+            renewed = dict(holds.filter(seat_id__in=seat_list).values_list('seat_id', 'held_since'))
+            # Holds from before held_since existed count from now
+            since = {seat_id: renewed.get(seat_id) or now for seat_id in seat_list}
+            expiries = {seat_id: min(expires_at, since[seat_id] + longest) for seat_id in seat_list}
+            for first_held in {since[seat_id] for seat_id in renewed}:
+                seat_ids = [seat_id for seat_id in renewed if since[seat_id] == first_held]
+                holds.filter(seat_id__in=seat_ids).update(held_since=first_held, expires_at=expiries[seat_ids[0]])
+            EventSeat.objects.bulk_create([
+                EventSeat(event=event, held_by=user, held_since=now, expires_at=expiries[seat_id], seat_id=seat_id)
+                for seat_id in seat_list if seat_id not in renewed
+            ])
+    except IntegrityError:
+        raise SeatUnavailable(f'Seat {_first_taken(event, seat_list)} is no longer available.')
+    return seat_list, min(expiries.values())
+
+
+def release_holds(event, user, seat_list=None):
+    holds = EventSeat.objects.filter(event=event, held_by=user, booking__isnull=True)
+    if seat_list is not None:
+        holds = holds.filter(seat_id__in=seat_list)
+    return holds.delete()[0]
+
+
+def release_expired_holds(now=None):
+    """Bulk-release every lapsed hold; run periodically by the release_expired_holds command."""
+    return EventSeat.objects.filter(
+        booking__isnull=True, expires_at__lte=now or timezone.now(),
+    ).delete()[0]
+
+
+def cancel_booking(booking):
+    """Cancel a confirmed booking and release its seats."""
+    with transaction.atomic():
+        updated = Booking.objects.filter(pk=booking.pk, booking_status='CONFIRMED').update(booking_status='CANCELLED')
+        if not updated:
+            return False
+        # Only the seats this booking really claimed; legacy double-booked rows list seats another booking owns
+        claimed = EventSeat.objects.filter(booking=booking, is_active=True)
+        seat_ids = list(claimed.values_list('seat_id', flat=True))
+        claimed.update(is_active=False)
+        apply_seat_change(booking.event_id, seat_ids, booked=False, amount=booking.total_cost)
+        rollup.record([booking], sign=-1)
+    booking.booking_status = 'CANCELLED'
+    return True
+
+
+def cancel_event_bookings(event):
+    """
+    Cancel every confirmed booking of ``event`` and release all of its seats.
+
+    Every booked seat belongs to one of those bookings, so the bitmap and
+    the sales counters go straight to empty and zero; nothing is added up
+    booking by booking. Returns how many bookings were cancelled.
+    """
+    with transaction.atomic():
+        locked = Event.objects.select_for_update().only('venue_rows', 'venue_cols', 'seat_version').get(pk=event.pk)
+        cancelled = Booking.objects.filter(event=event, booking_status='CONFIRMED').update(booking_status='CANCELLED')
+        if not cancelled:
+            return 0
+        EventSeat.objects.filter(event=event, booking__isnull=False, is_active=True).update(is_active=False)
+        # No seats_changed call: the version bump makes the allocation index rebuild from the empty bitmap
+        transaction.on_commit(partial(live.notify, event.pk))
+        transaction.on_commit(partial(retire_grid, event.pk, locked.seat_version, locked.venue_rows, locked.venue_cols))
+        Event.objects.filter(pk=event.pk).update(
+            seat_bitmap=SeatMap(locked.venue_rows, locked.venue_cols).to_bytes(),
+            seat_version=F('seat_version') + 1,
+            seats_sold=0,
+            confirmed_revenue=0,
+        )
+        rollup.clear(event.pk)
+    return cancelled
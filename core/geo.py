@@ -0,0 +1,111 @@
+"""
+Nearby-event lookup.
+
+Each located Event stores ``geo_cell``, the id of the fixed
+CELL_DEGREES x CELL_DEGREES lat/lng cell it falls in. A radius query
+expands to the set of cells overlapping its bounding box and fetches
+candidates with an indexed ``geo_cell IN (...)`` lookup. A wide radius
+overlaps too many cells to list, so it is looked up as one ``geo_cell``
+range per row of cells instead (a row's cells have consecutive ids).
+Exact haversine distances are then computed only for those candidates.
+"""
+import heapq
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEGREES = 0.25
+LNG_CELLS = int(360 / CELL_DEGREES)
+# Beyond this many cells the box is looked up as per-row id ranges instead of a list
+MAX_CELLS = 600
+
+
+def geo_cell(lat, lng):
+    if lat is None or lng is None:
+        return None
+    row = int((float(lat) + 90) // CELL_DEGREES)
+    col = int((float(lng) + 180) // CELL_DEGREES) % LNG_CELLS
+    return row * LNG_CELLS + col
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng); longitudes may wrap past +/-180."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    if min_lat <= -90 or max_lat >= 90:
+        return min_lat, max_lat, -180.0, 180.0 # a pole is inside the circle
+    dlng = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    if dlng >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lng - dlng, lng + dlng
+
+
+def cells_for_box(min_lat, max_lat, min_lng, max_lng):
+    rows = range(int((min_lat + 90) // CELL_DEGREES), int((min(max_lat, 89.999999) + 90) // CELL_DEGREES) + 1)
+    first_col = int((min_lng + 180) // CELL_DEGREES)
+    last_col = int((max_lng + 180) // CELL_DEGREES)
+    cols = {c % LNG_CELLS for c in range(first_col, last_col + 1)}
+    if len(rows) * len(cols) > MAX_CELLS:
+        return None
+    return [row * LNG_CELLS + col for row in rows for col in cols]
+
+
+def cell_ranges(min_lat, max_lat, min_lng, max_lng):
+    """The cells overlapping the box as inclusive (first, last) id ranges, one or two per row of cells."""
+    rows = range(int((min_lat + 90) // CELL_DEGREES), int((min(max_lat, 89.999999) + 90) // CELL_DEGREES) + 1)
+    first_col = int((min_lng + 180) // CELL_DEGREES)
+    last_col = int((max_lng + 180) // CELL_DEGREES)
+    if last_col - first_col + 1 >= LNG_CELLS:
+        spans = [(0, LNG_CELLS - 1)]
+    else:
+        first_col, last_col = first_col % LNG_CELLS, last_col % LNG_CELLS
+        # A box across the antimeridian wraps to the start of the row
+        spans = [(first_col, last_col)] if first_col <= last_col else [(0, last_col), (first_col, LNG_CELLS - 1)]
+    ranges = []
+    for row in rows:
+        for first, last in spans:
+            first, last = row * LNG_CELLS + first, row * LNG_CELLS + last
+            if ranges and ranges[-1][1] + 1 == first:
+                ranges[-1] = (ranges[-1][0], last) # whole-width rows run into each other
+            else:
+                ranges.append((first, last))
+    return ranges
+
+
+def nearby_events(queryset, lat, lng, radius_km, limit):
+    """
+    Return up to ``limit`` events from ``queryset`` within ``radius_km`` of
+    (lat, lng), nearest first, each with a ``distance_km`` attribute.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    candidates = queryset.filter(location_lat__gte=min_lat, location_lat__lte=max_lat)
+    cells = cells_for_box(min_lat, max_lat, min_lng, max_lng)
+    if cells is not None:
+        candidates = candidates.filter(geo_cell__in=cells)
+    else:
+        in_ranges = Q()
+        for first, last in cell_ranges(min_lat, max_lat, min_lng, max_lng):
+            in_ranges |= Q(geo_cell__range=(first, last))
+        candidates = candidates.filter(in_ranges)
+
+    within = []
+    for pk, event_lat, event_lng in candidates.values_list('pk', 'location_lat', 'location_lng').iterator():
+        distance = haversine_km(lat, lng, float(event_lat), float(event_lng))
+        if distance <= radius_km:
+            within.append((distance, pk))
+
+    nearest = heapq.nsmallest(limit, within)
+    events = queryset.in_bulk([pk for _, pk in nearest])
+    results = []
+    for distance, pk in nearest:
+        event = events[pk]
+        event.distance_km = distance
+        results.append(event)
+    return results
@@ -0,0 +1,157 @@
+"""
+Live seat-map updates over Server-Sent Events.
+
+Each event being watched gets one SeatFeed per server process (per event
+loop). The feed is the only thing that reads the database: it re-checks
+``Event.seat_version`` every SEAT_STREAM_POLL_SECONDS, or at once when a
+booking in this process calls ``notify()``. When the version moves, it
+diffs the old and new seat bitmaps and fans the booked/released seat
+indices out to every connected browser. A thousand watchers of one
+on-sale cost the same single query as one watcher.
+
+Streaming needs an ASGI server (``config.asgi:application``) and
+SEAT_STREAM turned on; ``streaming()`` checks both. Under WSGI an async
+view runs in a loop that is closed as soon as the view returns, before the
+response is read, so the feed could never run there. Pages served without
+the stream poll ``seat_availability`` with ETags instead.
+"""
+import asyncio
+import base64
+import json
+import logging
+import threading
+import weakref
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from .models import Event
+from .seating import SeatMap
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15
+QUEUE_SIZE = 64
+
+_feeds = weakref.WeakKeyDictionary() # event loop -> {event_id: SeatFeed}
+_feeds_lock = threading.Lock()
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class SeatFeed:
+    def __init__(self, event_id, loop):
+        self.event_id = event_id
+        self.loop = loop
+        self.subscribers = set()
+        self.version = None
+        self.seat_map = None
+        self._wake = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._task = None
+
+    async def _load(self):
+        event = await Event.objects.only('venue_rows', 'venue_cols', 'seat_bitmap', 'seat_version').aget(pk=self.event_id)
+        return event.seat_version, SeatMap.for_event(event)
+
+    def _snapshot(self):
+        return _sse('snapshot', {
+            'version': self.version,
+            'booked': base64.b64encode(self.seat_map.to_bytes()).decode(),
+        })
+
+    def _publish(self, message):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A stalled client skips the backlog and resyncs from a full snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(message and self._snapshot())
+
+    async def _run(self):
+        poll = getattr(settings, 'SEAT_STREAM_POLL_SECONDS', 2)
+        self._ready.clear()
+        try:
+            self.version, self.seat_map = await self._load()
+            self._ready.set()
+            while self.subscribers:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), poll)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                version, seat_map = await self._load()
+                if version == self.version:
+                    continue
+                old, new = set(self.seat_map.booked_indices()), set(seat_map.booked_indices())
+                self.version, self.seat_map = version, seat_map
+                self._publish(_sse('seats', {
+                    'version': version,
+                    'booked': sorted(new - old),
+                    'released': sorted(old - new),
+                }))
+        except Exception:
+            # Close the streams; browsers reconnect and get a fresh feed
+            if self.seat_map is not None:
+                logger.exception('Seat feed for event %s failed', self.event_id)
+            self.seat_map = None
+            self._publish(None)
+        finally:
+            self._task = None
+            self._ready.set() # release any stream still waiting for a first load
+            if not self.subscribers:
+                with _feeds_lock:
+                    _feeds.get(self.loop, {}).pop(self.event_id, None)
+
+    def wake(self):
+        self._wake.set()
+
+    async def stream(self):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self._task is None:
+            self._task = self.loop.create_task(self._run())
+        try:
+            await self._ready.wait()
+            if self.seat_map is None:
+                return
+            yield self._snapshot()
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if message is None:
+                    return # the event was deleted
+                yield message
+        finally:
+            self.subscribers.discard(queue)
+
+
+def streaming(request):
+    """Whether ``request`` can be answered with a live seat stream."""
+    return settings.SEAT_STREAM and isinstance(request, ASGIRequest)
+
+
+def get_feed(event_id):
+    loop = asyncio.get_running_loop()
+    with _feeds_lock:
+        feeds = _feeds.setdefault(loop, {})
+        feed = feeds.get(event_id)
+        if feed is None:
+            feed = feeds[event_id] = SeatFeed(event_id, loop)
+    return feed
+
+
+def notify(event_id):
+    """Wake every local feed for ``event_id``; safe to call from any thread."""
+    with _feeds_lock:
+        feeds = [loop_feeds[event_id] for loop_feeds in _feeds.values() if event_id in loop_feeds]
+    for feed in feeds:
+        if not feed.loop.is_closed():
+            feed.loop.call_soon_threadsafe(feed.wake)
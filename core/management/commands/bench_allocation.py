@@ -0,0 +1,92 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from core.allocation import FreeRuns, best_block_by_scan
+from core.bench import summarize, time_calls
+from core.seating import SeatMap
+
+
+class Command(BaseCommand):
+    help = 'Time best-available seat picks from the free-run index against a full grid scan (in memory, no database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--venues', nargs='+', default=['100x100', '300x300', '50x1000'], metavar='ROWSxCOLS')
+        parser.add_argument('--fills', nargs='+', type=float, default=[0.5, 0.9, 0.98])
+        parser.add_argument('--sizes', nargs='+', type=int, default=[2, 4, 8])
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--scan-repeat', type=int, default=5, help='The full scan is slow; time it fewer times')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.stdout.write(
+            f"{'venue':<9} {'fill':>5} {'n':>2}  {'index p50':>10} {'p99':>9}  {'scan p50':>10}  "
+            f"{'take':>8} {'rebuild':>9}"
+        )
+        for venue in options['venues']:
+            rows, cols = map(int, venue.lower().split('x'))
+            for fill in options['fills']:
+                seat_map = self.filled(rng, rows, cols, fill)
+                index = FreeRuns.from_seat_map(seat_map)
+                rebuild = summarize(time_calls(lambda: FreeRuns.from_seat_map(seat_map), options['scan_repeat']))
+                for n in options['sizes']:
+                    expected = best_block_by_scan(seat_map, n)
+                    if index.best(n) != expected:
+                        self.stderr.write(f'{venue} fill={fill} n={n}: index and scan disagree')
+                    picked = summarize(time_calls(lambda: index.best(n), options['repeat']))
+                    scanned = summarize(time_calls(lambda: best_block_by_scan(seat_map, n), options['scan_repeat']))
+                    take = summarize(self.time_updates(rng, index, n, options['repeat']))
+                    self.stdout.write(
+                        f"{venue:<9} {fill:>5.0%} {n:>2}  {self.us(picked['p50']):>10} {self.us(picked['p99']):>9}  "
+                        f"{self.us(scanned['p50']):>10}  {self.us(take['p50']) if take['n'] else '-':>8} {self.us(rebuild['p50']):>9}"
+                    )
+            self.sell_out(rows, cols, options['sizes'])
+
+    def filled(self, rng, rows, cols, fill):
+        """A seat map booked to ``fill`` in blocks of 1-6, the way a sale leaves it."""
+        seat_map = SeatMap(rows, cols)
+        target = int(seat_map.capacity * fill)
+        while seat_map.count() < target:
+            start = rng.randrange(seat_map.capacity)
+            r = start // cols
+            seat_map.set(range(start, min(start + rng.randint(1, 6), (r + 1) * cols)))
+        return seat_map
+
+    def time_updates(self, rng, index, n, repeat):
+        """Cost of patching the index for one n-seat booking and its cancellation, leaving it as it was."""
+        samples = []
+        runs = [(r, s, e) for r, row in enumerate(index.runs) for s, e in row if e - s >= n]
+        for _ in range(repeat if runs else 0):
+            r, s, e = rng.choice(runs)
+            start = r * index.cols + rng.randint(s, e - n)
+            seats = range(start, start + n)
+            samples += time_calls(lambda: index.take(seats), 1)
+            samples += time_calls(lambda: index.release(seats), 1)
+        return samples
+
+    def sell_out(self, rows, cols, sizes):
+        """Fill an empty venue by best-available picks alone, patching the index after each booking."""
+        rng = random.Random(rows * cols)
+        index = FreeRuns.from_seat_map(SeatMap(rows, cols))
+        samples, sold = [], 0
+        while True:
+            n = rng.choice(sizes)
+            samples += time_calls(lambda: index.best(n), 1)
+            start = index.best(n)
+            if start is None:
+                n = 1
+                start = index.best(1)
+                if start is None:
+                    break
+            index.take(range(start, start + n))
+            sold += n
+        stats = summarize(samples)
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows}x{cols} sold out by best-available: {sold} seats, {stats["n"]} picks, '
+            f'p50={self.us(stats["p50"])} p99={self.us(stats["p99"])} max={self.us(max(samples) * 1000)}'
+        ))
+
+    @staticmethod
+    def us(ms):
+        return f'{ms * 1000:.0f}us' if ms < 1 else f'{ms:.1f}ms'
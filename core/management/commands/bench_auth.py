@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core.bench import scratch_database, summarize, time_calls
+from core.models import Booking, Event, User
+
+MODES = ('db', 'cache', 'signed_cookies')
+
+# (role, URL name, whether it takes the event id)
+ROUTES = (
+    ('public', 'dashboard_dispatch', False),
+    ('public', 'browse_events', False),
+    ('public', 'event_detail', True),
+    ('public', 'my_tickets', False),
+    ('host', 'host_dashboard', False),
+    ('admin', 'admin_dashboard', False),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Count the session and user queries each logged-in request makes under every SESSION_MODE, '
+        'with and without cached user snapshots (uses a scratch database)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--hosts', type=int, default=20)
+        parser.add_argument('--events', type=int, default=100)
+        parser.add_argument('--bookings', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            call_command(
+                'populate_data', users=options['users'], hosts=options['hosts'], events=options['events'],
+                bookings=options['bookings'], stdout=StringIO(),
+            )
+            setup_test_environment()
+            try:
+                results = self.run(options['repeat'], options['warmup'])
+            finally:
+                teardown_test_environment()
+
+        self.stdout.write(
+            f"\n{'session':<15} {'snapshot':<9} {'route':<19} {'queries':>7} {'session':>8} {'user':>5} {'p50':>9}"
+        )
+        for (mode, snapshots), rows in results.items():
+            for name, queries, session, user, stats in rows:
+                self.stdout.write(
+                    f"{mode:<15} {'on' if snapshots else 'off':<9} {name:<19} {queries:>7} {session:>8} {user:>5} "
+                    f"{stats['p50']:7.2f}ms"
+                )
+
+        baseline = results['db', False]
+        per_request = lambda rows: sum(row[1] for row in rows) / len(rows)
+        for (mode, snapshots), rows in results.items():
+            saved = per_request(baseline) - per_request(rows)
+            p50 = sum(row[4]['p50'] for row in rows) / len(rows)
+            self.stdout.write(self.style.SUCCESS(
+                f"SESSION_MODE={mode} snapshots {'on' if snapshots else 'off'}: "
+                f"{per_request(rows):.2f} queries/request ({saved:.2f} saved), mean p50 {p50:.2f}ms"
+            ))
+
+    def accounts(self):
+        event = Event.objects.filter(status='APPROVED').order_by('-seats_sold', 'pk').first()
+        top_buyer = Booking.objects.values('user').annotate(n=Count('pk')).order_by('-n', 'user').first()
+        users = {
+            'public': User.objects.get(pk=top_buyer['user']),
+            'host': event.host,
+            'admin': User.objects.filter(role='ADMIN').order_by('pk').first(),
+        }
+        for user in users.values():
+            user.is_approved = True
+            user.save()
+        return users, event
+
+    def run(self, repeat, warmup):
+        users, event = self.accounts()
+        results = {}
+        for mode in MODES:
+            for snapshots in (False, True):
+                engine = f'django.contrib.sessions.backends.{mode}'
+                with override_settings(SESSION_ENGINE=engine, USER_SNAPSHOT_SECONDS=60 if snapshots else 0):
+                    caches['auth'].clear()
+                    caches['sessions'].clear()
+                    clients = {}
+                    for role, user in users.items():
+                        clients[role] = Client()
+                        clients[role].force_login(user)
+                    rows = []
+                    for role, name, by_event in ROUTES:
+                        client = clients[role]
+                        url = reverse(name, kwargs={'event_id': event.pk} if by_event else {})
+                        for _ in range(warmup):
+                            response = client.get(url)
+                            assert response.status_code in (200, 302), (name, response.status_code)
+                        with CaptureQueriesContext(connection) as ctx:
+                            client.get(url)
+                        sql = [q['sql'] for q in ctx.captured_queries]
+                        rows.append((
+                            name, len(sql),
+                            sum('"django_session"' in s for s in sql),
+                            sum('FROM "core_user"' in s for s in sql),
+                            summarize(time_calls(lambda: client.get(url), repeat)),
+                        ))
+                results[mode, snapshots] = rows
+        return results
@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test.utils import override_settings
+
+from core import batching
+from core.bench import scratch_file_database, summarize
+from core.booking import SeatUnavailable, create_booking
+from core.models import Event, User
+from core.seating import SeatMap
+
+MODES = {
+    'direct': create_booking,
+    'group-commit': batching.book,
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure flash-sale booking throughput, one transaction per booking vs group commit (uses a scratch database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=32)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--rows', type=int, default=100)
+        parser.add_argument('--cols', type=int, default=100)
+        parser.add_argument('--max-seats', type=int, default=4, help='Each request asks for 1..N random seats')
+        parser.add_argument('--window-ms', type=float, default=settings.BOOKING_BATCH_WINDOW_MS)
+        parser.add_argument('--batch-size', type=int, default=settings.BOOKING_BATCH_SIZE)
+        parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['direct', 'group-commit'])
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            self.stderr.write('This benchmark uses a scratch SQLite file; the default database is not SQLite.')
+            return
+        with scratch_file_database(settings.SQLITE_PRODUCTION_OPTIONS):
+            call_command('populate_data', users=options['clients'], hosts=1, events=1, bookings=0, stdout=StringIO())
+            buyers = list(User.objects.filter(role='PUBLIC'))
+            host = User.objects.filter(role='HOST').first()
+            with override_settings(BOOKING_BATCH_WINDOW_MS=options['window_ms'],
+                                   BOOKING_BATCH_SIZE=options['batch_size']):
+                for mode in options['modes']:
+                    hall = Event.objects.create(
+                        host=host, title=f'Flash Sale ({mode})', date='2030-01-01', time='20:00', price=10,
+                        venue_rows=options['rows'], venue_cols=options['cols'], status='APPROVED',
+                    )
+                    results = self.run_workload(MODES[mode], hall, buyers, options)
+                    hall.refresh_from_db()
+                    self.report(mode, hall, results, options['seconds'])
+
+    def run_workload(self, book, hall, buyers, options):
+        seat_map = SeatMap(hall.venue_rows, hall.venue_cols)
+        connections['default'].close()
+        deadline = time.perf_counter() + options['seconds']
+        results = {'booked': [], 'rejected': 0, 'errors': 0}
+        results_lock = threading.Lock()
+
+        def client(user, rng):
+            samples, rejected, errors = [], 0, 0
+            while time.perf_counter() < deadline:
+                seats = [seat_map.seat_id(rng.randrange(seat_map.capacity))
+                         for _ in range(rng.randint(1, options['max_seats']))]
+                start = time.perf_counter()
+                try:
+                    book(hall, user, seats)
+                    samples.append(time.perf_counter() - start)
+                except SeatUnavailable:
+                    rejected += 1
+                except OperationalError:
+                    errors += 1
+            connections['default'].close()
+            with results_lock:
+                results['booked'] += samples
+                results['rejected'] += rejected
+                results['errors'] += errors
+
+        threads = [
+            threading.Thread(target=client, args=(buyers[i % len(buyers)], random.Random(i)))
+            for i in range(options['clients'])
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def report(self, mode, hall, results, seconds):
+        stats = summarize(results['booked'])
+        # Every committed transaction bumps seat_version once
+        per_commit = hall.seats_sold / hall.seat_version if hall.seat_version else 0
+        self.stdout.write(
+            f"{mode:<13} {stats['n'] / seconds:8.1f} bookings/s  rejected={results['rejected']}  "
+            f"errors={results['errors']}  seats_sold={hall.seats_sold}  commits={hall.seat_version}  "
+            f"seats/commit={per_commit:.1f}  p50={stats['p50']:.2f}ms  p95={stats['p95']:.2f}ms  "
+            f"p99={stats['p99']:.2f}ms"
+        )
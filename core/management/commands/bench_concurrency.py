@@ -0,0 +1,108 @@
+import itertools
+import random
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from core.bench import scratch_file_database, summarize
+from core.booking import SeatUnavailable, create_booking
+from core.models import Booking, Event, User
+from core.seating import SeatMap
+
+PROFILES = {
+    # Django's defaults: rollback journal, deferred transactions, a connection per request
+    'default': ({'init_command': 'PRAGMA journal_mode=DELETE;'}, 0),
+    'production': (settings.SQLITE_PRODUCTION_OPTIONS, settings.SQLITE_PRODUCTION_CONN_MAX_AGE),
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure SQLite reader/writer throughput under each database profile (uses scratch databases)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--events', type=int, default=500)
+        parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['default', 'production'])
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            self.stderr.write('This benchmark compares SQLite settings; the default database is not SQLite.')
+            return
+        for name in options['profiles']:
+            db_options, conn_max_age = PROFILES[name]
+            with scratch_file_database(db_options):
+                call_command(
+                    'populate_data', users=options['writers'] * 10, hosts=10, events=options['events'],
+                    bookings=options['events'] * 5, stdout=StringIO(),
+                )
+                self.report(name, self.run_workload(options, conn_max_age))
+
+    def run_workload(self, options, conn_max_age):
+        event_ids = list(Event.objects.filter(status='APPROVED').values_list('pk', flat=True))
+        hall = Event.objects.create(
+            host=User.objects.filter(role='HOST').first(), title='Concurrency Hall', date='2030-01-01',
+            time='20:00', price=10, venue_rows=200, venue_cols=200, status='APPROVED',
+        )
+        buyers = list(User.objects.filter(role='PUBLIC'))
+        seats = itertools.count()
+        seat_lock = threading.Lock()
+        seat_map = SeatMap(hall.venue_rows, hall.venue_cols)
+        connections['default'].close()
+
+        deadline = time.perf_counter() + options['seconds']
+        results = {'read': [], 'write': [], 'read_errors': 0, 'write_errors': 0}
+        results_lock = threading.Lock()
+
+        def worker(kind, rng):
+            samples, errors = [], 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    if kind == 'read':
+                        # What event_detail and my_tickets read
+                        event = Event.objects.get(pk=rng.choice(event_ids))
+                        SeatMap.for_event(event).count()
+                        list(Booking.objects.filter(event=event).order_by('-created_at')[:20])
+                    else:
+                        with seat_lock:
+                            seat = seat_map.seat_id(next(seats) % seat_map.capacity)
+                        create_booking(Event.objects.get(pk=hall.pk), rng.choice(buyers), [seat])
+                    samples.append(time.perf_counter() - start)
+                except (OperationalError, SeatUnavailable):
+                    errors += 1
+                if not conn_max_age:
+                    connections['default'].close() # what the end of a request does without persistent connections
+            connections['default'].close()
+            with results_lock:
+                results[kind] += samples
+                results[f'{kind}_errors'] += errors
+
+        threads = [
+            threading.Thread(target=worker, args=('read', random.Random(i)))
+            for i in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=('write', random.Random(1000 + i)))
+            for i in range(options['writers'])
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        results['seconds'] = options['seconds']
+        return results
+
+    def report(self, profile, results):
+        self.stdout.write(f'\nprofile={profile}')
+        for kind in ('read', 'write'):
+            stats = summarize(results[kind])
+            self.stdout.write(
+                f"  {kind + 's':<7} {stats['n'] / results['seconds']:8.1f}/s  p50={stats['p50']:7.2f}ms  "
+                f"p95={stats['p95']:7.2f}ms  p99={stats['p99']:7.2f}ms  errors={results[kind + '_errors']}"
+            )
@@ -0,0 +1,67 @@
+import datetime
+import random
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.bench import scratch_database, summarize, time_calls
+from core.models import Event, User
+from core.search import search_events
+
+WORDS = (
+    'jazz rock opera comedy symphony festival theatre ballet acoustic live night summer winter '
+    'orchestra quartet tribute indie folk electronic dance gala premiere matinee cabaret blues '
+    'choir piano guitar violin poetry magic circus improv musical revival encore world tour'
+).split()
+FILLER = 'an evening of with the and for all ages featuring special guests doors open early'.split()
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains and FTS5 event search over a generated catalogue (uses a scratch database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.populate(options['events'], random.Random(options['seed']))
+            self.report(options['repeat'])
+
+    def populate(self, count, rng):
+        host = User.objects.create_user('bench_host', role='HOST')
+        today = timezone.now().date()
+        batch = []
+        for i in range(count):
+            batch.append(Event(
+                host=host,
+                title=' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title(),
+                description=' '.join(rng.choice(WORDS + FILLER * 3) for _ in range(rng.randint(10, 40))),
+                date=today + datetime.timedelta(days=rng.randint(-30, 365)),
+                time=datetime.time(rng.randint(10, 22), 0),
+                price=rng.randint(5, 150),
+                status=rng.choice(['APPROVED'] * 8 + ['PENDING', 'REJECTED']),
+            ))
+            if len(batch) == 5000:
+                Event.objects.bulk_create(batch)
+                batch = []
+        Event.objects.bulk_create(batch)
+        self.stdout.write(f'Generated {count} events')
+
+    def report(self, repeat):
+        base = Event.objects.filter(date__gte=timezone.now().date(), status='APPROVED').order_by('date', 'time')
+        strategies = {
+            'title icontains (old)': lambda q: base.filter(title__icontains=q),
+            'title+description icontains': lambda q: base.filter(Q(title__icontains=q) | Q(description__icontains=q)),
+            'fts5': lambda q: search_events(base, q, using_fts=True),
+        }
+        for query in ('jazz', 'string quartet', 'tour', 'nonexistentword'):
+            self.stdout.write(f'\nq={query!r}')
+            for name, build in strategies.items():
+                hits = build(query).count()
+                stats = summarize(time_calls(lambda: list(build(query)[:50]), repeat))
+                self.stdout.write(
+                    f'  {name:<30} hits={hits:<7} p50={stats["p50"]:8.2f}ms p95={stats["p95"]:8.2f}ms'
+                )
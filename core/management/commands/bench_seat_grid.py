@@ -0,0 +1,74 @@
+import random
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+
+from core.bench import summarize, time_calls
+from core.seating import SeatMap, row_label, seat_layout
+
+# The per-seat markup from public/event_detail.html
+GRID_TEMPLATE = """{% for row_items in grid_rows %}{% for item in row_items %}
+<div class="seat {% if item.is_booked %}booked{% endif %}" data-id="{{ item.seat_id }}"
+    data-label="{{ item.row }}{{ item.col }}" title="{{ item.row }}{{ item.col }}">{{ item.row }}{{ item.col }}</div>
+{% endfor %}{% endfor %}"""
+
+
+def legacy_row_label(r):
+    return row_label(r) if r < 26 else f"R{r+1}"
+
+
+def legacy_grid(rows, cols, seat_map):
+    """The list-of-dicts builder the detail views used before SeatLayout."""
+    grid_rows = []
+    for r in range(rows):
+        row_char = legacy_row_label(r)
+        row_seats = []
+        for c in range(1, cols + 1):
+            row_seats.append({
+                'seat_id': f"{row_char}{c}",
+                'row': row_char,
+                'col': c,
+                'is_booked': seat_map.is_booked(r * cols + c - 1),
+            })
+        grid_rows.append(row_seats)
+    return grid_rows
+
+
+class Command(BaseCommand):
+    help = 'Compare the old list-of-dicts seat grid with SeatLayout, building and rendering it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shapes', default='10x10,40x60,320x320',
+                            help='Comma-separated ROWSxCOLS venue sizes')
+        parser.add_argument('--occupancy', type=float, default=0.4)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        template = engines['django'].from_string(GRID_TEMPLATE)
+        for shape in options['shapes'].split(','):
+            rows, cols = (int(n) for n in shape.lower().split('x'))
+            seat_map = SeatMap(rows, cols)
+            seat_map.set(i for i in range(rows * cols) if rng.random() < options['occupancy'])
+            self.stdout.write(f'\n{rows}x{cols} ({rows * cols} seats)')
+
+            strategies = {
+                'list of dicts (old)': lambda: legacy_grid(rows, cols, seat_map),
+                'SeatLayout': lambda: seat_layout(rows, cols).grid(seat_map),
+            }
+            for name, build in strategies.items():
+                consume = lambda: sum(1 for row in build() for _ in row)
+                render = lambda: template.render({'grid_rows': build()})
+                build_stats = summarize(time_calls(consume, options['repeat']))
+                render_stats = summarize(time_calls(render, options['repeat']))
+
+                tracemalloc.start()
+                consume()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f'  {name:<22} build p50={build_stats["p50"]:9.2f}ms  '
+                    f'render p50={render_stats["p50"]:9.2f}ms  build peak={peak / 1024:9.1f}KiB'
+                )
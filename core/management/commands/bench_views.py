@@ -0,0 +1,70 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import bench_routes
+from core.bench import scratch_database
+
+
+class Command(BaseCommand):
+    help = 'Time every named route against a generated dataset (uses a scratch database) and check for regressions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--hosts', type=int, default=200)
+        parser.add_argument('--events', type=int, default=5000)
+        parser.add_argument('--bookings', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', nargs='+', metavar='URL_NAME', help='Benchmark just these routes')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to PATH as JSON')
+        parser.add_argument('--baseline', metavar='PATH', help='Fail if any route regressed against this JSON file')
+        # Separate runs of the same code differ by 10-20%; query counts are exact
+        parser.add_argument('--threshold', type=float, default=0.5,
+                            help='Allowed slowdown as a fraction of the baseline (default 0.5)')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Ignore slowdowns smaller than this many milliseconds')
+        parser.add_argument('--metric', choices=['p50', 'p95', 'p99'], default='p50')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        with scratch_database():
+            call_command(
+                'populate_data', users=options['users'], hosts=options['hosts'], events=options['events'],
+                bookings=options['bookings'], seed=options['seed'], stdout=StringIO(),
+            )
+            # Same request environment as the test runner (allows the test client's host)
+            setup_test_environment()
+            try:
+                results = bench_routes.run(options['repeat'], options['warmup'], options['only'])
+            finally:
+                teardown_test_environment()
+
+        self.stdout.write(f"\n{'route':<22} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+        for name, s in results.items():
+            self.stdout.write(f"{name:<22} {s['p50']:8.2f}ms {s['p95']:8.2f}ms {s['p99']:8.2f}ms {s['queries']:>8}")
+        for name, reason in bench_routes.SKIPPED.items():
+            self.stdout.write(f'{name:<22} skipped: {reason}')
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}")
+
+        if baseline is not None:
+            found = bench_routes.regressions(
+                results, baseline, options['threshold'], options['min_delta_ms'], options['metric'],
+            )
+            if found:
+                for line in found:
+                    self.stderr.write(line)
+                raise CommandError(f'{len(found)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
@@ -1,21 +1,85 @@
-from django.core.management.base import BaseCommand
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from django.utils import timezone
-from core.models import User, Auditorium, Seat, Event
-from datetime import timedelta
+
+from core import rollup, stats
+from core.geo import geo_cell
+from core.models import Booking, Event, EventSeat, User
+from core.seating import SeatMap
+
+TITLE_WORDS = (
+    'jazz rock opera comedy symphony festival theatre ballet acoustic live night summer winter '
+    'orchestra quartet tribute indie folk electronic dance gala premiere matinee cabaret blues '
+    'choir piano guitar violin poetry magic circus improv musical revival encore world tour'
+).split()
+FILLER = 'an evening of with the and for all ages featuring special guests doors open early'.split()
+
+# (lat, lng) of the cities events are scattered around
+CITIES = [
+    (40.7128, -74.0060), (34.0522, -118.2437), (41.8781, -87.6298), (51.5074, -0.1278),
+    (48.8566, 2.3522), (52.5200, 13.4050), (35.6762, 139.6503), (19.0760, 72.8777),
+    (-33.8688, 151.2093), (-23.5505, -46.6333), (43.6532, -79.3832), (1.3521, 103.8198),
+]
+# (rows, cols) venue shapes, weighted towards small rooms
+VENUES = [(5, 10), (10, 10), (12, 20), (20, 30), (30, 40), (40, 60)]
+VENUE_WEIGHTS = [20, 30, 25, 15, 7, 3]
+GROUP_SIZES = [1, 2, 3, 4, 5, 6]
+GROUP_WEIGHTS = [15, 40, 15, 20, 5, 5]
+CANCEL_RATE = 0.03
+
 
 class Command(BaseCommand):
-    help = 'Populate database with initial data'
+    help = 'Create the demo accounts and, optionally, a large seeded synthetic dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0, help='Public users to generate')
+        parser.add_argument('--hosts', type=int, default=0, help='Hosts to generate')
+        parser.add_argument('--events', type=int, default=0, help='Events to generate')
+        parser.add_argument('--bookings', type=int, default=0, help='Approximate number of bookings to generate')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk', type=int, default=2000, help='Rows per transaction')
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
         self.stdout.write('Populating data...')
+        self.create_demo_data()
 
-        # Create Users
+        if any(options[k] for k in ('users', 'hosts', 'events', 'bookings')):
+            rng = random.Random(options['seed'])
+            self.prefix = f"s{options['seed']}_"
+            if User.objects.filter(username__startswith=self.prefix).exists():
+                raise CommandError(f"Data for seed {options['seed']} already exists; pick another --seed")
+            self.chunk = options['chunk']
+            self.verbosity = options['verbosity']
+            self.password = make_password('password123') # hashed once, shared by every generated account
+
+            start = time.perf_counter()
+            public_ids = self.create_users(rng, options['users'], 'PUBLIC')
+            host_ids = self.create_users(rng, options['hosts'], 'HOST')
+            if options['events'] and not host_ids:
+                raise CommandError('--events needs at least one --hosts')
+            if options['bookings'] and not public_ids:
+                raise CommandError('--bookings needs at least one --users')
+            self.create_events(rng, options['events'], options['bookings'], host_ids, public_ids)
+            stats.recompute()
+            rollup.rebuild() # bulk_create skips the booking path that keeps it current
+            self.stdout.write(f'Generated in {time.perf_counter() - start:.1f}s')
+
+        self.stdout.write(self.style.SUCCESS('Data population complete!'))
+
+    def create_demo_data(self):
         admin_user, created = User.objects.get_or_create(username='admin', email='admin@example.com')
         if created:
             admin_user.set_password('admin123')
             admin_user.role = 'ADMIN'
             admin_user.is_staff = True
             admin_user.is_superuser = True
+            admin_user.is_approved = True
             admin_user.save()
             self.stdout.write('Created Admin user')
 
@@ -31,21 +95,17 @@ class Command(BaseCommand):
         if created:
             public_user.set_password('user123')
             public_user.role = 'PUBLIC'
+            public_user.is_approved = True
             public_user.save()
             self.stdout.write('Created Public user')
 
-        # Create Event
-        import datetime
-        event_date = timezone.now().date() + datetime.timedelta(days=1)
-        event_time = datetime.time(19, 0) # 7 PM
-        
         event, created = Event.objects.get_or_create(
             title='Rock Concert',
             host=host_user,
             defaults={
                 'description': 'A live rock concert featuring top bands.',
-                'date': event_date,
-                'time': event_time,
+                'date': timezone.now().date() + datetime.timedelta(days=1),
+                'time': datetime.time(19, 0),
                 'price': 50.00,
                 'venue_rows': 5,
                 'venue_cols': 10,
@@ -58,4 +118,155 @@ class Command(BaseCommand):
         if created:
             self.stdout.write(f'Created Event: {event.title}')
 
-        self.stdout.write(self.style.SUCCESS('Data population complete!'))
+    def create_users(self, rng, count, role):
+        ids = []
+        now = timezone.now()
+        kind = role.lower()
+        for first in range(0, count, self.chunk):
+            batch = []
+            for i in range(first, min(first + self.chunk, count)):
+                username = f'{self.prefix}{kind}{i}'
+                batch.append(User(
+                    username=username,
+                    email=f'{username}@example.com',
+                    password=self.password,
+                    role=role,
+                    # Hosts wait for approval now and then; public accounts almost never do
+                    is_approved=rng.random() > (0.1 if role == 'HOST' else 0.01),
+                    date_joined=now - datetime.timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+                ))
+            with transaction.atomic():
+                ids += [user.pk for user in User.objects.bulk_create(batch)]
+            if self.verbosity > 1:
+                self.stdout.write(f'  {len(ids)}/{count} {kind} users')
+        if count:
+            self.stdout.write(f'Created {count} {kind} users')
+        return ids
+
+    def create_events(self, rng, count, booking_target, host_ids, public_ids):
+        self.now = timezone.now()
+        today = self.now.date()
+        # Roughly how many bookings an approved event gets; popularity skews it per event
+        per_event = booking_target / max(1, count * 0.8)
+        created_bookings = 0
+        for first in range(0, count, self.chunk):
+            events, plans = [], []
+            for _ in range(first, min(first + self.chunk, count)):
+                event = self.make_event(rng, today, host_ids)
+                plan = []
+                if event.status == 'APPROVED' and booking_target:
+                    # Lognormal popularity with a mean of about 1: most events sell a little, a few sell out
+                    wanted = round(per_event * rng.lognormvariate(-0.32, 0.8))
+                    plan = self.fill_event(rng, event, wanted, public_ids)
+                events.append(event)
+                plans.append(plan)
+
+            with transaction.atomic():
+                Event.objects.bulk_create(events)
+                bookings = []
+                for event, plan in zip(events, plans):
+                    for booking, seat_ids, booked_at in plan:
+                        booking.event_id = event.pk
+                        bookings.append((booking, seat_ids, booked_at))
+                Booking.objects.bulk_create([b for b, _, _ in bookings])
+                self.backdate((booked_at, booking.pk) for booking, _, booked_at in bookings)
+                self.insert_seats(
+                    (booking.event_id, booking.pk, seat_id, booking.booking_status == 'CONFIRMED')
+                    for booking, seat_ids, _ in bookings for seat_id in seat_ids
+                )
+            created_bookings += len(bookings)
+            if self.verbosity > 1:
+                self.stdout.write(f'  {first + len(events)}/{count} events, {created_bookings} bookings')
+        if count:
+            self.stdout.write(f'Created {count} events and {created_bookings} bookings')
+
+    def insert_seats(self, rows):
+        # Seat rows outnumber everything else; building an EventSeat per row
+        # costs more than the INSERT itself, so these skip the ORM
+        opts = EventSeat._meta
+        columns = [opts.get_field(name).column for name in ('event', 'booking', 'seat_id', 'is_active')]
+        sql = (
+            f"INSERT INTO {connection.ops.quote_name(opts.db_table)} "
+            f"({', '.join(map(connection.ops.quote_name, columns))}) VALUES (%s, %s, %s, %s)"
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, list(rows))
+
+    def backdate(self, rows):
+        # created_at is auto_now_add, so bulk_create stamps every booking with the
+        # current time; spread them over each event's sale period afterwards
+        opts = Booking._meta
+        sql = (
+            f"UPDATE {connection.ops.quote_name(opts.db_table)} "
+            f"SET {connection.ops.quote_name(opts.get_field('created_at').column)} = %s "
+            f"WHERE {connection.ops.quote_name(opts.pk.column)} = %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [(connection.ops.adapt_datetimefield_value(at), pk) for at, pk in rows])
+
+    def make_event(self, rng, today, host_ids):
+        rows, cols = rng.choices(VENUES, VENUE_WEIGHTS)[0]
+        lat, lng = rng.choice(CITIES)
+        location = rng.random() < 0.9
+        # Rounded as stored, so the cell matches what Event.save() would derive from the saved row
+        lat = Decimal(f'{lat + rng.gauss(0, 0.15):.6f}') if location else None
+        lng = Decimal(f'{lng + rng.gauss(0, 0.15):.6f}') if location else None
+        return Event(
+            host_id=rng.choice(host_ids),
+            title=' '.join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(2, 4))).title(),
+            description=' '.join(rng.choice(TITLE_WORDS + FILLER * 3) for _ in range(rng.randint(10, 40))),
+            date=today + datetime.timedelta(days=rng.randint(-60, 180)),
+            time=datetime.time(rng.choice([11, 14, 18, 19, 19, 20, 20, 21]), rng.choice([0, 0, 30])),
+            price=Decimal(rng.choice([0, 5, 10, 15, 20, 25, 35, 50, 75, 120])),
+            venue_rows=rows,
+            venue_cols=cols,
+            status=rng.choices(['APPROVED', 'PENDING', 'REJECTED'], [85, 10, 5])[0],
+            location_lat=lat,
+            location_lng=lng,
+            # bulk_create skips Event.save(), so fill in what it would derive
+            geo_cell=geo_cell(lat, lng),
+        )
+
+    def fill_event(self, rng, event, wanted, public_ids):
+        """Seat ``wanted`` bookings in ``event``, updating its bitmap and sales counters."""
+        seat_map = SeatMap(event.venue_rows, event.venue_cols)
+        rows, cols = event.venue_rows, event.venue_cols
+        plan = []
+        misses = 0
+        while len(plan) < wanted and misses < 20:
+            size = min(rng.choices(GROUP_SIZES, GROUP_WEIGHTS)[0], cols)
+            # Groups sit together, preferring the front rows and the middle of the row
+            r = min(rows - 1, int(rows * rng.betavariate(1.5, 2.5)))
+            c = int((cols - size) * rng.betavariate(3, 3))
+            indices = range(r * cols + c, r * cols + c + size)
+            if any(seat_map.is_booked(i) for i in indices):
+                misses += 1
+                continue
+            misses = 0
+            cancelled = rng.random() < CANCEL_RATE
+            if not cancelled:
+                seat_map.set(indices)
+                event.seats_sold += size
+                event.confirmed_revenue += event.price * size
+            event.seat_version += 1 + cancelled
+            plan.append((
+                Booking(
+                    user_id=rng.choice(public_ids),
+                    seats_booked=','.join(seat_map.seat_id(i) for i in indices),
+                    total_cost=event.price * size,
+                    booking_status='CANCELLED' if cancelled else 'CONFIRMED',
+                ),
+                [seat_map.seat_id(i) for i in indices],
+            ))
+        event.seat_bitmap = seat_map.to_bytes()
+        return [(booking, seat_ids, at) for (booking, seat_ids), at in zip(plan, self.sale_times(rng, event, len(plan)))]
+
+    def sale_times(self, rng, event, count):
+        """
+        When ``count`` bookings for ``event`` were made, oldest first: a rush
+        when sales open, tailing off until the event starts (or until now).
+        """
+        starts = timezone.make_aware(datetime.datetime.combine(event.date, event.time))
+        end = min(self.now, starts)
+        opened = min(starts - datetime.timedelta(days=rng.randint(14, 90)), end - datetime.timedelta(hours=1))
+        return sorted(opened + (end - opened) * rng.betavariate(0.7, 2.5) for _ in range(count))
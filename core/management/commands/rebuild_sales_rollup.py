@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core import rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly sales rollup from Booking.created_at'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, action='append', dest='events', metavar='EVENT_ID',
+                            help='Only rebuild these events (repeatable); default is every event')
+
+    def handle(self, *args, **options):
+        written = rollup.rebuild(options['events'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} hourly sales rows.'))
@@ -0,0 +1,38 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from core.models import Event, EventSeat
+from core.seating import build_seat_map, retire_grid
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Event.seat_bitmap from booked EventSeat rows to repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help='Only rebuild these events')
+
+    def handle(self, *args, **options):
+        events = Event.objects.only('venue_rows', 'venue_cols', 'seat_bitmap').order_by('pk')
+        if options['event_ids']:
+            events = events.filter(pk__in=options['event_ids'])
+
+        checked = repaired = 0
+        for event in events.iterator(chunk_size=500):
+            with transaction.atomic():
+                event = Event.objects.select_for_update().only(
+                    'venue_rows', 'venue_cols', 'seat_bitmap', 'seat_version',
+                ).get(pk=event.pk)
+                seat_ids = EventSeat.objects.filter(event=event, is_active=True, booking__isnull=False).values_list('seat_id', flat=True)
+                bitmap = build_seat_map(event.venue_rows, event.venue_cols, seat_ids).to_bytes()
+                if bytes(event.seat_bitmap) != bitmap:
+                    Event.objects.filter(pk=event.pk).update(seat_bitmap=bitmap, seat_version=F('seat_version') + 1)
+                    transaction.on_commit(partial(
+                        retire_grid, event.pk, event.seat_version, event.venue_rows, event.venue_cols,
+                    ))
+                    repaired += 1
+            checked += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} events, repaired {repaired} seat maps.'))
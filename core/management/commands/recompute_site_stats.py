@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.models import SiteStats
+from core.stats import STATS_PK, recompute
+
+FIELDS = ('total_users', 'active_events', 'total_bookings', 'pending_users', 'pending_events')
+
+
+class Command(BaseCommand):
+    help = 'Recount the admin dashboard totals from scratch and report any drift'
+
+    def handle(self, *args, **options):
+        before = SiteStats.objects.filter(pk=STATS_PK).first()
+        after = recompute()
+        drifted = 0
+        for name in FIELDS:
+            old, new = (getattr(before, name) if before else None), getattr(after, name)
+            if old != new:
+                drifted += 1
+                self.stdout.write(f'{name}: {old} -> {new}')
+        self.stdout.write(self.style.SUCCESS(f'Recomputed site stats ({drifted} counters drifted).'))
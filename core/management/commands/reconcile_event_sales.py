@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from core.models import Booking, Event
+from core.seating import SeatMap
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute Event.seats_sold and Event.confirmed_revenue and fix any drift. seats_sold is counted '
+        'from the seat map, as bookings do; run rebuild_seat_maps first if the map itself has drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        drifted = 0
+        event_ids = Event.objects.order_by('pk').values_list('pk', flat=True)
+        for event_id in event_ids.iterator(chunk_size=2000):
+            with transaction.atomic():
+                # Same lock as apply_seat_change, so no booking can commit between the count and the write
+                event = Event.objects.select_for_update().only(
+                    'venue_rows', 'venue_cols', 'seat_bitmap', 'seats_sold', 'confirmed_revenue',
+                ).filter(pk=event_id).first()
+                if event is None:
+                    continue
+                expected_sold = SeatMap.for_event(event).count()
+                expected_revenue = Booking.objects.filter(
+                    event=event_id, booking_status='CONFIRMED',
+                ).aggregate(total=Sum('total_cost'))['total'] or 0
+                if event.seats_sold == expected_sold and event.confirmed_revenue == expected_revenue:
+                    continue
+                self.stdout.write(
+                    f'Event {event.pk}: seats_sold {event.seats_sold} -> {expected_sold}, '
+                    f'confirmed_revenue {event.confirmed_revenue} -> {expected_revenue}'
+                )
+                drifted += 1
+                if not options['dry_run']:
+                    Event.objects.filter(pk=event_id).update(seats_sold=expected_sold, confirmed_revenue=expected_revenue)
+
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {drifted} events with drifted sales counters.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.booking import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Release seat holds whose expiry time has passed (run from cron)'
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired seat holds.'))
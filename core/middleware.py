@@ -0,0 +1,98 @@
+"""
+Per-request SQL instrumentation.
+
+QueryInstrumentationMiddleware is opt-in (SQL_INSTRUMENTATION = True).
+When it is off it raises MiddlewareNotUsed at startup, so Django drops it
+from the chain and requests pay nothing. When it is on, every query on
+every database connection is timed through ``execute_wrapper`` and each
+response gets:
+
+* a ``Server-Timing`` header (``db`` time with the query count, ``app``
+  total time) that browser dev tools show next to the request, and
+* one JSON log line on the ``core.sql`` logger keyed by URL name, with
+  the query count, SQL time, slowest statement and any N+1 suspects.
+
+A statement shape (the SQL text with IN lists collapsed) that runs
+SQL_N_PLUS_ONE_THRESHOLD or more times in one request is reported as an
+N+1 suspect, and the log line is raised to WARNING.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('core.sql')
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def statement_shape(sql):
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, None)
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if elapsed > self.slowest[0]:
+                self.slowest = (elapsed, sql)
+            self.shapes[statement_shape(sql)] += 1
+
+    def repeated(self, threshold):
+        return [(sql, n) for sql, n in self.shapes.most_common() if n >= threshold]
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        response['Server-Timing'] = (
+            f'db;desc="{recorder.count} queries";dur={recorder.duration * 1000:.2f}, '
+            f'app;dur={total * 1000:.2f}'
+        )
+
+        match = request.resolver_match
+        suspects = recorder.repeated(self.threshold)
+        slowest_time, slowest_sql = recorder.slowest
+        logger.log(logging.WARNING if suspects else logging.INFO, json.dumps({
+            'url_name': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'slowest_ms': round(slowest_time * 1000, 2),
+            'slowest_sql': slowest_sql,
+            'n_plus_one': [{'sql': sql, 'count': n} for sql, n in suspects],
+        }))
+        return response
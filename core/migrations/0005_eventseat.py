@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_event_location_lat_event_location_lng_event_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seat_id', models.CharField(max_length=12)),
+                ('is_active', models.BooleanField(default=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seats', to='core.booking')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seats', to='core.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('event', 'seat_id'), name='unique_active_event_seat')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def backfill_event_seats(apps, schema_editor):
+    Booking = apps.get_model('core', 'Booking')
+    EventSeat = apps.get_model('core', 'EventSeat')
+
+    batch = []
+    bookings = Booking.objects.filter(booking_status='CONFIRMED').order_by('created_at', 'id')
+    for booking in bookings.iterator(chunk_size=2000):
+        for seat_id in booking.seats_booked.split(','):
+            seat_id = seat_id.strip()
+            if seat_id:
+                batch.append(EventSeat(event_id=booking.event_id, booking_id=booking.id, seat_id=seat_id))
+        if len(batch) >= 2000:
+            # Earlier bookings win if legacy data was double-booked
+            EventSeat.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        EventSeat.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_eventseat'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_event_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_backfill_eventseat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='seat_bitmap',
+            field=models.BinaryField(default=b'', help_text='Occupancy bitset, see core.seating.SeatMap'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from core.seating import build_seat_map
+
+
+def backfill_seat_bitmaps(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    EventSeat = apps.get_model('core', 'EventSeat')
+
+    for event in Event.objects.only('venue_rows', 'venue_cols').iterator(chunk_size=500):
+        seat_ids = EventSeat.objects.filter(event=event, is_active=True).values_list('seat_id', flat=True)
+        event.seat_bitmap = build_seat_map(event.venue_rows, event.venue_cols, seat_ids).to_bytes()
+        event.save(update_fields=['seat_bitmap'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_event_seat_bitmap'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_seat_bitmaps, migrations.RunPython.noop),
+    ]
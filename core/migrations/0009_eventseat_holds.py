@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_backfill_seat_bitmap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventseat',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventseat',
+            name='held_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='eventseat',
+            name='booking',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seats', to='core.booking'),
+        ),
+        migrations.AddIndex(
+            model_name='eventseat',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False)), fields=['expires_at'], name='eventseat_hold_expiry'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill_sales_counters(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    Booking = apps.get_model('core', 'Booking')
+    EventSeat = apps.get_model('core', 'EventSeat')
+
+    sold = dict(
+        EventSeat.objects.filter(is_active=True, booking__isnull=False)
+        .values_list('event').annotate(n=Count('pk')).values_list('event', 'n')
+    )
+    revenue = dict(
+        Booking.objects.filter(booking_status='CONFIRMED')
+        .values_list('event').annotate(total=Sum('total_cost')).values_list('event', 'total')
+    )
+    for event_id in set(sold) | set(revenue):
+        Event.objects.filter(pk=event_id).update(
+            seats_sold=sold.get(event_id, 0),
+            confirmed_revenue=revenue.get(event_id) or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_event_sales_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sales_counters, migrations.RunPython.noop),
+    ]
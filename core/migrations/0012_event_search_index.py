@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from core.search import install_fts, uninstall_fts
+
+
+def create_search_index(apps, schema_editor):
+    install_fts(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    uninstall_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_backfill_event_sales_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
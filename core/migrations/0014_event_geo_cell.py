@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+from core.geo import geo_cell
+
+
+def backfill_geo_cells(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    located = Event.objects.filter(location_lat__isnull=False, location_lng__isnull=False)
+    for event in located.only('location_lat', 'location_lng').iterator(chunk_size=2000):
+        event.geo_cell = geo_cell(event.location_lat, event.location_lng)
+        event.save(update_fields=['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='geo_cell',
+            field=models.IntegerField(blank=True, editable=False, help_text='Grid cell of the location, see core.geo', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['geo_cell', 'status', 'date'], name='event_geo_cell'),
+        ),
+        migrations.RunPython(backfill_geo_cells, migrations.RunPython.noop),
+    ]
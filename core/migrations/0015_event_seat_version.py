@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_event_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='seat_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped on every change to seat_bitmap'),
+        ),
+    ]
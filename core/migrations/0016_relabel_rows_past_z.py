@@ -0,0 +1,65 @@
+import string
+
+from django.db import migrations
+from django.db.models import F
+
+from core.seating import build_seat_map, row_label
+
+
+def _legacy_seat_index(seat_id, rows, cols):
+    # Rows past Z used to be labelled R27, R28 ... so "R271" was row 27, seat 1;
+    # like the old parser, a plain row-R reading wins when both are valid
+    prefix, digits = seat_id[:1], seat_id[1:]
+    if prefix not in string.ascii_uppercase or not digits.isdigit():
+        return None
+    candidates = [(string.ascii_uppercase.index(prefix), digits)]
+    if prefix == 'R':
+        candidates += [
+            (int(digits[:k]) - 1, digits[k:]) for k in range(2, len(digits))
+            if int(digits[:k]) > 26 and digits[0] != '0'
+        ]
+    for r, col in candidates:
+        c = int(col)
+        if 0 <= r < rows and 1 <= c <= cols and str(c) == col:
+            return r * cols + c - 1
+    return None
+
+
+def relabel_rows(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    EventSeat = apps.get_model('core', 'EventSeat')
+    Booking = apps.get_model('core', 'Booking')
+
+    for event in Event.objects.filter(venue_rows__gt=26).only('venue_rows', 'venue_cols').iterator(chunk_size=500):
+        rows, cols = event.venue_rows, event.venue_cols
+
+        def relabel(seat_id):
+            index = _legacy_seat_index(seat_id.strip().upper(), rows, cols)
+            if index is None:
+                return seat_id
+            r, c = divmod(index, cols)
+            return f"{row_label(r)}{c + 1}"
+
+        for seat in EventSeat.objects.filter(event=event).only('seat_id'):
+            new_id = relabel(seat.seat_id)
+            if new_id != seat.seat_id:
+                EventSeat.objects.filter(pk=seat.pk).update(seat_id=new_id)
+        for booking in Booking.objects.filter(event=event).only('seats_booked'):
+            seats = ','.join(relabel(s.strip()) for s in booking.seats_booked.split(',') if s.strip())
+            if seats != booking.seats_booked:
+                Booking.objects.filter(pk=booking.pk).update(seats_booked=seats)
+
+        seat_ids = EventSeat.objects.filter(event=event, is_active=True, booking__isnull=False).values_list('seat_id', flat=True)
+        bitmap = build_seat_map(rows, cols, seat_ids).to_bytes()
+        Event.objects.filter(pk=event.pk).update(seat_bitmap=bitmap, seat_version=F('seat_version') + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_event_seat_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(relabel_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_relabel_rows_past_z'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_users', models.IntegerField(default=0)),
+                ('active_events', models.IntegerField(default=0)),
+                ('total_bookings', models.IntegerField(default=0)),
+                ('pending_users', models.IntegerField(default=0)),
+                ('pending_events', models.IntegerField(default=0)),
+                ('recomputed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:59
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Length, Replace, TruncHour
+
+
+def backfill(apps, schema_editor):
+    Booking = apps.get_model('core', 'Booking')
+    SalesRollup = apps.get_model('core', 'SalesRollup')
+    seat_count = Length('seats_booked') - Length(Replace('seats_booked', Value(','), Value(''))) + 1
+    buckets = (
+        Booking.objects.filter(booking_status='CONFIRMED')
+        .annotate(bucket=TruncHour('created_at', tzinfo=datetime.timezone.utc))
+        .values('event_id', 'bucket')
+        .annotate(n=Count('pk'), seat_total=Sum(seat_count), revenue_total=Sum('total_cost'))
+        .order_by()
+        .values_list('event_id', 'bucket', 'n', 'seat_total', 'revenue_total')
+    )
+    SalesRollup.objects.bulk_create(
+        (SalesRollup(event_id=e, hour=h, bookings=n, seats=seats, revenue=revenue)
+         for e, h, n, seats, revenue in buckets.iterator(chunk_size=1000)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_site_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour (UTC)')),
+                ('bookings', models.IntegerField(default=0)),
+                ('seats', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollup', to='core.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'hour'), name='unique_event_sales_hour')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
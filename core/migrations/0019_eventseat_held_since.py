@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventseat',
+            name='held_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:50
+
+import core.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_eventseat_held_since'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSearchIndex',
+            fields=[
+                ('event', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='core.event')),
+                ('document', core.search.DocumentField(db_column='core_event_fts')),
+            ],
+            options={
+                'db_table': 'core_event_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
 
+from .geo import geo_cell
+from .search import FTS_TABLE, DocumentField
+
 class User(AbstractUser):
     ROLE_CHOICES = (
         ('ADMIN', 'Administrator'),
@@ -10,6 +14,13 @@ class User(AbstractUser):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='PUBLIC')
     is_approved = models.BooleanField(default=True) # False for Host initially
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['is_approved', 'date_joined'], name='user_approved_joined'),
+            models.Index(fields=['role', 'date_joined'], name='user_role_joined'),
+            models.Index(fields=['date_joined'], name='user_joined'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.pk and not self.is_superuser:
             self.is_approved = False
@@ -34,10 +45,68 @@ class Event(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
     location_lat = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
     location_lng = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False, help_text="Grid cell of the location, see core.geo")
+    seat_bitmap = models.BinaryField(default=b'', editable=False, help_text="Occupancy bitset, see core.seating.SeatMap")
+    seat_version = models.PositiveIntegerField(default=0, editable=False, help_text="Bumped on every change to seat_bitmap")
+    # Maintained in the booking transaction; repair with `manage.py reconcile_event_sales`
+    seats_sold = models.PositiveIntegerField(default=0, editable=False)
+    confirmed_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'date', 'time'], name='event_status_date_time'),
+            models.Index(fields=['date', 'time'], name='event_date_time'),
+            models.Index(fields=['geo_cell', 'status', 'date'], name='event_geo_cell'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.geo_cell = geo_cell(self.location_lat, self.location_lng)
+        elif {'location_lat', 'location_lng'} & set(update_fields):
+            self.geo_cell = geo_cell(self.location_lat, self.location_lng)
+            kwargs['update_fields'] = {*update_fields, 'geo_cell'}
+        super().save(*args, **kwargs)
+
+    @property
+    def seat_etag(self):
+        return f"seats-{self.pk}-{self.seat_version}"
+
+    @property
+    def total_capacity(self):
+        return self.venue_rows * self.venue_cols
+
+    @property
+    def balance_seats(self):
+        return self.total_capacity - self.seats_sold
+
+class _DerivedRowsManager(models.Manager):
+    """Finds nothing, so dumpdata leaves the rows out; joins from Event don't use it."""
+
+    def get_queryset(self):
+        return super().get_queryset().none()
+
+class EventSearchIndex(models.Model):
+    """
+    The FTS5 index over event titles and descriptions, so searches can join it
+    (see core.search). Not managed by migrations: install_fts creates it where
+    SQLite has FTS5, and triggers keep it in sync, so it is only ever read.
+    """
+    event = models.OneToOneField(
+        Event, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_index',
+    )
+    document = DocumentField(db_column=FTS_TABLE)
+
+    objects = _DerivedRowsManager()
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
+
 class Booking(models.Model):
     STATUS_CHOICES = (
         ('CONFIRMED', 'Confirmed'),
@@ -50,5 +119,80 @@ class Booking(models.Model):
     booking_status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='CONFIRMED')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'booking_status'], name='booking_event_status'),
+            models.Index(fields=['user', '-created_at'], name='booking_user_created'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.event.title}"
+
+    def seat_list(self):
+        return [s.strip() for s in self.seats_booked.split(',') if s.strip()]
+
+class EventSeat(models.Model):
+    """
+    One row per claimed seat; the partial unique constraint is the double-booking guard.
+    A row without a booking is a temporary hold that lapses at ``expires_at``.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='seats')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='seats', null=True, blank=True)
+    held_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seat_holds', null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    held_since = models.DateTimeField(null=True, blank=True) # first hold; renewals can't run past SEAT_HOLD_MAX_MINUTES
+    seat_id = models.CharField(max_length=12)
+    is_active = models.BooleanField(default=True) # False once the booking is cancelled
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['event', 'seat_id'],
+                condition=Q(is_active=True),
+                name='unique_active_event_seat',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], condition=Q(expires_at__isnull=False), name='eventseat_hold_expiry'),
+        ]
+
+    @property
+    def is_hold(self):
+        return self.booking_id is None
+
+    def __str__(self):
+        return f"{self.event_id}:{self.seat_id}"
+
+class SiteStats(models.Model):
+    """
+    Single-row table of the admin dashboard totals, kept current by the
+    signal handlers in core.stats. Repair with `manage.py recompute_site_stats`.
+    """
+    total_users = models.IntegerField(default=0)
+    active_events = models.IntegerField(default=0)
+    total_bookings = models.IntegerField(default=0)
+    pending_users = models.IntegerField(default=0)
+    pending_events = models.IntegerField(default=0)
+    recomputed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Site stats (recomputed {self.recomputed_at})"
+
+class SalesRollup(models.Model):
+    """
+    Confirmed bookings, seats and revenue per event per hour of ``Booking.created_at``,
+    kept current by core.booking through core.rollup. Rebuild with `manage.py rebuild_sales_rollup`.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='sales_rollup')
+    hour = models.DateTimeField(help_text="Start of the hour (UTC)")
+    bookings = models.IntegerField(default=0)
+    seats = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'hour'], name='unique_event_sales_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} @ {self.hour:%Y-%m-%d %H:00}"
@@ -0,0 +1,69 @@
+"""
+Bulk approval and rejection of pending users and events.
+
+Each function takes a queryset of the items to act on, already narrowed
+to pending ones, and works through it in primary-key batches. Every batch
+is one UPDATE (approve) or one cascading DELETE (reject) in its own
+transaction, so a backlog of thousands never holds the database for long.
+"""
+from functools import partial
+
+from django.db import transaction
+
+from . import auth, stats
+from .models import Event, User
+
+BATCH_SIZE = 500
+
+
+def _batches(queryset, batch_size=BATCH_SIZE):
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def approve_users(queryset):
+    approved = 0
+    for pks in _batches(queryset.filter(is_approved=False)):
+        with transaction.atomic():
+            n = User.objects.filter(pk__in=pks, is_approved=False).update(is_approved=True)
+            stats.adjust(pending_users=-n)
+            # update() sends no post_save, so drop the cached snapshots here
+            transaction.on_commit(partial(auth.forget, pks))
+        approved += n
+    return approved
+
+
+def reject_users(queryset):
+    rejected = 0
+    for pks in _batches(queryset.filter(is_approved=False)):
+        with transaction.atomic(), stats.batched_adjustments():
+            _, per_model = User.objects.filter(pk__in=pks, is_approved=False).delete()
+        rejected += per_model.get(User._meta.label, 0)
+    return rejected
+
+
+def approve_events(queryset):
+    approved = 0
+    for pks in _batches(queryset.filter(status='PENDING')):
+        with transaction.atomic():
+            n = Event.objects.filter(pk__in=pks, status='PENDING').update(status='APPROVED')
+            stats.adjust(pending_events=-n, active_events=n)
+        approved += n
+    return approved
+
+
+def reject_events(queryset):
+    rejected = 0
+    for pks in _batches(queryset.filter(status='PENDING')):
+        with transaction.atomic(), stats.batched_adjustments():
+            _, per_model = Event.objects.filter(pk__in=pks, status='PENDING').delete()
+        rejected += per_model.get(Event._meta.label, 0)
+    return rejected
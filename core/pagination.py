@@ -0,0 +1,164 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+A cursor records the ordering values of the row at the edge of the
+current page, and the next page is fetched with a range filter on those
+values. Every page therefore costs the same indexed seek, however deep it
+is, unlike OFFSET pagination which has to walk past every earlier row.
+"""
+import base64
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 24
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, base_query):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._base_query = base_query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor)
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor)
+
+    def _url(self, cursor):
+        if cursor is None:
+            return None
+        query = self._base_query.copy()
+        query['cursor'] = cursor
+        return f'?{query.urlencode()}'
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [_encode_value(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        return None
+    # Only what encode_cursor writes; a null or nested value can't be filtered on
+    if not all(isinstance(v, (str, int, float)) for v in values):
+        return None
+    return direction, values
+
+
+def _split(ordering):
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def _to_python(queryset, name, value):
+    annotation = queryset.query.annotations.get(name) # such as a search rank
+    if annotation is not None:
+        return annotation.output_field.to_python(value)
+    model = queryset.model
+    try:
+        field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return value
+    return field.to_python(value)
+
+
+def _after(keys, values, reverse=False):
+    """Q for rows strictly after ``values`` in the (possibly reversed) ordering."""
+    # The redundant bound on the leading key lets SQLite turn this into an index range scan
+    name, descending = keys[0]
+    bound = Q(**{f"{name}__{'lte' if descending != reverse else 'gte'}": values[0]})
+    condition = Q()
+    for i, (name, descending) in enumerate(keys):
+        lookup = 'lt' if descending != reverse else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for j in range(i):
+            clause &= Q(**{keys[j][0]: values[j]})
+        condition |= clause
+    return bound & condition
+
+
+def _value(obj, name):
+    return obj.pk if name == 'pk' else getattr(obj, name)
+
+
+def paginate(request, queryset, ordering, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Return one KeysetPage of ``queryset`` in ``ordering``.
+
+    ``ordering`` must end with a unique key (normally ``pk``) so that every
+    row has a distinct position. The cursor is read from ``?cursor=``.
+    """
+    keys = _split(ordering)
+    base_query = request.GET.copy()
+    base_query.pop('cursor', None)
+
+    direction, values = 'n', None
+    cursor = decode_cursor(request.GET.get('cursor', ''))
+    if cursor and len(cursor[1]) == len(keys):
+        # A malformed or tampered cursor just shows the first page
+        try:
+            values = [_to_python(queryset, name, v) for (name, _), v in zip(keys, cursor[1])]
+        except (ValidationError, TypeError, ValueError, OverflowError):
+            values = None
+        if values is not None and None not in values:
+            direction = cursor[0]
+        else:
+            values = None
+
+    if direction == 'p':
+        reversed_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+        rows = list(queryset.filter(_after(keys, values, reverse=True)).order_by(*reversed_ordering)[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        qs = queryset.order_by(*ordering)
+        if values is not None:
+            qs = qs.filter(_after(keys, values))
+        rows = list(qs[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = values is not None
+
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor('n', [_value(rows[-1], name) for name, _ in keys])
+    if rows and has_previous:
+        previous_cursor = encode_cursor('p', [_value(rows[0], name) for name, _ in keys])
+    return KeysetPage(rows, has_next, has_previous, next_cursor, previous_cursor, base_query)
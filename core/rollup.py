@@ -0,0 +1,144 @@
+"""
+Hourly sales rollup for host analytics.
+
+``SalesRollup`` holds one row per event per hour in which confirmed
+bookings were made: how many bookings, seats and how much revenue. The
+booking functions in core.booking call ``record()`` in the same
+transaction as every booking and cancellation. A cancellation is taken off
+the hour the booking was made in, so the table always matches what
+``rebuild()`` would compute from ``Booking.created_at`` and its totals match
+the event's ``seats_sold`` and ``confirmed_revenue``.
+
+The host page reads one event's rows (a few hundred at most) instead of
+its bookings; ``sales_summary()`` turns them into totals and a
+sales-velocity series.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Length, Replace, TruncHour
+
+from .models import Booking, SalesRollup
+
+# Most bars the velocity chart draws; longer sales are shown in wider buckets
+MAX_BARS = 72
+REBUILD_BATCH_SIZE = 1000
+
+
+def hour_of(moment):
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def record(bookings, sign=1):
+    """
+    Add ``bookings`` to the rollup, or take them off again with ``sign=-1``.
+    Call inside the transaction that creates or cancels them.
+    """
+    deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+    for booking in bookings:
+        delta = deltas[booking.event_id, hour_of(booking.created_at)]
+        delta[0] += sign
+        delta[1] += sign * len(booking.seat_list())
+        delta[2] += sign * booking.total_cost
+    for (event_id, hour), (n, seats, revenue) in deltas.items():
+        _add(event_id, hour, n, seats, revenue)
+
+
+def _add(event_id, hour, bookings, seats, revenue):
+    bucket = SalesRollup.objects.filter(event_id=event_id, hour=hour)
+    changes = {'bookings': F('bookings') + bookings, 'seats': F('seats') + seats, 'revenue': F('revenue') + revenue}
+    if bucket.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SalesRollup.objects.create(event_id=event_id, hour=hour, bookings=bookings, seats=seats, revenue=revenue)
+    except IntegrityError:
+        bucket.update(**changes) # another booking in the same hour created the row first
+
+
+def clear(event_id):
+    """Empty an event's rollup, for when all of its bookings are cancelled at once."""
+    SalesRollup.objects.filter(event_id=event_id).delete()
+
+
+def _seat_count():
+    # "A1,A2,A3" has one more seat than it has commas
+    return Length('seats_booked') - Length(Replace('seats_booked', Value(','), Value(''))) + 1
+
+
+def rebuild(event_ids=None):
+    """Recompute the rollup from the bookings table; returns how many rows were written."""
+    bookings = Booking.objects.filter(booking_status='CONFIRMED')
+    rows = SalesRollup.objects.all()
+    if event_ids is not None:
+        bookings = bookings.filter(event_id__in=event_ids)
+        rows = rows.filter(event_id__in=event_ids)
+    buckets = (
+        bookings.annotate(bucket=TruncHour('created_at', tzinfo=dt_timezone.utc))
+        .values('event_id', 'bucket')
+        .annotate(n=Count('pk'), seat_total=Sum(_seat_count()), revenue_total=Sum('total_cost'))
+        .order_by()
+        .values_list('event_id', 'bucket', 'n', 'seat_total', 'revenue_total')
+    )
+    written = 0
+    with transaction.atomic():
+        rows.delete()
+        batch = []
+        for event_id, hour, n, seats, revenue in buckets.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            batch.append(SalesRollup(event_id=event_id, hour=hour, bookings=n, seats=seats, revenue=revenue))
+            if len(batch) == REBUILD_BATCH_SIZE:
+                written += len(SalesRollup.objects.bulk_create(batch))
+                batch = []
+        written += len(SalesRollup.objects.bulk_create(batch))
+    return written
+
+
+def sales_summary(event, max_bars=MAX_BARS):
+    """
+    Totals and a sales-velocity series for ``event`` from its rollup rows.
+    The series covers the first to the last hour with sales, empty hours
+    included, in buckets wide enough to give at most ``max_bars`` bars.
+    """
+    rows = list(
+        SalesRollup.objects.filter(event=event).exclude(bookings=0).order_by('hour')
+        .values_list('hour', 'bookings', 'seats', 'revenue')
+    )
+    summary = {
+        'bookings': sum(r[1] for r in rows),
+        'seats': sum(r[2] for r in rows),
+        'revenue': sum((r[3] for r in rows), Decimal(0)),
+        'hours': len(rows),
+        'bars': [],
+        'bucket_hours': 1,
+        'peak': None,
+        'seats_per_hour': 0,
+    }
+    if not rows:
+        return summary
+
+    first, last = rows[0][0], rows[-1][0]
+    span = int((last - first) / timedelta(hours=1)) + 1
+    width = max(1, math.ceil(span / max_bars))
+    bars = [
+        {'start': first + timedelta(hours=i * width), 'bookings': 0, 'seats': 0, 'revenue': Decimal(0)}
+        for i in range(math.ceil(span / width))
+    ]
+    for hour, bookings, seats, revenue in rows:
+        bar = bars[int((hour - first) / timedelta(hours=1)) // width]
+        bar['bookings'] += bookings
+        bar['seats'] += seats
+        bar['revenue'] += revenue
+    tallest = max(bar['seats'] for bar in bars) or 1
+    for bar in bars:
+        bar['height'] = round(100 * bar['seats'] / tallest, 1)
+    summary.update(
+        bars=bars,
+        bucket_hours=width,
+        peak=max(bars, key=lambda bar: bar['seats']),
+        seats_per_hour=round(summary['seats'] / (len(bars) * width), 1),
+    )
+    return summary
@@ -0,0 +1,85 @@
+"""
+Primary/replica database routing.
+
+Writes, ``select_for_update`` and everything inside a transaction always
+use the primary (``default``). Views decorated with ``@replica_reads``
+send their remaining reads to the ``replica`` alias, when one is
+configured, unless the client wrote something within the last
+REPLICA_STICKY_SECONDS. ReplicaStickinessMiddleware sets a cookie
+whenever a request writes, and that cookie pins the client to the
+primary, so people always see their own changes.
+"""
+import contextvars
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+STICKY_COOKIE = 'primary_pin'
+# Sessions and accounts are read on every request and must never be stale
+PRIMARY_ONLY = {'sessions.session', 'core.user'}
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_wrote = contextvars.ContextVar('wrote', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (_use_replica.get() and not connections[PRIMARY].in_atomic_block
+                and model._meta.label_lower not in PRIMARY_ONLY):
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        wrote = _wrote.get()
+        if wrote is not None:
+            wrote.append(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # both aliases hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary file, schema included
+        return db != REPLICA
+
+
+def replica_reads(view):
+    """Serve a read-only view's queries from the replica when that is safe."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or STICKY_COOKIE in request.COOKIES or not replica_configured():
+            return view(request, *args, **kwargs)
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    """Pin a client to the primary for a while after any request that writes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrote = []
+        token = _wrote.set(wrote)
+        try:
+            response = self.get_response(request)
+        finally:
+            _wrote.reset(token)
+        if wrote and replica_configured():
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,150 @@
+"""
+Full-text event search.
+
+On SQLite builds with FTS5 the ``core_event_fts`` index mirrors
+``core_event.title`` and ``core_event.description``. It is an
+external-content table kept in sync by triggers, so every insert, update
+and delete of an Event (including bulk ones) reaches the index. Queries
+join it through the unmanaged EventSearchIndex model and its ``match``
+lookup. Other backends fall back to ``icontains`` filtering.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Lookup, Q, TextField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'core_event_fts'
+
+_SYNC_TRIGGERS = {
+    'core_event_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS core_event_fts_ai AFTER INSERT ON core_event BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """,
+    'core_event_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS core_event_fts_ad AFTER DELETE ON core_event BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+    """,
+    'core_event_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS core_event_fts_au AFTER UPDATE OF title, description ON core_event
+        WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """,
+}
+
+_available = {}
+
+
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+class DocumentField(TextField):
+    """FTS5's hidden column named after the table; the left-hand side of ``__match``."""
+
+
+DocumentField.register_lookup(Match)
+
+
+def _fts5_supported(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if cursor.fetchone()[0]:
+        return True
+    # Some builds load FTS5 without advertising the compile option
+    try:
+        cursor.execute('CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)')
+        cursor.execute('DROP TABLE temp._fts5_probe')
+        return True
+    except Exception:
+        return False
+
+
+def install_fts(connection):
+    """
+    Create the FTS index and its sync triggers if they are missing.
+
+    SQLite drops triggers when Django rebuilds ``core_event`` during a
+    migration, so this also runs after every ``migrate``; when any trigger
+    had to be recreated the index is rebuilt from the table.
+    """
+    _available.pop(connection.alias, None)
+    if connection.vendor != 'sqlite':
+        return False
+
+    with connection.cursor() as cursor:
+        if not _fts5_supported(cursor):
+            return False
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE 'core_event_fts%'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if 'core_event' not in connection.introspection.table_names(cursor):
+            return False
+
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, description, content='core_event', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        missing = [name for name in _SYNC_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(_SYNC_TRIGGERS[name])
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall_fts(connection):
+    _available.pop(connection.alias, None)
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in _SYNC_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def fts_available(using='default'):
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _available[using]
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_events(queryset, text, using_fts=None):
+    """Restrict ``queryset`` to events matching ``text``, best matches first."""
+    if using_fts is None:
+        using_fts = fts_available(queryset.db)
+
+    if not using_fts:
+        return queryset.filter(Q(title__icontains=text) | Q(description__icontains=text))
+
+    match = fts_query(text)
+    if not match:
+        return queryset.none()
+    # bm25 is more negative for better matches; title hits weigh 10x description hits.
+    # It only works on the table the MATCH runs against, so the index is joined rather than
+    # used as a pk__in subquery (a per-row MATCH subquery for the rank is ~100x slower).
+    return queryset.filter(search_index__document__match=match).annotate(
+        search_rank=RawSQL(f'bm25({FTS_TABLE}, 10.0, 1.0)', [], output_field=FloatField()),
+    ).order_by('search_rank', 'date', 'time')
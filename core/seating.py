@@ -0,0 +1,182 @@
+"""
+Seat labelling, occupancy bitsets and the seat-grid layout.
+
+Rows are labelled like spreadsheet columns (A..Z, AA..AZ, BA..ZZ, AAA..)
+and seats are numbered from 1, so "AB12" is seat 12 of row 28. Every
+seat is also addressed by its row-major index, which is what the
+bitsets and the live feed use.
+"""
+import string
+from collections import namedtuple
+from functools import lru_cache
+
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+
+ROW_LETTERS = string.ascii_uppercase
+
+
+def row_label(r):
+    label = ''
+    r += 1
+    while r:
+        r, rem = divmod(r - 1, 26)
+        label = ROW_LETTERS[rem] + label
+    return label
+
+
+def row_number(label):
+    """Inverse of row_label: "A" -> 0, "AA" -> 26. Returns None for anything else."""
+    if not label or label.strip(ROW_LETTERS):
+        return None
+    r = 0
+    for ch in label:
+        r = r * 26 + ROW_LETTERS.index(ch) + 1
+    return r - 1
+
+
+def seat_index(seat_id, rows, cols):
+    """
+    Map a seat ID such as "C7" to its row-major index in a rows x cols venue.
+    Returns None when the ID does not name a seat in the venue.
+    """
+    seat_id = seat_id.strip().upper()
+    split = len(seat_id) - len(seat_id.lstrip(ROW_LETTERS))
+    prefix, digits = seat_id[:split], seat_id[split:]
+    if not prefix or len(prefix) > 4 or not digits.isdigit() or digits[0] == '0':
+        return None
+    r, c = row_number(prefix), int(digits)
+    if 0 <= r < rows and 1 <= c <= cols:
+        return r * cols + c - 1
+    return None
+
+
+class SeatMap:
+    """
+    Occupancy bitset for an event, one bit per seat in row-major order.
+    Stored on ``Event.seat_bitmap`` and updated as bookings change.
+    """
+
+    def __init__(self, rows, cols, data=b''):
+        self.rows = rows
+        self.cols = cols
+        size = (rows * cols + 7) // 8
+        self.bits = bytearray(bytes(data or b'')[:size].ljust(size, b'\0'))
+
+    @classmethod
+    def for_event(cls, event):
+        return cls(event.venue_rows, event.venue_cols, event.seat_bitmap)
+
+    @property
+    def capacity(self):
+        return self.rows * self.cols
+
+    def is_booked(self, index):
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def set(self, indices):
+        for i in indices:
+            self.bits[i >> 3] |= 1 << (i & 7)
+
+    def clear(self, indices):
+        for i in indices:
+            self.bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+    def count(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def index_of(self, seat_id):
+        return seat_index(seat_id, self.rows, self.cols)
+
+    def seat_id(self, index):
+        r, c = divmod(index, self.cols)
+        return f"{row_label(r)}{c + 1}"
+
+    def row_flags(self, r):
+        """Booked flags (0/1 bytes) for the seats of row ``r``."""
+        start = r * self.cols
+        first, offset = start >> 3, start & 7
+        chunk = self.bits[first:(start + self.cols + 7) >> 3]
+        return b''.join(map(_BYTE_FLAGS.__getitem__, chunk))[offset:offset + self.cols].ljust(self.cols, b'\0')
+
+    def booked_indices(self):
+        for byte_index, byte in enumerate(self.bits):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield (byte_index << 3) | bit
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+
+def build_seat_map(rows, cols, seat_ids):
+    """Build a SeatMap from scratch out of an iterable of booked seat IDs."""
+    seat_map = SeatMap(rows, cols)
+    seat_map.set(i for i in map(seat_map.index_of, seat_ids) if i is not None)
+    return seat_map
+
+
+# _BYTE_FLAGS[b] is the eight seats of bitmap byte b as 0/1 bytes, lowest bit first
+_BYTE_FLAGS = [bytes((b >> bit) & 1 for bit in range(8)) for b in range(256)]
+
+Seat = namedtuple('Seat', 'seat_id row col is_booked')
+
+
+class SeatRow:
+    """One row of the grid; its seats are generated when the template loops over it."""
+
+    def __init__(self, layout, index, seat_map):
+        self.layout = layout
+        self.index = index
+        self.label = layout.row_labels[index]
+        self.seat_map = seat_map
+
+    def __iter__(self):
+        label = self.label
+        for col, flag in zip(self.layout.col_numbers, self.seat_map.row_flags(self.index)):
+            yield Seat(label + col, label, col, flag == 1)
+
+
+class SeatLayout:
+    """
+    Row and column labels for one venue shape, computed once and shared by
+    every event with that shape. ``grid()`` walks a SeatMap row by row, so
+    rendering holds one row of Seat tuples at a time rather than the whole
+    venue.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.row_labels = tuple(row_label(r) for r in range(rows))
+        self.col_numbers = tuple(str(c) for c in range(1, cols + 1))
+
+    def grid(self, seat_map):
+        for r in range(self.rows):
+            yield SeatRow(self, r, seat_map)
+
+
+@lru_cache(maxsize=128)
+def seat_layout(rows, cols):
+    return SeatLayout(rows, cols)
+
+
+def seat_grid(event):
+    """Rows of Seat tuples (seat_id, row, col, is_booked) for an event's seat map."""
+    return seat_layout(event.venue_rows, event.venue_cols).grid(SeatMap.for_event(event))
+
+
+# The pages whose templates cache the grid with {% cache ... seat_grid <page> ... %}
+GRID_PAGES = ('public', 'host')
+
+
+def retire_grid(event_id, seat_version, rows, cols):
+    """
+    Drop the grid fragments rendered for ``seat_version`` once a change has
+    superseded it, so each event keeps one cached grid per page rather than
+    one per booking until eviction gets to them.
+    """
+    caches['seat_grid'].delete_many([
+        make_template_fragment_key('seat_grid', [page, event_id, seat_version, rows, cols]) for page in GRID_PAGES
+    ])
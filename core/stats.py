@@ -0,0 +1,208 @@
+"""
+Precomputed totals for the admin dashboard.
+
+The counts live in the single ``SiteStats`` row. Signal handlers adjust it
+in the same transaction as each user, event and booking change, so the
+dashboard reads five integers instead of counting five tables. Bulk
+``QuerySet.update()``/``bulk_create()`` calls bypass signals; code that
+uses them on these models must call ``adjust()`` itself, and
+``manage.py recompute_site_stats`` corrects any drift.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Count, F, Func, IntegerField, Q, QuerySet, Subquery, Value
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from .models import Booking, Event, SiteStats, User
+
+STATS_PK = 1
+
+
+def _count(queryset):
+    # A scalar COUNT(*) subquery; Func keeps Django from adding a GROUP BY
+    return Subquery(
+        queryset.order_by().annotate(n=Func(Value(1), function='COUNT', output_field=IntegerField())).values('n')
+    )
+
+
+def _counters():
+    return {
+        'total_users': _count(User.objects.all()),
+        'active_events': _count(Event.objects.filter(status='APPROVED')),
+        'total_bookings': _count(Booking.objects.all()),
+        'pending_users': _count(User.objects.filter(is_approved=False)),
+        'pending_events': _count(Event.objects.filter(status='PENDING')),
+    }
+
+
+def recompute():
+    """Recount everything in a single UPDATE and return the fresh row."""
+    SiteStats.objects.get_or_create(pk=STATS_PK)
+    SiteStats.objects.filter(pk=STATS_PK).update(**_counters(), recomputed_at=timezone.now())
+    return SiteStats.objects.get(pk=STATS_PK)
+
+
+def get_stats():
+    stats = SiteStats.objects.filter(pk=STATS_PK).first()
+    return stats if stats is not None else recompute()
+
+
+_local = threading.local()
+
+
+@contextmanager
+def batched_adjustments():
+    """
+    Collect every adjust() made inside the block and apply them as one
+    UPDATE at the end, instead of one per saved or deleted object. Use it
+    inside the transaction that makes the changes.
+    """
+    if getattr(_local, 'deltas', None) is not None:
+        yield
+        return
+    _local.deltas = {}
+    try:
+        yield
+        deltas = _local.deltas
+    finally:
+        _local.deltas = None
+    adjust(**deltas)
+
+
+def adjust(**deltas):
+    """Add ``deltas`` (e.g. ``pending_users=-1``) to the stored totals."""
+    pending = getattr(_local, 'deltas', None)
+    if pending is not None:
+        for name, delta in deltas.items():
+            pending[name] = pending.get(name, 0) + delta
+        return
+    deltas = {name: F(name) + delta for name, delta in deltas.items() if delta}
+    if deltas:
+        # A missing row is left missing; get_stats() recounts on next read
+        SiteStats.objects.filter(pk=STATS_PK).update(**deltas)
+
+
+def user_deltas(is_approved, sign=1):
+    return {'total_users': sign, 'pending_users': sign * (not is_approved)}
+
+
+def event_deltas(status, sign=1):
+    return {'active_events': sign * (status == 'APPROVED'), 'pending_events': sign * (status == 'PENDING')}
+
+
+def _merge(*deltas):
+    merged = {}
+    for d in deltas:
+        for name, delta in d.items():
+            merged[name] = merged.get(name, 0) + delta
+    return merged
+
+
+# Each tracked model remembers the field its counters depend on as loaded,
+# so post_save can tell what an update changed
+TRACKED = {
+    User: ('is_approved', user_deltas),
+    Event: ('status', event_deltas),
+}
+
+
+_UNKNOWN = object()
+
+
+def _remember(sender, instance, **kwargs):
+    field, _ = TRACKED[sender]
+    instance._stats_state = instance.__dict__.get(field, _UNKNOWN)
+
+
+def _load_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Instances loaded with the field deferred fetch its stored value first
+    field, _ = TRACKED[sender]
+    if raw or instance._stats_state is not _UNKNOWN or instance._state.adding:
+        return
+    if update_fields is not None and field not in update_fields:
+        return
+    instance._stats_state = sender._base_manager.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def _saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if sender is Booking:
+        if created:
+            adjust(total_bookings=1)
+        return
+    field, deltas = TRACKED[sender]
+    if update_fields is not None and field not in update_fields:
+        return
+    new = getattr(instance, field)
+    if created:
+        adjust(**deltas(new))
+    elif new != instance._stats_state:
+        adjust(**_merge(deltas(new), deltas(instance._stats_state, sign=-1)))
+    instance._stats_state = new
+
+
+def _origin_model(origin):
+    if origin is None:
+        return None
+    return origin.model if isinstance(origin, QuerySet) else origin._meta.concrete_model
+
+
+def _cascade_deltas(origin):
+    """Counter changes for the events and bookings that deleting ``origin`` takes with it."""
+    deleted = origin if isinstance(origin, QuerySet) else _origin_model(origin)._base_manager.filter(pk=origin.pk)
+    if deleted.model is User:
+        events = Event.objects.filter(host__in=deleted)
+        bookings = Booking.objects.filter(Q(user__in=deleted) | Q(event__host__in=deleted))
+    elif deleted.model is Event:
+        events = Event.objects.none()
+        bookings = Booking.objects.filter(event__in=deleted)
+    else:
+        return {}
+    counts = events.aggregate(
+        active=Count('pk', filter=Q(status='APPROVED')), pending=Count('pk', filter=Q(status='PENDING')),
+    )
+    return {
+        'total_bookings': -bookings.count(),
+        'active_events': -(counts['active'] or 0),
+        'pending_events': -(counts['pending'] or 0),
+    }
+
+
+def _deleting(sender, instance, origin=None, **kwargs):
+    # Rows that go with the deleted object are counted here in one go, and
+    # _deleted skips them; one UPDATE per cascaded booking would hold the
+    # write lock for as long as it takes to delete a big event
+    if _origin_model(origin) is not sender:
+        return
+    if isinstance(origin, QuerySet):
+        if origin is getattr(_local, 'counted_origin', None):
+            return # pre_delete runs once per object in the queryset
+        _local.counted_origin = origin
+    adjust(**_cascade_deltas(origin))
+
+
+def _deleted(sender, instance, origin=None, **kwargs):
+    if origin is not None and _origin_model(origin) is not sender:
+        return # counted by _deleting
+    if origin is getattr(_local, 'counted_origin', None):
+        # Every pre_delete has run by now; a later delete() of the same queryset is a new delete
+        _local.counted_origin = None
+    if sender is Booking:
+        adjust(total_bookings=-1)
+        return
+    field, deltas = TRACKED[sender]
+    adjust(**deltas(instance.__dict__.get(field, instance._stats_state), sign=-1))
+
+
+def connect():
+    for model in TRACKED:
+        post_init.connect(_remember, sender=model, dispatch_uid=f'stats_init_{model.__name__}')
+        pre_save.connect(_load_state, sender=model, dispatch_uid=f'stats_pre_save_{model.__name__}')
+        pre_delete.connect(_load_state, sender=model, dispatch_uid=f'stats_pre_delete_{model.__name__}')
+        pre_delete.connect(_deleting, sender=model, dispatch_uid=f'stats_deleting_{model.__name__}')
+    for model in (User, Event, Booking):
+        post_save.connect(_saved, sender=model, dispatch_uid=f'stats_save_{model.__name__}')
+        post_delete.connect(_deleted, sender=model, dispatch_uid=f'stats_delete_{model.__name__}')
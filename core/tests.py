@@ -1,3 +1,1422 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import json
+import os
+import random
+import re
+import runpy
+import tempfile
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.conf import settings as django_settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import allocation, auth, batching, bench_routes, moderation, rollup
+from .booking import (
+    book_best_available, cancel_booking, cancel_event_bookings, create_booking, create_bookings, hold_seats,
+    release_expired_holds, release_holds, SeatUnavailable,
+)
+from .middleware import QueryInstrumentationMiddleware
+from .routers import PrimaryReplicaRouter, ReplicaStickinessMiddleware, replica_reads, STICKY_COOKIE
+from .models import User, Event, EventSearchIndex, Booking, EventSeat, SalesRollup, SiteStats
+from .geo import bounding_box, cells_for_box, haversine_km, nearby_events
+from .pagination import paginate
+from .search import FTS_TABLE, search_events
+from .seating import SeatMap, row_label, row_number, seat_grid, seat_index
+from .stats import get_stats, recompute
+
+
+class SeatConflictTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        cls.ann, cls.bob = (User.objects.create_user(name, password='pw') for name in ('ann', 'bob'))
+        cls.event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            venue_rows=2, venue_cols=5, status='APPROVED',
+        )
+
+    def test_taken_seat_rolls_back_whole_booking(self):
+        create_booking(self.event, self.ann, ['A1', 'A2'])
+        with self.assertRaisesMessage(SeatUnavailable, 'Seat A2 is already booked.'):
+            create_booking(self.event, self.bob, ['A3', 'a2'])
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertFalse(EventSeat.objects.filter(seat_id='A3').exists())
+        self.assertEqual(Event.objects.get(pk=self.event.pk).seats_sold, 2)
+
+    def test_unique_index_only_covers_active_seats(self):
+        booking = create_booking(self.event, self.ann, ['A1'])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            EventSeat.objects.create(event=self.event, booking=booking, seat_id='A1')
+
+        cancel_booking(booking)
+        rebooked = create_booking(self.event, self.bob, ['A1'])
+        self.assertEqual(
+            list(EventSeat.objects.filter(seat_id='A1').order_by('pk').values_list('booking', 'is_active')),
+            [(booking.pk, False), (rebooked.pk, True)],
+        )
+
+    def test_book_view_reports_conflict(self):
+        create_booking(self.event, self.ann, ['B1'])
+        self.client.force_login(self.bob)
+        response = self.client.post(reverse('book_ticket', args=[self.event.pk]), {'selected_seats': 'B1,B2'}, follow=True)
+        self.assertContains(response, 'Seat B1 is already booked.')
+        self.assertFalse(Booking.objects.filter(user=self.bob).exists())
+
+
+class SeatMapTests(SimpleTestCase):
+    def test_set_clear_and_count(self):
+        seat_map = SeatMap(3, 7) # 21 seats: the last byte is partly padding
+        self.assertEqual((seat_map.capacity, len(seat_map.to_bytes()), seat_map.count()), (21, 3, 0))
+        seat_map.set([0, 7, 8, 20])
+        seat_map.set([7]) # setting twice is a no-op
+        self.assertEqual(seat_map.count(), 4)
+        self.assertEqual(list(seat_map.booked_indices()), [0, 7, 8, 20])
+        self.assertTrue(seat_map.is_booked(20))
+        self.assertFalse(seat_map.is_booked(19))
+        seat_map.clear([7, 19])
+        self.assertEqual(list(seat_map.booked_indices()), [0, 8, 20])
+
+        copy = SeatMap(3, 7, seat_map.to_bytes())
+        self.assertEqual(list(copy.booked_indices()), [0, 8, 20])
+        self.assertEqual(SeatMap(3, 7, b'\xff' * 10).to_bytes(), b'\xff' * 3) # extra bytes are dropped
+        self.assertEqual(SeatMap(3, 7, None).count(), 0)
+
+    def test_row_flags_at_edges(self):
+        seat_map = SeatMap(3, 5) # rows start mid-byte at bits 5 and 10
+        seat_map.set([0, 4, 5, 9, 10, 14])
+        self.assertEqual(seat_map.row_flags(0), b'\1\0\0\0\1')
+        self.assertEqual(seat_map.row_flags(1), b'\1\0\0\0\1')
+        self.assertEqual(seat_map.row_flags(2), b'\1\0\0\0\1')
+        seat_map.clear([4, 5])
+        self.assertEqual(seat_map.row_flags(0), b'\1\0\0\0\0')
+        self.assertEqual(seat_map.row_flags(1), b'\0\0\0\0\1')
+
+        wide = SeatMap(2, 20)
+        wide.set([19, 20])
+        self.assertEqual(wide.row_flags(0), b'\0' * 19 + b'\1')
+        self.assertEqual(wide.row_flags(1), b'\1' + b'\0' * 19)
+        self.assertEqual(SeatMap(1, 3).row_flags(0), b'\0\0\0')
+
+    def test_seat_ids_round_trip(self):
+        seat_map = SeatMap(30, 12)
+        for index in (0, 11, 12, 311, 359):
+            self.assertEqual(seat_map.index_of(seat_map.seat_id(index)), index)
+        self.assertEqual(seat_map.seat_id(359), 'AD12')
+        self.assertIsNone(seat_map.index_of('A13'))
+
+
+class RebuildSeatMapsTests(TestCase):
+    def test_rebuild_repairs_corrupted_bitmap(self):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        ann = User.objects.create_user('ann', password='pw')
+        event, intact = (
+            Event.objects.create(
+                host=host, title=title, date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+                venue_rows=2, venue_cols=5, status='APPROVED',
+            )
+            for title in ('Gig', 'Other')
+        )
+        create_booking(event, ann, ['A1', 'B5'])
+        create_booking(intact, ann, ['A2'])
+        cancel_booking(create_booking(event, ann, ['A3']))
+        Event.objects.filter(pk=event.pk).update(seat_bitmap=b'\x04\x00') # A3 set, A1 and B5 lost
+        before = {e.pk: e.seat_version for e in Event.objects.all()}
+
+        out = StringIO()
+        call_command('rebuild_seat_maps', stdout=out)
+        self.assertIn('Checked 2 events, repaired 1 seat maps.', out.getvalue())
+        event, intact = Event.objects.get(pk=event.pk), Event.objects.get(pk=intact.pk)
+        self.assertEqual(list(SeatMap.for_event(event).booked_indices()), [0, 9])
+        self.assertEqual(event.seat_version, before[event.pk] + 1)
+        self.assertEqual(intact.seat_version, before[intact.pk])
+
+        call_command('rebuild_seat_maps', event.pk, stdout=out)
+        self.assertIn('Checked 1 events, repaired 0 seat maps.', out.getvalue())
+
+
+class EventSalesCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        cls.ann, cls.bob = (User.objects.create_user(name, password='pw') for name in ('ann', 'bob'))
+        cls.event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=Decimal('12.50'),
+            venue_rows=2, venue_cols=5, status='APPROVED',
+        )
+
+    def counters(self):
+        event = Event.objects.get(pk=self.event.pk)
+        return event.seats_sold, event.confirmed_revenue, event.balance_seats
+
+    def test_bookings_and_cancellations_move_counters(self):
+        first = create_booking(self.event, self.ann, ['A1', 'A2', 'A3'])
+        create_booking(self.event, self.bob, ['B1'])
+        self.assertEqual(self.counters(), (4, Decimal('50.00'), 6))
+        with self.assertRaises(SeatUnavailable):
+            create_booking(self.event, self.bob, ['A3'])
+        self.assertEqual(self.counters(), (4, Decimal('50.00'), 6))
+        cancel_booking(first)
+        cancel_booking(first) # a second cancel changes nothing
+        self.assertEqual(self.counters(), (1, Decimal('12.50'), 9))
+
+    def test_reconcile_repairs_drift(self):
+        create_booking(self.event, self.ann, ['A1', 'A2'])
+        cancel_booking(create_booking(self.event, self.bob, ['B1']))
+        Event.objects.filter(pk=self.event.pk).update(seats_sold=7, confirmed_revenue=0)
+
+        out = StringIO()
+        call_command('reconcile_event_sales', dry_run=True, stdout=out)
+        self.assertIn(f'Event {self.event.pk}: seats_sold 7 -> 2, confirmed_revenue 0.00 -> 25', out.getvalue())
+        self.assertEqual(self.counters()[0], 7)
+        call_command('reconcile_event_sales', stdout=StringIO())
+        self.assertEqual(self.counters(), (2, Decimal('25.00'), 8))
+
+    def test_reconcile_counts_seats_like_bookings_do(self):
+        create_booking(self.event, self.ann, ['A1'])
+        seat_map = SeatMap.for_event(Event.objects.get(pk=self.event.pk))
+        seat_map.set([9]) # a bit with no seat row behind it, which only rebuild_seat_maps clears
+        Event.objects.filter(pk=self.event.pk).update(seat_bitmap=seat_map.to_bytes())
+
+        call_command('reconcile_event_sales', stdout=StringIO())
+        self.assertEqual(self.counters()[0], 2)
+        create_booking(self.event, self.bob, ['B1']) # apply_seat_change agrees with the command
+        out = StringIO()
+        call_command('reconcile_event_sales', dry_run=True, stdout=out)
+        self.assertIn('Found 0 events', out.getvalue())
+
+
+class NearbyEventsTests(TestCase):
+    PLACES = {
+        'New York': (40.7128, -74.006),
+        'Philadelphia': (39.9526, -75.1652),
+        'Toronto': (43.6532, -79.3832),
+        'Beijing': (39.9042, 116.4074), # same latitude band, other side of the world
+        'Suva': (-18.1248, 178.4501),
+        'Apia': (-13.759, -172.1046), # across the antimeridian from Suva
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        for title, (lat, lng) in cls.PLACES.items():
+            Event.objects.create(
+                host=host, title=title, date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+                status='APPROVED', location_lat=lat, location_lng=lng,
+            )
+
+    def nearby(self, place, radius_km):
+        lat, lng = self.PLACES[place]
+        with mock.patch('core.geo.haversine_km', side_effect=haversine_km) as distance:
+            events = nearby_events(Event.objects.all(), lat, lng, radius_km, limit=10)
+        return [event.title for event in events], distance.call_count
+
+    def test_small_radius(self):
+        self.assertEqual(self.nearby('New York', 150), (['New York', 'Philadelphia'], 2))
+
+    def test_wide_radius_uses_cell_ranges(self):
+        lat, lng = self.PLACES['New York']
+        self.assertIsNone(cells_for_box(*bounding_box(lat, lng, 1000)))
+        titles, checked = self.nearby('New York', 1000)
+        self.assertEqual(titles, ['New York', 'Philadelphia', 'Toronto'])
+        self.assertEqual(checked, 3) # Beijing is in the latitude band but never looked at
+        self.assertEqual(self.nearby('Suva', 1500), (['Suva', 'Apia'], 2))
+
+
+class SeatHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        cls.ann, cls.bob = (User.objects.create_user(name, password='pw') for name in ('ann', 'bob'))
+        cls.event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            venue_rows=2, venue_cols=5, status='APPROVED',
+        )
+
+    def test_hold_blocks_others_until_released(self):
+        seats, first_expiry = hold_seats(self.event, self.bob, ['a1', 'A2'])
+        self.assertEqual(seats, ['A1', 'A2'])
+        with self.assertRaisesMessage(SeatUnavailable, 'Seat A1 is no longer available.'):
+            hold_seats(self.event, self.ann, ['A1'])
+        with self.assertRaisesMessage(SeatUnavailable, 'Seat A2 is already booked.'):
+            create_booking(self.event, self.ann, ['A2'])
+
+        _, renewed = hold_seats(self.event, self.bob, ['A1']) # re-holding extends
+        self.assertGreaterEqual(renewed, first_expiry)
+        self.assertEqual(release_holds(self.event, self.bob, ['A1']), 1)
+        hold_seats(self.event, self.ann, ['A1'])
+        self.assertEqual(
+            set(EventSeat.objects.values_list('seat_id', 'held_by')), {('A1', self.ann.pk), ('A2', self.bob.pk)},
+        )
+
+    def test_holds_lapse(self):
+        now = timezone.now()
+        hold_seats(self.event, self.bob, ['A1'], minutes=1)
+        hold_seats(self.event, self.bob, ['A2'], minutes=30)
+        later = now + datetime.timedelta(minutes=5)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            booking = create_booking(self.event, self.ann, ['A1']) # bob's lapsed hold doesn't block
+            self.assertEqual(release_expired_holds(), 0)
+        self.assertEqual(booking.seat_list(), ['A1'])
+        self.assertEqual(release_expired_holds(now + datetime.timedelta(hours=1)), 1)
+        self.assertFalse(EventSeat.objects.filter(booking=None).exists())
+
+    @override_settings(SEAT_HOLD_MAX_SEATS=3)
+    def test_hold_count_is_capped_per_user(self):
+        hold_seats(self.event, self.bob, ['A1', 'A2'])
+        with self.assertRaisesMessage(SeatUnavailable, 'You can hold at most 3 seats for this event.'):
+            hold_seats(self.event, self.bob, ['A3', 'A4'])
+        self.assertEqual(EventSeat.objects.filter(held_by=self.bob).count(), 2)
+        hold_seats(self.event, self.bob, ['A1', 'A2', 'A3']) # re-held seats aren't counted twice
+        hold_seats(self.event, self.ann, ['B1', 'B2', 'B3']) # the cap is per user
+
+        self.client.force_login(self.bob)
+        response = self.client.post(reverse('hold_seats', args=[self.event.pk]), {'seats': 'B4'})
+        self.assertEqual(response.status_code, 409)
+        release_holds(self.event, self.bob, ['A1'])
+        self.assertEqual(self.client.post(reverse('hold_seats', args=[self.event.pk]), {'seats': 'B4'}).status_code, 200)
+
+    @override_settings(SEAT_HOLD_MINUTES=10, SEAT_HOLD_MAX_MINUTES=30)
+    def test_renewals_stop_at_max_hold_time(self):
+        start = timezone.now()
+        _, expiry = hold_seats(self.event, self.bob, ['A1'])
+        self.assertEqual(expiry, EventSeat.objects.get(seat_id='A1').held_since + datetime.timedelta(minutes=10))
+        for minutes in (8, 16, 24, 28):
+            with mock.patch('django.utils.timezone.now', return_value=start + datetime.timedelta(minutes=minutes)):
+                _, expiry = hold_seats(self.event, self.bob, ['A1', 'A2'])
+        held_since = EventSeat.objects.get(seat_id='A1').held_since
+        self.assertEqual(expiry, held_since + datetime.timedelta(minutes=30))
+        self.assertEqual(
+            EventSeat.objects.get(seat_id='A2').expires_at, start + datetime.timedelta(minutes=38),
+        ) # A2 was first held at minute 8
+
+        with mock.patch('django.utils.timezone.now', return_value=held_since + datetime.timedelta(minutes=31)):
+            hold_seats(self.event, self.ann, ['A1']) # bob's hold ran out for good
+
+    def test_booking_converts_own_hold(self):
+        hold_seats(self.event, self.bob, ['A3', 'A4'])
+        held = set(EventSeat.objects.values_list('pk', flat=True))
+        booking = create_booking(self.event, self.bob, ['A3', 'A4', 'A5'])
+        seats = EventSeat.objects.filter(booking=booking)
+        self.assertEqual(seats.count(), 3)
+        self.assertTrue(held <= set(seats.values_list('pk', flat=True)))
+        self.assertFalse(seats.exclude(held_by=None).exists())
+        self.assertEqual(list(SeatMap.for_event(Event.objects.get(pk=self.event.pk)).booked_indices()), [2, 3, 4])
+
+    def test_hold_views(self):
+        hold_seats(self.event, self.bob, ['B1'])
+        url = reverse('hold_seats', args=[self.event.pk])
+        self.assertEqual(self.client.post(url, {'seats': 'A1'}).status_code, 401)
+        self.client.force_login(self.ann)
+        response = self.client.post(url, {'seats': 'A1,B1'})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(EventSeat.objects.filter(seat_id='A1').exists())
+        self.assertEqual(self.client.post(url, {'seats': 'A1'}).json()['held'], ['A1'])
+        response = self.client.post(reverse('release_seats', args=[self.event.pk]))
+        self.assertEqual(response.json(), {'released': 1})
+
+    def test_hold_views_need_an_approved_event(self):
+        pending = Event.objects.create(
+            host=self.event.host, title='Soon', date=datetime.date(2030, 1, 2), time=datetime.time(20), price=10,
+        )
+        self.client.force_login(self.ann)
+        for name in ('hold_seats', 'release_seats'):
+            for event_id in (pending.pk, 0):
+                response = self.client.post(reverse(name, args=[event_id]), {'seats': 'A1'})
+                self.assertEqual(response.status_code, 404, (name, event_id))
+
+    def test_rebuild_seat_maps_ignores_holds(self):
+        create_booking(self.event, self.ann, ['A1', 'A2'])
+        hold_seats(self.event, self.bob, ['A5'])
+        Event.objects.filter(pk=self.event.pk).update(seat_bitmap=b'') # drift to repair
+        call_command('rebuild_seat_maps', stdout=StringIO())
+
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual(list(SeatMap.for_event(event).booked_indices()), [0, 1])
+        create_booking(event, self.ann, ['B1'])
+        self.assertEqual(Event.objects.get(pk=self.event.pk).seats_sold, 3)
+        out = StringIO()
+        call_command('reconcile_event_sales', dry_run=True, stdout=out)
+        self.assertIn('Found 0 events', out.getvalue())
+
+
+class EventSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        today = timezone.now().date()
+
+        def event(title, description='', **fields):
+            fields = {'date': today + datetime.timedelta(days=3), 'status': 'APPROVED', **fields}
+            return Event.objects.create(
+                host=host, title=title, description=description, time=datetime.time(20), price=10, **fields,
+            )
+
+        cls.jazz = event('Jazz Night', 'Late set')
+        cls.mention = event('Open Mic', 'Ends with a jazz jam')
+        cls.cafe = event('Café Sessions', 'Acoustic evening')
+        cls.pending = event('Jazz Brunch', status='PENDING')
+        cls.past = event('Jazz Matinee', date=today - datetime.timedelta(days=3))
+
+    def titles(self, text, using_fts=None):
+        events = Event.objects.filter(pk__in=[self.jazz.pk, self.mention.pk, self.cafe.pk])
+        return [e.title for e in search_events(events, text, using_fts)]
+
+    def test_ranks_title_hits_first(self):
+        self.assertEqual(self.titles('jazz'), ['Jazz Night', 'Open Mic'])
+        self.assertEqual(self.titles('ja'), ['Jazz Night', 'Open Mic']) # words match as prefixes
+        self.assertEqual(self.titles('cafe'), ['Café Sessions'])
+        self.assertEqual(self.titles('jazz late'), ['Jazz Night'])
+        self.assertEqual(self.titles('"*)'), [])
+        self.assertEqual(sorted(self.titles('jazz', using_fts=False)), ['Jazz Night', 'Open Mic'])
+
+    def test_index_follows_changes(self):
+        Event.objects.filter(pk=self.mention.pk).update(description='Poetry and song')
+        self.cafe.title = 'Jazz Café'
+        self.cafe.save()
+        self.jazz.delete()
+        self.assertEqual(self.titles('jazz'), ['Jazz Café'])
+        self.assertEqual(self.titles('poetry'), ['Open Mic'])
+
+    def test_search_composes_with_other_filters(self):
+        events = search_events(Event.objects.filter(host__username='host'), 'jazz')
+        self.assertEqual(events.count(), 4)
+        self.assertEqual([e.title for e in events.filter(status='APPROVED')], ['Jazz Matinee', 'Jazz Night', 'Open Mic'])
+        self.assertEqual(list(EventSearchIndex.objects.all()), []) # nothing for dumpdata to copy
+
+    def test_browse_keeps_listing_filters(self):
+        response = self.client.get(reverse('browse_events'), {'q': 'jazz'})
+        self.assertEqual([e.title for e in response.context['events']], ['Jazz Night', 'Open Mic'])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        today = timezone.now().date()
+        cls.events = [
+            Event.objects.create(
+                host=host, title=f'Jazz {i}', date=today + datetime.timedelta(days=i // 2), time=datetime.time(20),
+                price=10, status='APPROVED',
+            )
+            for i in range(7)
+        ]
+
+    def page(self, cursor=None, per_page=3, query=None):
+        params = {'cursor': cursor} if cursor else {}
+        if query:
+            params['q'] = query
+        request = RequestFactory().get('/', params)
+        events = Event.objects.filter(status='APPROVED')
+        ordering = ['date', 'time', 'pk']
+        if query:
+            events = search_events(events, query)
+            ordering = ['search_rank'] + ordering
+        return paginate(request, events, ordering, per_page=per_page)
+
+    def test_cursors_round_trip(self):
+        seen, page = [], self.page()
+        self.assertFalse(page.has_previous)
+        while True:
+            seen += [e.pk for e in page]
+            if not page.has_next:
+                break
+            page = self.page(page.next_cursor)
+        self.assertEqual(seen, [e.pk for e in self.events])
+
+        back = self.page(page.previous_cursor)
+        self.assertEqual([e.pk for e in back], [e.pk for e in self.events[3:6]])
+        self.assertEqual(self.page(back.next_cursor).object_list, page.object_list)
+
+    def test_search_cursor_round_trip(self):
+        first = self.page(query='jazz')
+        second = self.page(first.next_cursor, query='jazz')
+        self.assertEqual(len({e.pk for e in [*first, *second]}), 6)
+
+    def test_tampered_cursor_shows_first_page(self):
+        def raw(payload):
+            return base64.urlsafe_b64encode(payload.encode()).decode()
+
+        first = [e.pk for e in self.page()]
+        for cursor in (
+            raw('["n",[null,null,null]]'),
+            raw('["n",[{"a":1},"20:00:00",1]]'),
+            raw('["n",[["2030-01-01"],"20:00:00",1]]'),
+            raw('["n",["2030-01-01","20:00:00",1e400]]'),
+            raw('["x",["2030-01-01","20:00:00",1]]'),
+            raw('["n",["2030-01-01"]]'),
+            'not base64!',
+        ):
+            self.assertEqual([e.pk for e in self.page(cursor)], first, cursor)
+        tampered_rank = raw('["n",["high","2030-01-01","20:00:00",1]]')
+        self.assertEqual([e.pk for e in self.page(tampered_rank, query='jazz')], [e.pk for e in self.page(query='jazz')])
+
+        response = self.client.get(reverse('browse_events'), {'cursor': raw('["p",[null,null,null]]')})
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Run each list/detail view, EXPLAIN every SELECT it issues and fail if
+    SQLite falls back to scanning a whole table or sorting in a temp B-tree.
+    """
+
+    # "SCAN core_event" without an index; "SCAN ... USING INDEX" is an ordered walk and fine
+    FULL_SCAN = re.compile(r'^SCAN (core_\w+)$')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pw', role='ADMIN')
+        cls.host = User.objects.create_user('host', password='pw', role='HOST')
+        cls.public = User.objects.create_user('public', password='pw')
+        User.objects.update(is_approved=True)
+        User.objects.create_user('waiting', password='pw', role='HOST')
+
+        today = timezone.now().date()
+        cls.event = Event.objects.create(
+            host=cls.host, title='Jazz Night', description='Late set', date=today + datetime.timedelta(days=2),
+            time=datetime.time(20), price=25, status='APPROVED', location_lat=40.7128, location_lng=-74.006,
+        )
+        Event.objects.create(
+            host=cls.host, title='Open Mic', date=today + datetime.timedelta(days=5),
+            time=datetime.time(19), price=5, status='PENDING',
+        )
+        create_booking(cls.event, cls.public, ['A1', 'A2'])
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, user, url):
+        if user:
+            self.client.force_login(user)
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        for sql, params in statements:
+            if '"core_' not in sql:
+                continue
+            for step in self.explain(sql, params):
+                self.assertIsNone(self.FULL_SCAN.match(step), f'{url}: full scan in {step!r}\n{sql}')
+                # Relevance-ranked search has to sort its matches; everything else must not
+                if FTS_TABLE not in sql:
+                    self.assertNotIn('TEMP B-TREE FOR ORDER BY', step, f'{url}: unindexed sort\n{sql}')
+
+    def test_public_views(self):
+        self.assert_indexed(None, reverse('browse_events'))
+        self.assert_indexed(None, reverse('browse_events') + '?q=jazz')
+        self.assert_indexed(None, reverse('browse_events') + '?lat=40.71&lng=-74.00&radius=25')
+        self.assert_indexed(None, reverse('browse_events') + '?lat=40.71&lng=-74.00&radius=1000')
+        self.assert_indexed(None, reverse('event_detail', args=[self.event.pk]))
+        self.assert_indexed(self.public, reverse('my_tickets'))
+
+    def test_host_views(self):
+        self.assert_indexed(self.host, reverse('host_dashboard'))
+        self.assert_indexed(self.host, reverse('host_event_detail', args=[self.event.pk]))
+
+    def test_admin_views(self):
+        for name in ('admin_dashboard', 'user_list', 'host_list', 'pending_users',
+                     'admin_pending_events', 'admin_event_list'):
+            self.assert_indexed(self.admin, reverse(name))
+
+
+class SeatAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+        cls.event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            venue_rows=2, venue_cols=5, status='APPROVED',
+        )
+
+    def fetch(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('seat_availability', args=[self.event.pk]), **headers)
+
+    def test_etag_follows_seat_version(self):
+        first = self.fetch()
+        self.assertEqual(first['ETag'], f'"seats-{self.event.pk}-0"')
+        self.assertEqual(first.json(), {'version': 0, 'rows': 2, 'cols': 5, 'booked': 'AAA='})
+        with self.assertNumQueries(1):
+            self.assertEqual(self.fetch(first['ETag']).status_code, 304)
+
+        hold_seats(self.event, self.buyer, ['A1']) # holds don't change the seat map
+        self.assertEqual(self.fetch(first['ETag']).status_code, 304)
+
+        booking = create_booking(self.event, self.buyer, ['A1', 'B5'])
+        booked = self.fetch(first['ETag'])
+        self.assertEqual(booked.status_code, 200)
+        self.assertEqual(booked['ETag'], f'"seats-{self.event.pk}-1"')
+        bitmap = base64.b64decode(booked.json()['booked'])
+        self.assertEqual(list(SeatMap(2, 5, bitmap).booked_indices()), [0, 9])
+
+        cancel_booking(booking)
+        self.assertEqual(self.fetch(booked['ETag'])['ETag'], f'"seats-{self.event.pk}-2"')
+
+    def test_unknown_event(self):
+        self.assertEqual(self.client.get(reverse('seat_availability', args=[0])).status_code, 404)
+
+
+class SeatStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        cls.event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            venue_rows=2, venue_cols=4, status='APPROVED',
+        )
+        create_booking(cls.event, host, ['A2'])
+
+    @override_settings(SEAT_STREAM=True)
+    def test_wsgi_pages_poll_instead(self):
+        response = self.client.get(reverse('event_detail', args=[self.event.pk]))
+        self.assertContains(response, 'data-availability-url=')
+        self.assertNotContains(response, 'data-stream-url=')
+        response = self.client.get(reverse('seat_stream', args=[self.event.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SEAT_STREAM=True)
+    async def test_asgi_stream_starts_with_snapshot(self):
+        response = await self.async_client.get(reverse('event_detail', args=[self.event.pk]))
+        self.assertContains(response, 'data-stream-url=')
+        response = await self.async_client.get(reverse('seat_stream', args=[self.event.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        first = (await anext(chunks)).decode()
+        await chunks.aclose()
+        self.assertTrue(first.startswith('event: snapshot\n'))
+        data = json.loads(first.split('data: ', 1)[1])
+        self.assertEqual(list(SeatMap(2, 4, base64.b64decode(data['booked'])).booked_indices()), [1])
+
+    async def test_stream_off_by_default(self):
+        response = await self.async_client.get(reverse('seat_stream', args=[self.event.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class SeatGridCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', password='pw', role='HOST', is_approved=True)
+        cls.ann = User.objects.create_user('ann', password='pw')
+        cls.event = Event.objects.create(
+            host=cls.host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            venue_rows=2, venue_cols=5, status='APPROVED',
+        )
+
+    def setUp(self):
+        caches['seat_grid'].clear()
+
+    def render(self, name='event_detail', user=None):
+        """Fetch the page; returns (response, whether the grid was rendered rather than reused)."""
+        self.client.force_login(user or self.ann)
+        with mock.patch('core.views.seat_grid', side_effect=seat_grid) as grid:
+            response = self.client.get(reverse(name, args=[self.event.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, grid.called
+
+    def test_fragment_reused_until_seat_version_changes(self):
+        self.assertEqual(self.render()[1], True)
+        self.assertEqual(self.render()[1], False)
+        self.assertEqual(self.render('host_event_detail', self.host)[1], True) # cached per page
+        self.assertEqual(self.render('host_event_detail', self.host)[1], False)
+
+        booking = create_booking(self.event, self.ann, ['A2'])
+        response, rendered = self.render()
+        self.assertTrue(rendered)
+        self.assertContains(response, 'class="seat booked" data-id="A2"')
+        self.assertEqual(self.render('host_event_detail', self.host)[1], True)
+
+        cancel_booking(booking)
+        response, rendered = self.render()
+        self.assertTrue(rendered)
+        self.assertNotContains(response, 'class="seat booked" data-id')
+
+    def test_superseded_fragments_are_dropped(self):
+        self.render()
+        self.render('host_event_detail', self.host)
+        self.assertEqual(len(caches['seat_grid']._cache), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_booking(self.event, self.ann, ['A1'])
+        self.assertEqual(len(caches['seat_grid']._cache), 0)
+        self.render()
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_event_bookings(self.event)
+        self.assertEqual(len(caches['seat_grid']._cache), 0)
+
+    def test_venue_resize_renders_again(self):
+        self.render()
+        Event.objects.filter(pk=self.event.pk).update(venue_rows=3)
+        response, rendered = self.render()
+        self.assertTrue(rendered)
+        self.assertContains(response, 'data-id="C5"')
+
+
+class SeatLabelTests(TestCase):
+    def test_rows_past_z(self):
+        self.assertEqual([row_label(r) for r in (0, 25, 26, 27, 51, 52, 701, 702)],
+                         ['A', 'Z', 'AA', 'AB', 'AZ', 'BA', 'ZZ', 'AAA'])
+        for r in range(800):
+            self.assertEqual(row_number(row_label(r)), r)
+        self.assertEqual(seat_index('ab12', 30, 20), 27 * 20 + 11)
+        for bad in ('AB0', 'AB012', 'A21', 'AE1', '12', 'A-1', ''):
+            self.assertIsNone(seat_index(bad, 30, 20), bad)
+        self.assertEqual(SeatMap(30, 20).seat_id(27 * 20 + 11), 'AB12')
+
+    def test_relabel_migration(self):
+        relabel = import_module('core.migrations.0016_relabel_rows_past_z')
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        buyer = User.objects.create_user('buyer', password='pw')
+        event = Event.objects.create(
+            host=host, title='Hall', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            venue_rows=30, venue_cols=20, status='APPROVED',
+        )
+        booking = Booking.objects.create(event=event, user=buyer, seats_booked='R271, R5,R3020', total_cost=30)
+        for seat_id in ('R271', 'R5', 'R3020'):
+            EventSeat.objects.create(event=event, booking=booking, seat_id=seat_id)
+        EventSeat.objects.create(
+            event=event, held_by=buyer, seat_id='R281', expires_at=timezone.now() + datetime.timedelta(minutes=5),
+        )
+
+        relabel.relabel_rows(django_apps, None)
+
+        self.assertEqual(Booking.objects.get(pk=booking.pk).seats_booked, 'AA1,R5,AD20')
+        self.assertEqual(
+            set(EventSeat.objects.values_list('seat_id', flat=True)), {'AA1', 'R5', 'AD20', 'AB1'},
+        )
+        event = Event.objects.get(pk=event.pk)
+        self.assertEqual(event.seat_version, 1)
+        self.assertEqual(
+            [SeatMap(30, 20).seat_id(i) for i in SeatMap.for_event(event).booked_indices()], ['R5', 'AA1', 'AD20'],
+        )
+
+
+class SiteStatsTests(TestCase):
+    FIELDS = ('total_users', 'active_events', 'total_bookings', 'pending_users', 'pending_events')
+
+    def assert_in_sync(self):
+        kept = get_stats()
+        fresh = recompute()
+        self.assertEqual(
+            {f: getattr(kept, f) for f in self.FIELDS},
+            {f: getattr(fresh, f) for f in self.FIELDS},
+        )
+
+    def test_signals_track_changes(self):
+        get_stats()
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        buyer = User.objects.create_user('buyer', password='pw')
+        self.assert_in_sync()
+
+        host.is_approved = True
+        host.save()
+        User.objects.get(pk=buyer.pk).save() # unchanged
+        event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+        )
+        self.assert_in_sync()
+
+        event = Event.objects.only('title').get(pk=event.pk)
+        event.status = 'APPROVED'
+        event.save()
+        booking = create_booking(event, buyer, ['A1'])
+        cancel_booking(booking)
+        self.assert_in_sync()
+
+        Booking.objects.get(pk=booking.pk).delete()
+        host.delete() # cascades to the event
+        self.assert_in_sync()
+
+    def test_cascading_deletes_adjust_once(self):
+        admin = User.objects.create_user('admin', password='pw', role='ADMIN')
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        buyers = [User.objects.create_user(f'buyer{i}', password='pw') for i in range(3)]
+        events = []
+        for size in (2, 40):
+            event = Event.objects.create(
+                host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+                venue_rows=5, venue_cols=10, status='APPROVED',
+            )
+            for i in range(size):
+                create_booking(event, buyers[i % 3], [SeatMap(5, 10).seat_id(i)])
+            events.append(event)
+        self.client.force_login(admin)
+
+        def delete(event):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(reverse('delete_event', args=[event.pk]))
+            self.assert_in_sync()
+            return ctx.captured_queries
+
+        small, large = delete(events[0]), delete(events[1])
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(sum('"core_sitestats"' in q['sql'] for q in large if q['sql'].startswith('UPDATE')), 2)
+
+        # The host's booking on their own event and a buyer's booking on it go once each
+        Event.objects.create(host=host, title='Gig', date=datetime.date(2030, 1, 2), time=datetime.time(20), price=10)
+        event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 3), time=datetime.time(20), price=10, status='APPROVED',
+        )
+        create_booking(event, host, ['A1'])
+        create_booking(event, buyers[0], ['A2'])
+        User.objects.filter(pk__in=[host.pk, buyers[0].pk]).delete()
+        self.assert_in_sync()
+
+    def test_same_queryset_deleted_twice(self):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        buyer = User.objects.create_user('buyer', password='pw')
+        gigs = Event.objects.filter(title='Gig')
+        for day in (1, 2):
+            event = Event.objects.create(
+                host=host, title='Gig', date=datetime.date(2030, 1, day), time=datetime.time(20), price=10,
+                status='APPROVED',
+            )
+            create_booking(event, buyer, ['A1'])
+            gigs.delete() # the cascaded booking is counted the second time too
+            self.assert_in_sync()
+
+    def test_booking_bumps_stats_once_at_the_end(self):
+        host = User.objects.create_user('host', password='pw', role='HOST')
+        buyer = User.objects.create_user('buyer', password='pw')
+        event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            status='APPROVED',
+        )
+        get_stats()
+        for book in (lambda: create_booking(event, buyer, ['A1']),
+                     lambda: create_bookings(event, [(buyer, ['A2']), (buyer, ['A3'])])):
+            with CaptureQueriesContext(connection) as ctx:
+                book()
+            writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+            self.assertIn('"core_sitestats"', writes[-1])
+            self.assertEqual(sum('"core_sitestats"' in sql for sql in writes), 1)
+        self.assert_in_sync()
+
+    def test_missing_row_is_recounted(self):
+        User.objects.create_user('someone', password='pw')
+        SiteStats.objects.all().delete()
+        self.assertEqual(get_stats().total_users, 1)
+        self.assertEqual(get_stats().pending_users, 1)
+
+
+class GroupCommitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST', is_approved=True)
+        cls.event = Event.objects.create(
+            host=host, title='Flash Sale', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            venue_rows=2, venue_cols=5, status='APPROVED',
+        )
+        cls.ann, cls.bob, cls.cat = (User.objects.create_user(name, password='pw') for name in ('ann', 'bob', 'cat'))
+
+    def test_batch_resolves_conflicts_in_order(self):
+        create_booking(self.event, self.cat, ['B5'])
+        hold_seats(self.event, self.cat, ['B1'])
+        hold_seats(self.event, self.bob, ['A3'])
+        get_stats()
+
+        with self.assertNumQueries(10): # savepoint, claims, bookings, stats, hold, seats, event lock+update, rollup, release
+            results = create_bookings(self.event, [
+                (self.ann, ['a1', 'A2']), # canonicalised
+                (self.bob, ['A2']), # lost to ann earlier in the batch
+                (self.bob, ['A3', 'A4']), # converts bob's own hold
+                (self.ann, ['B5']), # booked before the batch
+                (self.ann, ['B1']), # held by cat
+                (self.cat, ['Z9']), # no such seat
+                (self.cat, ['B2']),
+            ])
+
+        booked = [r for r in results if isinstance(r, Booking)]
+        self.assertEqual([r.seat_list() for r in booked], [['A1', 'A2'], ['A3', 'A4'], ['B2']])
+        self.assertEqual([r.user for r in booked], [self.ann, self.bob, self.cat])
+        self.assertEqual([str(r) for r in results if isinstance(r, SeatUnavailable)], [
+            'Seat A2 is already booked.', 'Seat B5 is already booked.',
+            'Seat B1 is already booked.', 'Seat Z9 does not exist.',
+        ])
+
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual(event.seats_sold, 6)
+        self.assertEqual(event.confirmed_revenue, 60)
+        self.assertEqual(event.seat_version, 2) # one bump for the whole batch
+        self.assertEqual(list(SeatMap.for_event(event).booked_indices()), [0, 1, 2, 3, 6, 9])
+        self.assertEqual(get_stats().total_bookings, 4)
+        self.assertEqual(recompute().total_bookings, 4)
+
+    def test_outside_claim_falls_back_to_single_bookings(self):
+        create_booking(self.event, self.cat, ['A1'])
+        # As if cat's booking landed between the batch's conflict check and its insert
+        with mock.patch('core.booking._blocks', return_value=False):
+            results = create_bookings(self.event, [(self.ann, ['A1']), (self.bob, ['A2'])])
+        self.assertEqual(str(results[0]), 'Seat A1 is already booked.')
+        self.assertEqual(results[1].seat_list(), ['A2'])
+        self.assertEqual(Event.objects.get(pk=self.event.pk).seats_sold, 2)
+
+
+    @override_settings(BOOKING_BATCH_TIMEOUT=0.01)
+    def test_timed_out_request_is_never_booked(self):
+        with mock.patch.object(batching.EventWorker, 'start'): # no worker picks it up in time
+            with self.assertRaisesMessage(TimeoutError, 'nothing was booked'):
+                batching.book(self.event, self.ann, ['A1'])
+        worker = batching._workers.pop(self.event.pk)
+        with mock.patch('core.batching.close_old_connections') as close_old:
+            worker.process(worker.collect())
+        close_old.assert_not_called() # nothing left to book
+        self.assertFalse(Booking.objects.exists())
+
+        future = batching.Future()
+        with mock.patch('core.batching.close_old_connections') as close_old:
+            worker.process([(self.bob, ['A2'], future)])
+        close_old.assert_called_once()
+        self.assertEqual(future.result().seat_list(), ['A2'])
+
+
+class FreeRunsTests(SimpleTestCase):
+    def test_index_agrees_with_full_scan(self):
+        rng = random.Random(7)
+        for rows, cols, fill in ((6, 9, 0.3), (12, 20, 0.7), (8, 31, 0.95)):
+            seat_map = SeatMap(rows, cols)
+            seat_map.set(i for i in range(seat_map.capacity) if rng.random() < fill)
+            index = allocation.FreeRuns.from_seat_map(seat_map)
+            for _ in range(200):
+                # Book or cancel a few seats, patching the index the way seats_changed does
+                indices = rng.sample(range(seat_map.capacity), rng.randint(1, 4))
+                if rng.random() < 0.6:
+                    seat_map.set(indices)
+                    index.take(indices)
+                else:
+                    seat_map.clear(indices)
+                    index.release(indices)
+                exclude = set(rng.sample(range(seat_map.capacity), rng.randint(0, 3)))
+                for n in (1, 2, 3, 5):
+                    self.assertEqual(index.best(n, exclude), allocation.best_block_by_scan(seat_map, n, exclude))
+            rebuilt = allocation.FreeRuns.from_seat_map(seat_map)
+            self.assertEqual((index.runs, index.longest), (rebuilt.runs, rebuilt.longest))
+
+    def test_prefers_front_then_centre(self):
+        seat_map = SeatMap(3, 10)
+        seat_map.set(range(2, 8)) # only A1-A2 and A9-A10 left in the front row
+        index = allocation.FreeRuns.from_seat_map(seat_map)
+        self.assertEqual(index.best(2), 14) # B5-B6: one row back beats four seats off-centre
+        self.assertEqual(index.best(4), 13) # B4-B7
+        self.assertIsNone(index.best(11))
+
+
+class BestAvailableTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host', password='pw', role='HOST', is_approved=True)
+        cls.event = Event.objects.create(
+            host=host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            venue_rows=3, venue_cols=10, status='APPROVED',
+        )
+        cls.ann, cls.bob = (User.objects.create_user(name, password='pw') for name in ('ann', 'bob'))
+
+    def test_books_best_block_and_keeps_index_current(self):
+        event = self.event
+        with self.captureOnCommitCallbacks(execute=True):
+            first = book_best_available(event, self.ann, 4)
+        self.assertEqual(first.seat_list(), ['A4', 'A5', 'A6', 'A7'])
+
+        hold_seats(event, self.bob, ['B5'])
+        event.refresh_from_db()
+        with mock.patch.object(allocation.FreeRuns, 'from_seat_map') as rebuild, \
+                self.captureOnCommitCallbacks(execute=True):
+            second = book_best_available(event, self.ann, 3)
+            event.refresh_from_db()
+            cancel_booking(first)
+        rebuild.assert_not_called() # patched on every commit, never rebuilt
+        self.assertEqual(second.seat_list(), ['B6', 'B7', 'B8']) # B4-B6 would take bob's hold on B5
+
+        event.refresh_from_db()
+        self.assertEqual(allocation.best_seats(event, 4), ['A4', 'A5', 'A6', 'A7'])
+        self.assertEqual(book_best_available(event, self.bob, 10).seat_list()[0], 'A1')
+        # event still shows row A free, so the first pick loses and the retry re-reads it
+        self.assertEqual(book_best_available(event, self.bob, 10).seat_list()[0], 'C1')
+        with self.assertRaisesMessage(SeatUnavailable, 'No block of 10 seats together is left.'):
+            book_best_available(event, self.bob, 10)
+
+    def test_view(self):
+        self.client.force_login(self.ann)
+        response = self.client.post(reverse('book_best_available', args=[self.event.pk]), {'quantity': '2'})
+        self.assertRedirects(response, reverse('my_tickets'), fetch_redirect_response=False)
+        self.assertEqual(Booking.objects.get(user=self.ann).seats_booked, 'A5,A6')
+
+
+class CancellationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', password='pw', role='HOST', is_approved=True)
+        cls.admin = User.objects.create_user('admin', password='pw', role='ADMIN', is_approved=True)
+        cls.ann, cls.bob = (User.objects.create_user(name, password='pw') for name in ('ann', 'bob'))
+        cls.event = Event.objects.create(
+            host=cls.host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            status='APPROVED',
+        )
+
+    def assert_no_drift(self):
+        out = StringIO()
+        call_command('reconcile_event_sales', dry_run=True, stdout=out)
+        self.assertIn('Found 0 events', out.getvalue())
+
+    def test_user_cancels_own_booking(self):
+        keep = create_booking(self.event, self.ann, ['A1'])
+        booking = create_booking(self.event, self.ann, ['A2', 'A3'])
+        url = reverse('cancel_booking', args=[booking.pk])
+
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+        self.client.force_login(self.ann)
+        self.assertRedirects(self.client.post(url), reverse('my_tickets'), fetch_redirect_response=False)
+        booking.refresh_from_db()
+        self.assertEqual(booking.booking_status, 'CANCELLED')
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual((event.seats_sold, event.confirmed_revenue, event.seat_version), (1, 10, 3))
+        self.assertEqual(list(SeatMap.for_event(event).booked_indices()), [0])
+        self.assert_no_drift()
+
+        create_booking(event, self.bob, ['A2']) # released seats can be booked again
+        self.client.post(url)
+        self.assertEqual(Booking.objects.get(pk=keep.pk).booking_status, 'CONFIRMED')
+
+    def test_cancel_releases_only_claimed_seats(self):
+        owner = create_booking(self.event, self.ann, ['A1'])
+        # Legacy double booking: the CSV lists A1 and A2, but 0006 could only claim A2 for it
+        loser = Booking.objects.create(
+            event=self.event, user=self.bob, total_cost=20, booking_status='CONFIRMED', seats_booked='A1,A2',
+        )
+        EventSeat.objects.create(event=self.event, booking=loser, seat_id='A2')
+        Event.objects.filter(pk=self.event.pk).update(
+            seat_bitmap=bytes([0b11]), seats_sold=2, confirmed_revenue=30,
+        )
+
+        cancel_booking(loser)
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual(list(SeatMap.for_event(event).booked_indices()), [0])
+        self.assertEqual((event.seats_sold, event.confirmed_revenue), (1, 10))
+        with self.assertRaisesMessage(SeatUnavailable, 'Seat A1 is already booked.'):
+            create_booking(event, self.bob, ['A1'])
+        self.assertEqual(Booking.objects.get(pk=owner.pk).booking_status, 'CONFIRMED')
+
+    def test_past_event_cannot_be_cancelled(self):
+        booking = create_booking(self.event, self.ann, ['A1'])
+        Event.objects.filter(pk=self.event.pk).update(date=datetime.date(2000, 1, 1))
+        self.client.force_login(self.ann)
+        self.client.post(reverse('cancel_booking', args=[booking.pk]))
+        self.assertEqual(Booking.objects.get(pk=booking.pk).booking_status, 'CONFIRMED')
+
+    def test_admin_cancels_all_bookings_of_an_event(self):
+        for i in range(1, 9):
+            create_booking(self.event, self.ann if i % 2 else self.bob, [f'B{i}'])
+        hold_seats(self.event, self.bob, ['C1'])
+        other = Event.objects.create(
+            host=self.host, title='Other', date=datetime.date(2030, 1, 2), time=datetime.time(20), price=5,
+            status='APPROVED',
+        )
+        untouched = create_booking(other, self.ann, ['A1'])
+
+        self.client.force_login(self.admin)
+        # Savepoint, lock, cancel bookings, release seats, reset counters, clear rollup, release;
+        # however many bookings there are
+        with self.assertNumQueries(7):
+            cancel_event_bookings(self.event)
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual((event.seats_sold, event.confirmed_revenue), (0, 0))
+        self.assertEqual(SeatMap.for_event(event).count(), 0)
+        self.assertFalse(Booking.objects.filter(event=event, booking_status='CONFIRMED').exists())
+        self.assertTrue(EventSeat.objects.filter(event=event, seat_id='C1', is_active=True).exists()) # holds stay
+        self.assertEqual(Booking.objects.get(pk=untouched.pk).booking_status, 'CONFIRMED')
+        self.assert_no_drift()
+
+        response = self.client.post(reverse('admin_cancel_event_bookings', args=[event.pk]))
+        self.assertRedirects(response, reverse('admin_event_bookings', args=[event.pk]), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(response.url).status_code, 200)
+
+        self.client.post(reverse('admin_cancel_booking', args=[untouched.pk]))
+        self.assertEqual(Event.objects.get(pk=other.pk).seats_sold, 0)
+
+
+class BookingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', password='pw', role='HOST', is_approved=True)
+        cls.other_host = User.objects.create_user('other', password='pw', role='HOST', is_approved=True)
+        cls.admin = User.objects.create_user('admin', password='pw', role='ADMIN', is_approved=True)
+        cls.event = Event.objects.create(
+            host=cls.host, title='Gig, "live"', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            status='APPROVED',
+        )
+        other = Event.objects.create(
+            host=cls.other_host, title='Other', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=5,
+            status='APPROVED',
+        )
+        cls.buyers = [User.objects.create_user(f'buyer{i}', email=f'b{i}@example.com') for i in range(5)]
+        for i, buyer in enumerate(cls.buyers):
+            create_booking(cls.event, buyer, [f'A{i + 1}', f'B{i + 1}'])
+        create_booking(other, cls.buyers[0], ['A1'])
+        cancel_booking(Booking.objects.filter(event=cls.event).first())
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        # One query for the whole export, joined usernames included
+        with self.assertNumQueries(1):
+            return b''.join(response.streaming_content).decode()
+
+    def test_host_csv(self):
+        self.client.force_login(self.host)
+        response = self.client.get(reverse('host_event_export', args=[self.event.pk, 'csv']))
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="event-{self.event.pk}-bookings.csv"')
+        rows = list(csv.DictReader(self.read(response).splitlines()))
+        self.assertEqual([r['username'] for r in rows], [b.username for b in self.buyers])
+        self.assertEqual(rows[0]['status'], 'CANCELLED')
+        self.assertEqual(rows[1]['event_title'], 'Gig, "live"')
+        self.assertEqual((rows[1]['seats'], rows[1]['seat_count'], rows[1]['total_cost']), ('A2,B2', '2', '20.00'))
+        self.assertEqual(rows[1]['email'], 'b1@example.com')
+
+    def test_admin_ndjson_covers_all_events(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_bookings_export', args=['ndjson']))
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[-1]['event_title'], 'Other')
+        self.assertEqual(rows[-1]['seat_count'], 1)
+
+    def test_access(self):
+        self.client.force_login(self.other_host)
+        response = self.client.get(reverse('host_event_export', args=[self.event.pk, 'csv']))
+        self.assertRedirects(response, reverse('host_dashboard'), fetch_redirect_response=False)
+        self.assertRedirects(
+            self.client.get(reverse('admin_bookings_export', args=['csv'])), reverse('browse_events'),
+            fetch_redirect_response=False,
+        )
+        self.client.force_login(self.host)
+        self.assertEqual(self.client.get(reverse('host_event_export', args=[self.event.pk, 'xml'])).status_code, 404)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', password='pw', role='HOST', is_approved=True)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+        cls.event = Event.objects.create(
+            host=cls.host, title='Gig', date=datetime.date(2030, 1, 1), time=datetime.time(20), price=10,
+            status='APPROVED',
+        )
+
+    def at(self, day, hour, minute=0):
+        return mock.patch('django.utils.timezone.now', return_value=datetime.datetime(
+            2030, 1, day, hour, minute, tzinfo=datetime.timezone.utc,
+        ))
+
+    def rollup_rows(self):
+        return list(SalesRollup.objects.exclude(bookings=0).order_by('event', 'hour').values_list(
+            'event', 'hour', 'bookings', 'seats', 'revenue',
+        ))
+
+    def test_incremental_matches_rebuild(self):
+        with self.at(1, 9, 5):
+            first = create_booking(self.event, self.buyer, ['A1', 'A2'])
+        with self.at(1, 9, 55):
+            create_bookings(self.event, [(self.buyer, ['B1']), (self.buyer, ['B2', 'B3', 'B4'])])
+        with self.at(1, 12):
+            late = create_booking(self.event, self.buyer, ['C1'])
+        with self.at(2, 8):
+            cancel_booking(first) # comes off 09:00 on the 1st, when it was booked
+
+        incremental = self.rollup_rows()
+        self.assertEqual([(r[1].hour, r[2], r[3], r[4]) for r in incremental], [(9, 2, 4, 40), (12, 1, 1, 10)])
+        rollup.rebuild()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+        event = Event.objects.get(pk=self.event.pk)
+        summary = rollup.sales_summary(event)
+        self.assertEqual((summary['seats'], summary['revenue']), (event.seats_sold, event.confirmed_revenue))
+        self.assertEqual([bar['seats'] for bar in summary['bars']], [4, 0, 0, 1]) # empty hours included
+        self.assertEqual(summary['peak']['start'].hour, 9)
+
+        cancel_event_bookings(event)
+        self.assertEqual(self.rollup_rows(), [])
+        self.assertEqual(SalesRollup.objects.count(), 0)
+        cancel_booking(late) # already cancelled; must not go negative
+        rollup.rebuild([event.pk])
+        self.assertEqual(self.rollup_rows(), [])
+
+    def test_long_sales_are_bucketed(self):
+        for day in range(1, 11):
+            with self.at(day, 10):
+                create_booking(self.event, self.buyer, [f'A{day}'])
+        summary = rollup.sales_summary(self.event, max_bars=24)
+        self.assertEqual(summary['bucket_hours'], 10) # 217 hours in at most 24 bars
+        self.assertEqual(len(summary['bars']), 22)
+        self.assertEqual(sum(bar['seats'] for bar in summary['bars']), 10)
+
+    def test_host_page_reads_rollup(self):
+        for day in range(1, 4):
+            with self.at(day, 10):
+                create_booking(self.event, self.buyer, [f'A{day}', f'B{day}'])
+        self.client.force_login(self.host)
+        with mock.patch.object(Booking.objects, 'filter', side_effect=AssertionError('bookings read')):
+            response = self.client.get(reverse('host_event_detail', args=[self.event.pk]))
+        self.assertContains(response, 'class="sales-bar"', count=49)
+        self.assertContains(response, '$60')
+
+
+class UserSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', email='admin@example.com', password='pw', role='ADMIN')
+        cls.host = User.objects.create_user('host', password='pw', role='HOST')
+
+    def setUp(self):
+        caches[auth.CACHE_ALIAS].clear()
+        self.host_client = Client()
+        self.host_client.force_login(self.host)
+
+    def host_user(self):
+        return self.host_client.get(reverse('browse_events')).wsgi_request.user
+
+    def test_requests_skip_user_query(self):
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(1): # the session row only
+            response = self.client.get(reverse('dashboard_dispatch'))
+        self.assertRedirects(response, reverse('admin_dashboard'), fetch_redirect_response=False)
+        user = response.wsgi_request.user
+        self.assertEqual((user.pk, user.role), (self.admin.pk, 'ADMIN'))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'admin@example.com') # not in the snapshot; loaded on demand
+
+    def test_approve_and_reject_drop_snapshot(self):
+        self.assertFalse(self.host_user().is_approved)
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('approve_user', args=[self.host.pk]))
+        self.assertTrue(self.host_user().is_approved)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('reject_user', args=[self.host.pk]))
+        self.assertFalse(self.host_user().is_authenticated)
+
+    def test_bulk_approve_drops_snapshot(self):
+        self.assertFalse(self.host_user().is_approved)
+        with self.captureOnCommitCallbacks(execute=True):
+            moderation.approve_users(User.objects.filter(pk=self.host.pk))
+        self.assertTrue(self.host_user().is_approved)
+
+    def test_password_change_ends_session(self):
+        self.assertTrue(self.host_user().is_authenticated)
+        self.host.set_password('new')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.host.save()
+        self.assertFalse(self.host_user().is_authenticated)
+
+
+class BulkModerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pw', role='ADMIN')
+        cls.hosts = [User.objects.create_user(f'host{i}', password='pw', role='HOST') for i in range(3)]
+        cls.publics = [User.objects.create_user(f'public{i}', password='pw') for i in range(2)]
+        User.objects.filter(pk__in=[cls.admin.pk, cls.hosts[0].pk]).update(is_approved=True)
+        cls.events = [
+            Event.objects.create(
+                host=cls.hosts[i % 2], title=f'Gig {i}', date=datetime.date(2030, 1, 1), time=datetime.time(20),
+                price=10,
+            )
+            for i in range(4)
+        ]
+        Event.objects.filter(pk=cls.events[3].pk).update(status='APPROVED')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def post(self, name, **data):
+        return self.client.post(reverse(name), data, follow=True)
+
+    def pending(self):
+        return set(User.objects.filter(is_approved=False).values_list('username', flat=True))
+
+    def test_ticked_users(self):
+        response = self.post('bulk_pending_users', action='approve', ids=[self.hosts[1].pk, self.publics[0].pk, 'x'])
+        self.assertContains(response, '2 users approved.')
+        self.assertEqual(self.pending(), {'host2', 'public1'})
+        response = self.post('bulk_pending_users', action='reject', ids=[self.hosts[0].pk, self.hosts[2].pk])
+        self.assertContains(response, '1 users rejected and removed.') # host0 was already approved
+        self.assertTrue(User.objects.filter(pk=self.hosts[0].pk).exists())
+        self.assertEqual(self.pending(), {'public1'})
+
+    def test_scope_all_follows_filter(self):
+        self.post('bulk_pending_users', action='approve', scope='all', role='HOST', ids=[self.publics[0].pk])
+        self.assertEqual(self.pending(), {'public0', 'public1'})
+        response = self.post('bulk_pending_users', action='sideways', scope='all')
+        self.assertContains(response, 'Unknown action.')
+        self.assertEqual(len(self.pending()), 2)
+        with mock.patch.object(moderation, 'BATCH_SIZE', 1):
+            self.post('bulk_pending_users', action='reject', scope='all')
+        self.assertEqual(self.pending(), set())
+        self.assertEqual(set(User.objects.values_list('username', flat=True)) - {'admin'}, {f'host{i}' for i in range(3)})
+
+    def test_events(self):
+        self.post('bulk_pending_events', action='approve', ids=[self.events[0].pk, self.events[3].pk])
+        self.post('bulk_pending_events', action='reject', scope='all', host=self.hosts[1].username)
+        self.assertEqual(
+            dict(Event.objects.values_list('title', 'status')),
+            {'Gig 0': 'APPROVED', 'Gig 2': 'PENDING', 'Gig 3': 'APPROVED'},
+        )
+        stats = get_stats()
+        self.assertEqual((stats.active_events, stats.pending_events), (2, 1))
+
+    def test_admins_only(self):
+        self.client.force_login(self.hosts[0])
+        self.post('bulk_pending_users', action='approve', scope='all')
+        self.post('bulk_pending_events', action='reject', scope='all')
+        self.assertEqual(len(self.pending()), 4)
+        self.assertEqual(Event.objects.count(), 4)
+
+
+class PopulateDataTests(TestCase):
+    def test_generated_data_is_consistent(self):
+        call_command('populate_data', users=30, hosts=3, events=20, bookings=400, stdout=StringIO())
+        located = Event.objects.exclude(location_lat=None)
+        self.assertTrue(located.exists())
+        for event in located:
+            cell = event.geo_cell
+            event.save()
+            self.assertEqual(event.geo_cell, cell) # derived from the stored, rounded coordinates
+
+        now = timezone.now()
+        bookings = Booking.objects.exclude(event__title='Rock Concert').select_related('event')
+        for booking in bookings:
+            starts = datetime.datetime.combine(booking.event.date, booking.event.time, tzinfo=datetime.timezone.utc)
+            self.assertLessEqual(booking.created_at, min(now, starts))
+        busiest = bookings.values('event').annotate(n=Count('pk')).order_by('-n').first()
+        self.assertGreater(SalesRollup.objects.filter(event=busiest['event']).count(), 1)
+
+
+class BenchRoutesTests(TestCase):
+    def test_every_route_is_benchmarked(self):
+        for name in bench_routes.named_routes():
+            self.assertTrue(name in bench_routes.ROUTES or name in bench_routes.SKIPPED, name)
+
+    def test_every_route_runs(self):
+        call_command('populate_data', users=20, hosts=3, events=20, bookings=60, stdout=StringIO())
+        results = bench_routes.run(repeat=1, warmup=0)
+        self.assertEqual(set(results), set(bench_routes.named_routes()) - set(bench_routes.SKIPPED))
+
+    def test_regressions(self):
+        baseline = {'a': {'p50': 10.0, 'queries': 3}, 'b': {'p50': 10.0, 'queries': 3}}
+        results = {'a': {'p50': 11.0, 'queries': 3}, 'b': {'p50': 30.0, 'queries': 4}, 'c': {'p50': 1.0, 'queries': 1}}
+        found = bench_routes.regressions(results, baseline)
+        self.assertEqual(len(found), 2)
+        self.assertTrue(all(line.startswith('b:') for line in found))
+
+
+class QueryInstrumentationTests(TestCase):
+    def test_disabled_by_default(self):
+        with override_settings(SQL_INSTRUMENTATION=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                QueryInstrumentationMiddleware(lambda request: None)
+
+    @override_settings(SQL_INSTRUMENTATION=True, SQL_N_PLUS_ONE_THRESHOLD=3)
+    def test_header_and_n_plus_one_log(self):
+        User.objects.create_user('someone', password='pw')
+
+        def view(request):
+            for pk in range(4):
+                User.objects.filter(pk=pk).exists()
+            return HttpResponse('ok')
+
+        middleware = QueryInstrumentationMiddleware(view)
+        with self.assertLogs('core.sql', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'^db;desc="4 queries";dur=[\d.]+, app;dur=[\d.]+$')
+        self.assertIn('"n_plus_one": [{"sql": "SELECT %s AS', logs.output[0])
+        self.assertIn('"count": 4', logs.output[0])
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def production_connection(self, path):
+        with mock.patch.dict(os.environ, DATABASE_PROFILE='production'):
+            settings_module = runpy.run_path(str(django_settings.BASE_DIR / 'config' / 'settings.py'))
+        database = {**settings_module['DATABASES']['default'], 'NAME': path}
+        # A handler of its own (which insists on a "default"), so the test databases aren't involved
+        return ConnectionHandler({'default': {}, 'production': database})['production']
+
+    def test_production_profile_tunes_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            connection = self.production_connection(f'{tmp}/db.sqlite3')
+            try:
+                with connection.cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'busy_timeout', 'synchronous'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+                self.assertEqual(pragmas, {'journal_mode': 'wal', 'busy_timeout': 5000, 'synchronous': 1})
+                self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 600)
+
+                # What transaction.atomic() does to open a transaction on SQLite
+                with CaptureQueriesContext(connection) as ctx:
+                    connection.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                connection.rollback()
+                connection.set_autocommit(True)
+                self.assertEqual([q['sql'] for q in ctx.captured_queries], ['BEGIN IMMEDIATE'])
+            finally:
+                connection.close()
+
+
+@mock.patch('core.routers.replica_configured', return_value=True)
+class ReplicaRoutingTests(TransactionTestCase):
+    # TestCase would wrap every test in a transaction, which always routes to the primary
+    router = PrimaryReplicaRouter()
+
+    def route(self, request, model=Event, atomic=False):
+        @replica_reads
+        def view(request):
+            if atomic:
+                with transaction.atomic():
+                    return self.router.db_for_read(model)
+            return self.router.db_for_read(model)
+        return view(request)
+
+    def test_read_routing(self, _):
+        factory = RequestFactory()
+        self.assertEqual(self.route(factory.get('/')), 'replica')
+        self.assertEqual(self.route(factory.post('/')), 'default')
+        self.assertEqual(self.route(factory.get('/'), model=User), 'default')
+        self.assertEqual(self.route(factory.get('/'), atomic=True), 'default')
+        pinned = factory.get('/')
+        pinned.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.route(pinned), 'default')
+        self.assertEqual(self.router.db_for_read(Event), 'default') # outside a decorated view
+
+    def test_writes_pin_the_client(self, _):
+        def writer(request):
+            self.router.db_for_write(Event)
+            return HttpResponse()
+
+        response = ReplicaStickinessMiddleware(writer)(RequestFactory().post('/'))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        response = ReplicaStickinessMiddleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
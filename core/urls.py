@@ -14,17 +14,31 @@ urlpatterns = [
     path('manage/hosts/', views.host_list, name='host_list'),
     path('manage/users/', views.user_list, name='user_list'),
     path('manage/users/pending/', views.pending_users, name='pending_users'),
+    path('manage/users/pending/bulk/', views.bulk_pending_users, name='bulk_pending_users'),
     path('manage/approve/user/<int:user_id>/', views.approve_user, name='approve_user'),
     path('manage/reject/user/<int:user_id>/', views.reject_user, name='reject_user'),
     path('manage/events/', views.admin_event_list, name='admin_event_list'),
     path('manage/events/pending/', views.admin_pending_events, name='admin_pending_events'),
+    path('manage/events/pending/bulk/', views.bulk_pending_events, name='bulk_pending_events'),
     path('manage/events/<int:event_id>/approve/', views.approve_event, name='approve_event'),
     path('manage/events/<int:event_id>/reject/', views.reject_event, name='reject_event'),
     path('manage/events/<int:event_id>/delete/', views.delete_event, name='delete_event'),
+    path('manage/events/<int:event_id>/bookings/', views.admin_event_bookings, name='admin_event_bookings'),
+    path('manage/events/<int:event_id>/bookings/cancel/', views.admin_cancel_event_bookings,
+         name='admin_cancel_event_bookings'),
+    path('manage/bookings.<slug:fmt>', views.admin_bookings_export, name='admin_bookings_export'),
+    path('manage/bookings/<int:booking_id>/cancel/', views.admin_cancel_booking, name='admin_cancel_booking'),
     path('host-dashboard/', views.host_dashboard, name='host_dashboard'),
     path('host/event/<int:event_id>/', views.host_event_detail, name='host_event_detail'),
+    path('host/event/<int:event_id>/bookings.<slug:fmt>', views.host_event_export, name='host_event_export'),
     path('event/<int:event_id>/', views.event_detail, name='event_detail'),
+    path('event/<int:event_id>/seats/', views.seat_availability, name='seat_availability'),
+    path('event/<int:event_id>/stream/', views.seat_stream, name='seat_stream'),
     path('event/<int:event_id>/book/', views.book_ticket, name='book_ticket'),
+    path('event/<int:event_id>/book/best/', views.book_best_available_view, name='book_best_available'),
+    path('event/<int:event_id>/hold/', views.hold_seat_view, name='hold_seats'),
+    path('event/<int:event_id>/release/', views.release_seat_view, name='release_seats'),
     path('my-tickets/', views.my_tickets, name='my_tickets'),
+    path('my-tickets/<int:booking_id>/cancel/', views.cancel_booking_view, name='cancel_booking'),
     path('create-event/', views.create_event, name='create_event'),
 ]
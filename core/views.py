@@ -1,13 +1,31 @@
-from django.shortcuts import render, redirect
+from django.conf import settings
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_POST
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.urls import reverse
 from django.utils import timezone
 from django.db import models # Import models for Q objects
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import base64
 import json
+from functools import partial
+from urllib.parse import urlencode
 from .models import User, Event, Booking
 from .forms import EventForm
+from .booking import BEST_AVAILABLE_MAX, book_best_available, cancel_booking, cancel_event_bookings, create_booking, hold_seats, parse_seat_ids, release_holds, SeatUnavailable
+from .seating import SeatMap, seat_grid
+from .search import search_events
+from .pagination import paginate
+from .geo import nearby_events
+from .live import get_feed, streaming
+from .stats import get_stats
+from . import batching, exports, moderation, rollup
+from .routers import replica_reads
 
 def register(request):
     if request.method == 'POST':
@@ -67,66 +85,100 @@ def dashboard_dispatch(request):
     else:
         return redirect('browse_events')
 
+@replica_reads
 def landing(request):
     return render(request, 'index.html')
 
+@replica_reads
 def browse_events(request):
     query = request.GET.get('q')
-    events = Event.objects.filter(date__gte=timezone.now().date(), status='APPROVED')
+    events = Event.objects.filter(date__gte=timezone.now().date(), status='APPROVED').defer('seat_bitmap')
     
+    ordering = ['date', 'time', 'pk']
     if query:
-        events = events.filter(title__icontains=query)
+        # Full-text match on title and description, ranked by relevance where FTS is available
+        events = search_events(events, query)
+        if 'search_rank' in events.query.annotations:
+            ordering = ['search_rank'] + ordering
         
-    events = events.order_by('date', 'time')
-    return render(request, 'public/home.html', {'events': events, 'query': query})
-
+    near = _parse_near(request.GET)
+    if near:
+        # "Events near me": indexed grid-cell prefilter, then exact distance ranking
+        lat, lng, radius_km = near
+        nearby = nearby_events(events, lat, lng, radius_km, limit=NEARBY_LIMIT)
+        context = {'events': nearby, 'query': query, 'near': {'lat': lat, 'lng': lng, 'radius': radius_km}}
+        return render(request, 'public/home.html', context)
+
+    page = paginate(request, events, ordering)
+    return render(request, 'public/home.html', {'events': page.object_list, 'page': page, 'query': query})
+
+NEARBY_LIMIT = 50
+NEARBY_DEFAULT_RADIUS_KM = 25
+NEARBY_MAX_RADIUS_KM = 1000
+
+def _parse_near(params):
+    try:
+        lat = float(params['lat'])
+        lng = float(params['lng'])
+        radius_km = float(params.get('radius') or NEARBY_DEFAULT_RADIUS_KM)
+    except (KeyError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180 and 0 < radius_km):
+        return None
+    return lat, lng, min(radius_km, NEARBY_MAX_RADIUS_KM)
+
+@replica_reads
 def event_detail(request, event_id):
     event = Event.objects.get(pk=event_id)
-    
-    # Get all booked seat locations
-    bookings = Booking.objects.filter(event=event, booking_status='CONFIRMED')
-    booked_seats_set = set()
-    for b in bookings:
-        if b.seats_booked:
-            for s in b.seats_booked.split(','):
-                booked_seats_set.add(s.strip())
-
-    # Generate grid
-    # Rows: 'A', 'B', 'C'... 
-    # Cols: 1, 2, 3...
-    
-    grid_rows = []
-    import string
-    row_labels = list(string.ascii_uppercase) # A-Z
-    
-    # Handle case where rows might exceed 26 (AA, AB etc if needed, but for now simple A-Z)
-    
-    for r in range(event.venue_rows):
-        row_char = row_labels[r] if r < 26 else f"R{r+1}"
-        row_seats = []
-        for c in range(1, event.venue_cols + 1):
-            seat_id = f"{row_char}{c}"
-            row_seats.append({
-                'seat_id': seat_id,
-                'row': row_char,
-                'col': c,
-                'is_booked': seat_id in booked_seats_set
-            })
-        grid_rows.append(row_seats)
+
+    # Built by the template only when the cached fragment for this
+    # seat_version is missing (see {% cache %} in the template)
+    grid_rows = partial(seat_grid, event)
     
     context = {
         'event': event,
         'grid_rows': grid_rows,
-        'booked_seat_ids': list(booked_seats_set), 
+        'best_available_max': BEST_AVAILABLE_MAX,
+        'seat_stream': streaming(request),
     }
     return render(request, 'public/event_detail.html', context)
 
+def _seat_etag(request, event_id):
+    event = Event.objects.filter(pk=event_id).only('seat_version').first()
+    return event and event.seat_etag
+
+@condition(etag_func=_seat_etag)
+def seat_availability(request, event_id):
+    """
+    Compact occupancy for polling: the seat bitmap (base64, one bit per seat
+    in row-major order, LSB first). Clients revalidate with If-None-Match
+    and get a bodyless 304 until a booking changes the seat version.
+    """
+    event = get_object_or_404(Event.objects.only('venue_rows', 'venue_cols', 'seat_bitmap', 'seat_version'), pk=event_id)
+    response = JsonResponse({
+        'version': event.seat_version,
+        'rows': event.venue_rows,
+        'cols': event.venue_cols,
+        'booked': base64.b64encode(SeatMap.for_event(event).to_bytes()).decode(),
+    })
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+async def seat_stream(request, event_id):
+    """Server-Sent Events stream of seat booked/released deltas for one event (see core.live)."""
+    if not streaming(request):
+        raise Http404('Live seat updates are not enabled.')
+    if not await Event.objects.filter(pk=event_id).aexists():
+        raise Http404('No such event.')
+    response = StreamingHttpResponse(get_feed(event_id).stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 @login_required
 def book_ticket(request, event_id):
     if request.method == 'POST':
-        from django.db import transaction
-        
         event = Event.objects.get(pk=event_id)
         selected_seat_ids = request.POST.get('selected_seats') # e.g., "A1,A2"
         
@@ -134,42 +186,14 @@ def book_ticket(request, event_id):
             messages.error(request, 'No seats selected.')
             return redirect('event_detail', event_id=event.id)
         
-        seat_list = [s.strip() for s in selected_seat_ids.split(',')]
+        seat_list = parse_seat_ids(selected_seat_ids)
         quantity = len(seat_list)
         
         try:
-            with transaction.atomic():
-                # Lock the event row to prevent race conditions (optional but good)
-                Event.objects.select_for_update().get(pk=event_id)
-                
-                # Check availability
-                # Get all currently booked seats for this event
-                existing_bookings = Booking.objects.filter(
-                    event=event,
-                    booking_status='CONFIRMED'
-                ).select_for_update()
-                
-                booked_seats_set = set()
-                for b in existing_bookings:
-                    if b.seats_booked:
-                        for s in b.seats_booked.split(','):
-                            booked_seats_set.add(s.strip())
-                
-                # Check for overlap
-                for seat in seat_list:
-                    if seat in booked_seats_set:
-                        raise ValueError(f'Seat {seat} is already booked.')
-                
-                # Create Booking
-                total_cost = event.price * quantity
-                Booking.objects.create(
-                    event=event,
-                    user=request.user,
-                    total_cost=total_cost,
-                    booking_status='CONFIRMED',
-                    seats_booked=selected_seat_ids
-                )
-                
+            # The per-seat unique index rejects taken seats, so no event-wide lock is needed
+            book = batching.book if settings.BOOKING_GROUP_COMMIT else create_booking
+            book(event, request.user, seat_list)
+
             messages.success(request, f'Booking confirmed! {quantity} tickets.')
             return redirect('my_tickets')
             
@@ -182,10 +206,66 @@ def book_ticket(request, event_id):
     
     return redirect('browse_events')
 
+@login_required
+@require_POST
+def book_best_available_view(request, event_id):
+    event = get_object_or_404(Event, pk=event_id)
+    try:
+        quantity = int(request.POST.get('quantity', ''))
+    except ValueError:
+        messages.error(request, 'Choose how many seats you need.')
+        return redirect('event_detail', event_id=event.id)
+
+    try:
+        book = batching.book if settings.BOOKING_GROUP_COMMIT else create_booking
+        booking = book_best_available(event, request.user, quantity, book=book)
+    except SeatUnavailable as e:
+        messages.error(request, str(e))
+        return redirect('event_detail', event_id=event.id)
+    messages.success(request, f'Booking confirmed! {quantity} tickets together: {booking.seats_booked}.')
+    return redirect('my_tickets')
+
+@require_POST
+def hold_seat_view(request, event_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required.'}, status=401)
+
+    event = get_object_or_404(Event, pk=event_id, status='APPROVED')
+    try:
+        seats, expires_at = hold_seats(event, request.user, parse_seat_ids(request.POST.get('seats')))
+    except SeatUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    return JsonResponse({'held': seats, 'expires_at': expires_at.isoformat()})
+
+@require_POST
+def release_seat_view(request, event_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required.'}, status=401)
+
+    event = get_object_or_404(Event, pk=event_id, status='APPROVED')
+    seats = parse_seat_ids(request.POST.get('seats')) or None
+    released = release_holds(event, request.user, seats)
+    return JsonResponse({'released': released})
+
 @login_required
 def my_tickets(request):
-    bookings = Booking.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'public/my_tickets.html', {'bookings': bookings})
+    bookings = Booking.objects.filter(user=request.user).select_related('event')
+    page = paginate(request, bookings, ['-created_at', '-pk'])
+    return render(request, 'public/my_tickets.html', {
+        'bookings': page.object_list, 'page': page, 'today': timezone.localdate(),
+    })
+
+@login_required
+@require_POST
+def cancel_booking_view(request, booking_id):
+    booking = get_object_or_404(Booking.objects.select_related('event'), pk=booking_id, user=request.user)
+    if booking.event.date < timezone.localdate():
+        messages.error(request, 'This event has already taken place.')
+    elif cancel_booking(booking):
+        messages.success(request, f'Booking #{booking.pk} cancelled; seats {booking.seats_booked} released.')
+    else:
+        messages.error(request, f'Booking #{booking.pk} was already cancelled.')
+    return redirect('my_tickets')
 
 
 @login_required
@@ -193,18 +273,14 @@ def admin_dashboard(request):
     if request.user.role != 'ADMIN':
         return redirect('browse_events')
     
-    total_users = User.objects.count()
-    active_events = Event.objects.filter(status='APPROVED').count()
-    total_bookings = Booking.objects.count()
-    pending_users_count = User.objects.filter(is_approved=False).count()
-    pending_events_count = Event.objects.filter(status='PENDING').count()
+    stats = get_stats()
     
     context = {
-        'total_users': total_users,
-        'active_events': active_events,
-        'total_bookings': total_bookings,
-        'pending_users_count': pending_users_count,
-        'pending_events_count': pending_events_count,
+        'total_users': stats.total_users,
+        'active_events': stats.active_events,
+        'total_bookings': stats.total_bookings,
+        'pending_users_count': stats.pending_users,
+        'pending_events_count': stats.pending_events,
     }
     return render(request, 'admin/dashboard.html', context)
 
@@ -213,24 +289,61 @@ def user_list(request):
     if request.user.role != 'ADMIN':
         return redirect('browse_events')
     
-    users = User.objects.all().order_by('-date_joined')
-    return render(request, 'admin/user_list.html', {'users': users})
+    page = paginate(request, User.objects.all(), ['-date_joined', '-pk'])
+    context = {'users': page.object_list, 'page': page, 'total_users': get_stats().total_users}
+    return render(request, 'admin/user_list.html', context)
 
 @login_required
 def host_list(request):
     if request.user.role != 'ADMIN':
         return redirect('browse_events')
     
-    hosts = User.objects.filter(role='HOST').order_by('-date_joined')
-    return render(request, 'admin/host_list.html', {'hosts': hosts})
+    # Correlated count, so only the hosts on this page are counted
+    event_count = Event.objects.filter(host=OuterRef('pk')).values('host').annotate(n=Count('pk')).values('n')
+    hosts = User.objects.filter(role='HOST').annotate(event_count=Coalesce(Subquery(event_count), 0))
+    page = paginate(request, hosts, ['-date_joined', '-pk'])
+    return render(request, 'admin/host_list.html', {'hosts': page.object_list, 'page': page})
 
 @login_required
 def pending_users(request):
     if request.user.role != 'ADMIN':
         return redirect('browse_events')
     
-    users = User.objects.filter(is_approved=False).order_by('date_joined')
-    return render(request, 'admin/pending_users.html', {'users': users})
+    role = request.GET.get('role', '')
+    page = paginate(request, _pending_users(role), ['date_joined', 'pk'])
+    return render(request, 'admin/pending_users.html', {
+        'users': page.object_list, 'page': page, 'role': role, 'role_choices': User.ROLE_CHOICES,
+    })
+
+def _pending_users(role=''):
+    users = User.objects.filter(is_approved=False)
+    if role:
+        users = users.filter(role=role)
+    return users
+
+def _bulk_selection(request, queryset):
+    """The items a bulk form targets: every match of its filter, or the ticked ids."""
+    if request.POST.get('scope') == 'all':
+        return queryset
+    ids = [i for i in request.POST.getlist('ids') if i.isdigit()]
+    return queryset.filter(pk__in=ids)
+
+@login_required
+@require_POST
+def bulk_pending_users(request):
+    if request.user.role != 'ADMIN':
+        return redirect('browse_events')
+
+    action = request.POST.get('action')
+    role = request.POST.get('role', '')
+    users = _bulk_selection(request, _pending_users(role))
+    if action == 'approve':
+        messages.success(request, f'{moderation.approve_users(users)} users approved.')
+    elif action == 'reject':
+        messages.success(request, f'{moderation.reject_users(users)} users rejected and removed.')
+    else:
+        messages.error(request, 'Unknown action.')
+    return redirect(f"{reverse('pending_users')}?{urlencode({'role': role})}" if role else 'pending_users')
 
 @login_required
 def approve_user(request, user_id):
@@ -258,8 +371,33 @@ def admin_pending_events(request):
     if request.user.role != 'ADMIN':
         return redirect('browse_events')
     
-    events = Event.objects.filter(status='PENDING').order_by('date')
-    return render(request, 'admin/pending_events.html', {'events': events})
+    host = request.GET.get('host', '')
+    events = _pending_events(host).select_related('host').defer('seat_bitmap')
+    page = paginate(request, events, ['date', 'pk'])
+    return render(request, 'admin/pending_events.html', {'events': page.object_list, 'page': page, 'host': host})
+
+def _pending_events(host=''):
+    events = Event.objects.filter(status='PENDING')
+    if host:
+        events = events.filter(host__username=host)
+    return events
+
+@login_required
+@require_POST
+def bulk_pending_events(request):
+    if request.user.role != 'ADMIN':
+        return redirect('browse_events')
+
+    action = request.POST.get('action')
+    host = request.POST.get('host', '')
+    events = _bulk_selection(request, _pending_events(host))
+    if action == 'approve':
+        messages.success(request, f'{moderation.approve_events(events)} events approved.')
+    elif action == 'reject':
+        messages.success(request, f'{moderation.reject_events(events)} events rejected.')
+    else:
+        messages.error(request, 'Unknown action.')
+    return redirect(f"{reverse('admin_pending_events')}?{urlencode({'host': host})}" if host else 'admin_pending_events')
 
 @login_required
 def approve_event(request, event_id):
@@ -287,34 +425,21 @@ def admin_event_list(request):
     if request.user.role != 'ADMIN':
         return redirect('browse_events')
     
-    from django.db.models import Sum, Count
-    
-    events = Event.objects.annotate(
-        revenue=Sum('bookings__total_cost', default=0),
-        confirmed_bookings_count=Count('bookings', filter=models.Q(bookings__booking_status='CONFIRMED'))
-    ).order_by('-date', '-time')
+    # Sales figures come from the counters on Event, so this is a single query
+    events = Event.objects.select_related('host').defer('seat_bitmap')
+    page = paginate(request, events, ['-date', '-time', '-pk'])
     
     event_stats = []
-    for event in events:
-        # Calculate booked seats count by parsing CSV strings
-        bookings = Booking.objects.filter(event=event, booking_status='CONFIRMED')
-        booked_count = 0
-        for b in bookings:
-            if b.seats_booked:
-                booked_count += len(b.seats_booked.split(','))
-        
-        total_capacity = event.venue_rows * event.venue_cols
-        balance_seats = total_capacity - booked_count
-        
+    for event in page.object_list:
         event_stats.append({
             'event': event,
-            'revenue': event.revenue,
-            'total_capacity': total_capacity,
-            'balance_seats': balance_seats,
-            'booked_count': booked_count
+            'revenue': event.confirmed_revenue,
+            'total_capacity': event.total_capacity,
+            'balance_seats': event.balance_seats,
+            'booked_count': event.seats_sold
         })
         
-    return render(request, 'admin/event_list.html', {'event_stats': event_stats})
+    return render(request, 'admin/event_list.html', {'event_stats': event_stats, 'page': page})
 
 @login_required
 def host_dashboard(request):
@@ -322,7 +447,7 @@ def host_dashboard(request):
         return redirect('browse_events')
     
     # Events where the user is the host
-    events = Event.objects.filter(host=request.user)
+    events = Event.objects.filter(host=request.user).defer('seat_bitmap')
     return render(request, 'host/dashboard.html', {'events': events})
 
 @login_required
@@ -350,52 +475,39 @@ def create_event(request):
 @login_required
 def host_event_detail(request, event_id):
     event = Event.objects.get(pk=event_id)
-    if event.host != request.user:
+    if event.host_id != request.user.pk:
         messages.error(request, "You are not authorized to view this event.")
         return redirect('host_dashboard')
 
-    bookings = Booking.objects.filter(event=event, booking_status='CONFIRMED')
+    # Totals and the sales chart come from the hourly rollup, not the bookings
+    sales = rollup.sales_summary(event)
+    total_capacity = event.total_capacity
+    balance_seats = event.balance_seats
     
-    total_revenue = sum(b.total_cost for b in bookings)
-    
-    booked_seats_set = set()
-    for b in bookings:
-        if b.seats_booked:
-            for s in b.seats_booked.split(','):
-                booked_seats_set.add(s.strip())
-                
-    seats_sold_count = len(booked_seats_set)
-    total_capacity = event.venue_rows * event.venue_cols
-    balance_seats = total_capacity - seats_sold_count
-    
-    # Generate grid
-    import string
-    row_labels = list(string.ascii_uppercase)
-    
-    grid_rows = []
-    for r in range(event.venue_rows):
-        row_char = row_labels[r] if r < 26 else f"R{r+1}"
-        row_seats = []
-        for c in range(1, event.venue_cols + 1):
-            seat_id = f"{row_char}{c}"
-            row_seats.append({
-                'seat_id': seat_id,
-                'row': row_char,
-                'col': c,
-                'is_booked': seat_id in booked_seats_set
-            })
-        grid_rows.append(row_seats)
+    grid_rows = partial(seat_grid, event)
 
     context = {
         'event': event,
-        'total_revenue': total_revenue,
-        'seats_sold_count': seats_sold_count,
+        'total_revenue': sales['revenue'],
+        'seats_sold_count': sales['seats'],
         'balance_seats': balance_seats,
         'total_capacity': total_capacity,
+        'sales': sales,
         'grid_rows': grid_rows,
     }
     return render(request, 'host/event_detail.html', context)
 
+@login_required
+def host_event_export(request, event_id, fmt):
+    if fmt not in exports.FORMATS:
+        raise Http404('Unknown export format.')
+    event = get_object_or_404(Event.objects.only('host_id'), pk=event_id)
+    if event.host_id != request.user.pk and request.user.role != 'ADMIN':
+        messages.error(request, "You are not authorized to view this event.")
+        return redirect('host_dashboard')
+
+    return exports.export_response(Booking.objects.filter(event=event), fmt, f'event-{event.pk}-bookings')
+
 
 @login_required
 def delete_event(request, event_id):
@@ -407,3 +519,46 @@ def delete_event(request, event_id):
     event.delete()
     messages.success(request, f'Event "{event.title}" has been deleted.')
     return redirect('admin_event_list')
+
+@login_required
+def admin_event_bookings(request, event_id):
+    if request.user.role != 'ADMIN':
+        return redirect('browse_events')
+
+    event = get_object_or_404(Event.objects.defer('seat_bitmap'), pk=event_id)
+    bookings = Booking.objects.filter(event=event).select_related('user')
+    page = paginate(request, bookings, ['-created_at', '-pk'])
+    return render(request, 'admin/event_bookings.html', {'event': event, 'bookings': page.object_list, 'page': page})
+
+@login_required
+@require_POST
+def admin_cancel_booking(request, booking_id):
+    if request.user.role != 'ADMIN':
+        return redirect('browse_events')
+
+    booking = get_object_or_404(Booking, pk=booking_id)
+    if cancel_booking(booking):
+        messages.success(request, f'Booking #{booking.pk} cancelled.')
+    else:
+        messages.error(request, f'Booking #{booking.pk} was already cancelled.')
+    return redirect('admin_event_bookings', event_id=booking.event_id)
+
+@login_required
+@require_POST
+def admin_cancel_event_bookings(request, event_id):
+    if request.user.role != 'ADMIN':
+        return redirect('browse_events')
+
+    event = get_object_or_404(Event.objects.only('title'), pk=event_id)
+    cancelled = cancel_event_bookings(event)
+    messages.success(request, f'{cancelled} bookings for "{event.title}" cancelled.')
+    return redirect('admin_event_bookings', event_id=event.pk)
+
+@login_required
+def admin_bookings_export(request, fmt):
+    if request.user.role != 'ADMIN':
+        return redirect('browse_events')
+    if fmt not in exports.FORMATS:
+        raise Http404('Unknown export format.')
+
+    return exports.export_response(Booking.objects.all(), fmt, f'bookings-{timezone.localdate().isoformat()}')
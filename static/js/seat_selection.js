@@ -5,33 +5,65 @@ document.addEventListener('DOMContentLoaded', function () {
     const input = document.getElementById('selected_seats_input');
     const bookBtn = document.getElementById('book-btn');
 
+    const csrfInput = document.querySelector('#booking-form [name=csrfmiddlewaretoken]');
+    const holdUrl = grid.dataset.holdUrl;
+    const releaseUrl = grid.dataset.releaseUrl;
+    const availabilityUrl = grid.dataset.availabilityUrl;
+    const streamUrl = grid.dataset.streamUrl;
+    let streaming = false;
+    const POLL_INTERVAL_MS = 5000;
+    let seatEtag = grid.dataset.seatEtag;
+
     let selectedSeatIds = [];
     let selectedSeatLabels = [];
 
     // Attach listeners to existing seats
     const seats = grid.querySelectorAll('.seat');
     seats.forEach(seat => {
-        if (!seat.classList.contains('booked')) {
-            seat.addEventListener('click', () => toggleSeat(seat));
-        }
+        seat.addEventListener('click', () => toggleSeat(seat));
     });
 
     function toggleSeat(seat) {
+        if (seat.classList.contains('booked')) return;
         const id = seat.dataset.id;
         const label = seat.dataset.label;
 
         if (selectedSeatIds.includes(id)) {
-            selectedSeatIds = selectedSeatIds.filter(s => s !== id);
-            selectedSeatLabels = selectedSeatLabels.filter(l => l !== label);
-            seat.classList.remove('selected');
+            deselect(seat);
+            postSeats(releaseUrl, id);
         } else {
             selectedSeatIds.push(id);
             selectedSeatLabels.push(label);
             seat.classList.add('selected');
+            // Hold the seat server-side; if someone else got there first, show it as taken
+            postSeats(holdUrl, id).then(response => {
+                if (response && response.status === 409) {
+                    deselect(seat);
+                    seat.classList.add('booked');
+                    response.json().then(data => alert(data.error));
+                }
+            });
         }
         updateUI();
     }
 
+    function deselect(seat) {
+        selectedSeatIds = selectedSeatIds.filter(s => s !== seat.dataset.id);
+        selectedSeatLabels = selectedSeatLabels.filter(l => l !== seat.dataset.label);
+        seat.classList.remove('selected');
+        updateUI();
+    }
+
+    function postSeats(url, seats) {
+        if (!url || !csrfInput) return Promise.resolve(null);
+        const body = new URLSearchParams({ seats: seats });
+        return fetch(url, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': csrfInput.value },
+            body: body,
+        }).catch(() => null);
+    }
+
     function updateUI() {
         if (selectedSeatIds.length > 0) {
             selectedDisplay.textContent = selectedSeatLabels.join(', ');
@@ -46,4 +78,51 @@ document.addEventListener('DOMContentLoaded', function () {
             if (bookBtn) bookBtn.disabled = true;
         }
     }
+
+    // Cheap conditional poll: the server answers 304 until the seat version changes
+    function pollAvailability() {
+        if (!availabilityUrl || document.hidden || streaming) return;
+        const headers = seatEtag ? { 'If-None-Match': seatEtag } : {};
+        fetch(availabilityUrl, { headers: headers, cache: 'no-store' })
+            .then(response => {
+                if (response.status !== 200) return null;
+                seatEtag = response.headers.get('ETag');
+                return response.json();
+            })
+            .then(data => { if (data) applyOccupancy(data.booked); })
+            .catch(() => {});
+    }
+
+    function applyOccupancy(encoded) {
+        const raw = atob(encoded);
+        seats.forEach((seat, i) => {
+            const booked = (raw.charCodeAt(i >> 3) & (1 << (i & 7))) !== 0;
+            markSeat(seat, booked);
+        });
+    }
+
+    function markSeat(seat, booked) {
+        if (booked && seat.classList.contains('selected')) {
+            deselect(seat);
+        }
+        seat.classList.toggle('booked', booked);
+    }
+
+    // Live push: one stream per page; polling only runs while it is disconnected
+    if (streamUrl && window.EventSource) {
+        const source = new EventSource(streamUrl);
+        source.addEventListener('open', () => { streaming = true; });
+        source.addEventListener('error', () => { streaming = false; });
+        source.addEventListener('snapshot', e => {
+            const data = JSON.parse(e.data);
+            applyOccupancy(data.booked);
+        });
+        source.addEventListener('seats', e => {
+            const data = JSON.parse(e.data);
+            data.booked.forEach(i => seats[i] && markSeat(seats[i], true));
+            data.released.forEach(i => seats[i] && markSeat(seats[i], false));
+        });
+    }
+
+    setInterval(pollAvailability, POLL_INTERVAL_MS);
 });